@@ -50,6 +50,20 @@ def getDefaultParameters():
     experimentParameters['nb_point_x'] = 1
     experimentParameters['nb_point_y'] = 0
     experimentParameters['samples_per_point'] = 30
+    experimentParameters['streaming_statistics'] = False
+    experimentParameters['raw_shots_kept'] = 0
+    experimentParameters['statistics_min_max'] = False
+    experimentParameters['coherent_averaging'] = False
+    experimentParameters['alignment_channel'] = None
+    experimentParameters['quality_check'] = False
+    experimentParameters['quality_retries'] = 2
+    experimentParameters['quality_min_snr'] = 6.0
+    experimentParameters['quality_pretrigger_fraction'] = 0.1
+    experimentParameters['quality_max_clipped_fraction'] = 0.0
+    experimentParameters['adaptive_budget'] = 0
+    experimentParameters['adaptive_coarse_step'] = 4
+    experimentParameters['adaptive_field'] = "amplitude"
+    experimentParameters['adaptive_threshold'] = 0.1
     experimentParameters['step_x'] = 2.0
     experimentParameters['step_y'] = 2.0
     experimentParameters['sg_port'] = "COM6"
@@ -76,6 +90,8 @@ def getDefaultParameters():
     experimentParameters['trigger_mode'] = "SINGLE"
     experimentParameters['trigger_delay'] = -0.1
     experimentParameters['data_filename'] = "EXP12.json"
+    # Path where the timings of the scans are recorded to calibrate the estimates (None: not recorded).
+    experimentParameters['timings_file'] = None
 
     return experimentParameters
 
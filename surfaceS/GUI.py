@@ -39,6 +39,7 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QCheckBox, QComboBox, QD
         QProgressBar, QPushButton, QRadioButton, QScrollBar, QSizePolicy,
         QSlider, QSpinBox, QStyleFactory, QTableWidget, QTabWidget, QTextEdit,
         QVBoxLayout, QWidget, QMessageBox, QFileDialog)
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
 
 import sys
 import logging as log
@@ -58,14 +59,24 @@ from matplotlib.figure import Figure
 
 import Oscilloscope as Osc
 import SignalGeneratorTCPIP as SG
+import SignalGeneratorWidget as SGW
 import cnc as CNC
 import measure_vibrations as mv
 import acquire_impacts as ai
 import acquire_SineSweep as ass
 import mainPlot
+import ScanWorker
 import ExperimentParametersIO as ExpParamIO
 import MeasureDataset
 
+class CncStatusRelay(QObject):
+    """
+    Forward the status of the CNC, reported by its serial thread, to the GUI
+    thread.
+
+    """
+    statusChanged = pyqtSignal(str, float, float, float)
+
 class Gui(QMainWindow, MainWindow):
     def __init__(self, parent=None):
         """
@@ -158,6 +169,14 @@ class Gui(QMainWindow, MainWindow):
         self.startAcquiringButton.clicked.connect(self.startAcquiring)
         self.startAcquiringSineSweepButton.clicked.connect(self.startAcquiringSineSweep)
 
+        self.scanThread = None
+        self.scanWorker = None
+        self.pauseScanButton.clicked.connect(self.pauseScan)
+        self.cancelScanButton.clicked.connect(self.cancelScan)
+
+        self.cncStatusRelay = CncStatusRelay()
+        self.cncStatusRelay.statusChanged.connect(self.showCncStatus)
+
         self.createPlot()
 
         self.maxZLineEdit.textChanged.connect(self.update_plot_limits)
@@ -299,7 +318,7 @@ class Gui(QMainWindow, MainWindow):
 
          """
 
-        self.signalPlot = SG.SignalPlot(self.centralwidget)
+        self.signalPlot = SGW.SignalPlot(self.centralwidget)
         self.signalGeneratorLayout.addWidget(self.signalPlot)
 
 
@@ -315,7 +334,8 @@ class Gui(QMainWindow, MainWindow):
 
          """
         def cncStatusCallback(state, x, y, z):
-            self.machineCoordinatesEdit.setText(f'{state},{x},{y},{z}')
+            # Called in the thread of the CNC.
+            self.cncStatusRelay.statusChanged.emit(state, x, y, z)
 
 
         if self.isCncConnected == False:
@@ -361,6 +381,9 @@ class Gui(QMainWindow, MainWindow):
             self.zeroWorkingCoordinatesButton.setEnabled(False)
             self.goToWorkingZeroButton.setEnabled(False)
 
+    def showCncStatus(self, state, x, y, z):
+        self.machineCoordinatesEdit.setText(f'{state},{x},{y},{z}')
+
 ################################################################################
 #
 # Setup the experiment.
@@ -441,42 +464,119 @@ class Gui(QMainWindow, MainWindow):
          Launches the measurement process.
 
          """
-        if self.isCncConnected and self.isSignalGeneratorConnected and self.isOscilloscopeConnected:
-            scanner = mv.SurfaceVibrationsScanner(self.cnc, self.osc, self.sg, self.experimentParameters)
-            rawData = scanner.startScanning()
-
-            self.data = MeasureDataset.MeasureDataset(rawData, experimentParameters=self.experimentParameters)
-            self.data.save_to(self.experimentParameters['data_filename'])
-        else:
-            self.error("Connect all the instruments before launching the experiment", "Unable to start")
+        self.startScan(mv.VibrationExcitation(self.experimentParameters), "EXPdataTEMP.journal")
 
     def startAcquiring(self):
         """
          Launches the acquisition process.
 
          """
-        if self.isCncConnected and self.isSignalGeneratorConnected and self.isOscilloscopeConnected:
-            impactor = ai.SurfaceImpactGenerator(self.cnc, self.osc, self.sg, self.experimentParameters)
-            rawData = impactor.startAcquiring()
-
-            self.data = MeasureDataset.MeasureDataset(rawData, experimentParameters=self.experimentParameters)
-            self.data.save_to(self.experimentParameters['data_filename'])
-        else:
-            self.error("Connect all the instruments before launching the experiment", "Unable to start")
+        self.startScan(ai.ImpactExcitation(self.experimentParameters), "dataTEMP.journal")
 
     def startAcquiringSineSweep(self):
         """
          Launches the sine sweep acquisition process.
 
          """
-        if self.isCncConnected and self.isSignalGeneratorConnected and self.isOscilloscopeConnected:
-            SineSweeper = ass.SurfaceSineSweep(self.cnc, self.osc, self.sg, self.experimentParameters)
-            rawData = SineSweeper.startAcquiringSineSweep()
+        self.startScan(ass.SineSweepExcitation(self.experimentParameters), "EXPdataTEMP.journal")
 
-            self.data = MeasureDataset.MeasureDataset(rawData, experimentParameters=self.experimentParameters)
-            self.data.save_to(self.experimentParameters['data_filename'])
-        else:
+    def startScan(self, excitation, journalFile):
+        """
+         Run a scan on a worker thread. The GUI stays responsive and the main
+         plot shows the points as they are measured.
+
+         :param excitation: The excitation strategy
+         :type excitation: SE.Excitation
+         :param journalFile: Path to the checkpoint journal.
+         :type journalFile: string
+
+         """
+        if self.scanThread is not None:
+            self.error("A scan is already running", "Unable to start")
+            return
+        if not (self.isCncConnected and self.isSignalGeneratorConnected and self.isOscilloscopeConnected):
             self.error("Connect all the instruments before launching the experiment", "Unable to start")
+            return
+
+        self.scanWorker = ScanWorker.ScanWorker(self.cnc, self.osc, self.sg, dict(self.experimentParameters), excitation, journalFile)
+        self.scanThread = QThread()
+        self.scanWorker.moveToThread(self.scanThread)
+        self.scanThread.started.connect(self.scanWorker.run)
+        self.scanWorker.progress.connect(self.showScanProgress)
+        self.scanWorker.pointDone.connect(self.showScanPoint)
+        self.scanWorker.finished.connect(self.scanFinished)
+        self.scanWorker.cancelled.connect(self.scanCancelled)
+        self.scanWorker.failed.connect(self.scanFailed)
+
+        self.livePlotStarted = False
+        self.setScanControlsRunning(True)
+        self.scanThread.start()
+
+    def setScanControlsRunning(self, running):
+        self.startMeasuringButton.setEnabled(not running)
+        self.startAcquiringButton.setEnabled(not running)
+        self.startAcquiringSineSweepButton.setEnabled(not running)
+        self.scanProgressBar.setEnabled(running)
+        self.pauseScanButton.setEnabled(running)
+        self.cancelScanButton.setEnabled(running)
+        self.pauseScanButton.setText("Pause")
+        if running:
+            self.scanProgressBar.setValue(0)
+
+    def pauseScan(self):
+        """
+         Pause or resume the running scan.
+
+         """
+        if self.scanWorker is None:
+            return
+        if self.pauseScanButton.text() == "Pause":
+            self.scanWorker.pause()
+            self.pauseScanButton.setText("Resume")
+        else:
+            self.scanWorker.resume()
+            self.pauseScanButton.setText("Pause")
+
+    def cancelScan(self):
+        """
+         Cancel the running scan. It can be resumed later from its journal.
+
+         """
+        if self.scanWorker is not None:
+            self.scanWorker.cancel()
+            self.cancelScanButton.setEnabled(False)
+            self.pauseScanButton.setEnabled(False)
+
+    def showScanProgress(self, done, total):
+        self.scanProgressBar.setMaximum(total)
+        self.scanProgressBar.setValue(done)
+
+    def showScanPoint(self, point):
+        if not self.livePlotStarted:
+            (traces, measured) = self.scanWorker.sink.liveView()
+            self.mainPlot.init_live(traces, measured, self.scanWorker.engine.plan)
+            self.livePlotStarted = True
+        self.mainPlot.update_point(point)
+
+    def scanFinished(self, dataset):
+        self.stopScanThread()
+        self.data = dataset
+        self.initPlot()
+
+    def scanCancelled(self):
+        self.stopScanThread()
+        log.info("Scan cancelled, it will resume from its journal.")
+
+    def scanFailed(self, message):
+        self.stopScanThread()
+        self.error(message, "Scan failed")
+
+    def stopScanThread(self):
+        self.scanThread.quit()
+        self.scanThread.wait()
+        self.scanThread = None
+        self.scanWorker = None
+        self.setScanControlsRunning(False)
 
 
 ################################################################################
@@ -508,6 +608,8 @@ class Gui(QMainWindow, MainWindow):
 
          """
         self.mainPlot.update_plot(time=fraction)
+        if self.mainPlot.type == "LIVE_MAP":
+            return
         time = self.data.get_time_scale()*self.data.numberOfSamples*fraction/999
         self.timeEdit.setText(f'{time} s')
 
@@ -575,6 +677,10 @@ class Gui(QMainWindow, MainWindow):
 
         """
         log.debug("Trying to close ressources")
+        if self.scanThread is not None:
+            self.scanWorker.cancel()
+            self.scanThread.quit()
+            self.scanThread.wait()
         try:
             self.cnc.stop()
             #self.cnc.join()
@@ -43,6 +43,12 @@ import json
 import re
 
 import ExperimentParametersIO as ExpParamIO
+import sample_store as SampleStore
+import dataset_container as Container
+import time_pyramid as TimePyramid
+import trace_statistics as TraceStatistics
+import spatial_index as SpatialIndex
+import frequency_maps as FrequencyMaps
 
 
 VIBROMETER_HEIGHT_VOLTAGE = 0.001 # UNIT IN MICROMETER 1 um/V if voltage volt_division_vibrometer is V or 0.001 um/mV if voltage volt_division_vibrometer is MV   !!!
@@ -57,19 +63,499 @@ NUMBER_TIME_DIVISION_OSC = 10
 
 TIME_UNIT_SCALE = 1000 # 1 if time unit_time_division is S or 1000 if if time unit_time_division is MS !!!
 
+Z_SCALE = 3.90625e-06 # 3.90625e-06 Valid when Voltage division 30 mV / 0.0013020799932065218 Valid when Voltage division 10000 mV / 1.302080078125e-05 Valid when Voltage division 100 mV / 6.510419921875e-05  Valid when Voltage division 500 mV
+
+# Statistics of the shots of a reduced scan besides their mean, see fromScanResult().
+SHOT_STATISTICS = ("variance", "min", "max")
+
+# Column names of the traces, see the columnName() method of the excitations.
+_IMPACT_HEAD = re.compile(r'^X(?P<x>[^_]+)_Y(?P<y>[^_]+)_S(?P<shot>\d+)$')
+_SHOT_TOKEN = re.compile(r'^S(?P<shot>\d+)$')
+_EXCITATION_TOKEN = re.compile(r'^E(?P<excitation>\d+)$')
+
+def parseColumnName(name):
+    """
+    Decode the name of a trace column of the legacy ``pd.DataFrame`` format:
+    ``X{x}_Y{y}_S{shot}`` (impacts), ``{x},{y},S{shot},{channel}`` (sine
+    sweep), ``{x},{y},S{shot}`` or ``{x},{y}`` (vibrations), followed by
+    ``,E{excitation}`` for the scans of several excitations. The suffixes of
+    the reduced scans (e.g. ``,mean``) end up in the channel name.
+
+    This is the only place where column names are decoded: everything else
+    uses the arrays of :py:class:`MeasureDataset`.
+
+    :param name: The name of the column.
+    :type name: string
+
+    :return: The X and Y coordinates, the shot (from 0), the channel name (``"data"`` if not given) and the excitation (from 0), or None if the column is not a trace (e.g. the index column of a CSV file).
+    :rtype: (float, float, int, string, int)
+
+    """
+    tokens = str(name).split(",")
+    (shot, excitation) = (0, 0)
+    try:
+        match = _IMPACT_HEAD.match(tokens[0])
+        if match is not None:
+            (x, y, shot) = (float(match['x']), float(match['y']), int(match['shot']) - 1)
+            tokens = tokens[1:]
+        else:
+            (x, y) = (float(tokens[0]), float(tokens[1]))
+            tokens = tokens[2:]
+            if tokens and _SHOT_TOKEN.match(tokens[0]):
+                shot = int(tokens.pop(0)[1:]) - 1
+    except (ValueError, IndexError):
+        return None
+    if tokens and _EXCITATION_TOKEN.match(tokens[-1]):
+        excitation = int(tokens.pop()[1:]) - 1
+    channel = ",".join(tokens) if tokens else "data"
+    return (x, y, shot, channel, excitation)
+
+def columnLayout(columns):
+    """
+    Place the columns of a legacy ``pd.DataFrame`` in the arrays of a dataset.
+
+    :param columns: Names of the columns.
+    :type columns: list
+
+    :return: The traces ``(column position, point, shot, channel)``, the
+             coordinates of the points (shape ``(points, 2)``), the channel
+             names, the ``(excitation, shot)`` of each shot and the names of
+             the columns by ``(x, y, excitation, shot, channel)``.
+    :rtype: (list, np.ndarray, list, list, dict)
+
+    """
+    decoded = [(i, column, parseColumnName(column)) for (i, column) in enumerate(columns)]
+    decoded = [(i, column, d) for (i, column, d) in decoded if d is not None]
+    names = {}
+    points = {}
+    channels = {}
+    for (i, column, (x, y, shot, channel, excitation)) in decoded:
+        points.setdefault((x, y), len(points))
+        channels.setdefault(channel, len(channels))
+        names[(x, y, excitation, shot, channel)] = column
+    shotKeys = sorted({(excitation, shot) for (i, column, (x, y, shot, channel, excitation)) in decoded})
+    shots = {key: i for (i, key) in enumerate(shotKeys)}
+
+    traces = [(i, points[(x, y)], shots[(excitation, shot)], channels[channel]) \
+              for (i, column, (x, y, shot, channel, excitation)) in decoded]
+    coordinates = np.array(list(points.keys()), dtype=np.float64).reshape(-1, 2)
+    return (traces, coordinates, list(channels.keys()), shotKeys, names)
+
+def gridIndices(coordinates):
+    """
+    :return: The rank of each coordinate among the distinct coordinates, i.e. its column (or row) in the grid.
+    :rtype: np.ndarray
+
+    """
+    return np.searchsorted(np.unique(coordinates), coordinates).astype(np.int64)
+
 class MeasureDataset():
+    """
+    Measurements of a scan and the parameters needed to interpret them.
+
+    The traces are held in ``samples``, an array of shape
+    ``(points, shots, channels, samples)``, described by:
+
+    + ``x``, ``y``: machine coordinates of each point,
+    + ``ix``, ``iy``: column and row of each point in the grid, and ``grid``
+      which gives the point at ``[ix, iy]`` (-1 where nothing was measured),
+    + ``channels``: names of the channels,
+    + ``shotExcitation``: excitation of each shot (see
+      :py:class:`scan_engine.ExcitationGroup`),
+    + ``axes``: metadata of each axis (units, sample period, ...).
+
+    A dataset can still be built from the legacy ``pd.DataFrame`` (one column
+    per trace), and :py:meth:`get_data` still returns one.
+
+    :param data: The traces, one column per trace.
+    :type data: pd.Dataframe
+    :param experimentParameters: The experiment parameters
+    :type experimentParameters: dict
+
+    """
     def __init__(self, data=None, experimentParameters=ExpParamIO.getDefaultParameters()):
         self.experimentParameters = experimentParameters
         self.data = data
 
-        self.numberOfSamples = self.data.shape[0]
-
         self.height_coefficient = 0
 
+        # Quality check of the scan, see scan_engine.ScanEngine.qualityReport().
+        self.quality = None
+
         #self.zScale = (NUMBER_VOLTAGE_DIVISION_OSC * self.experimentParameters['volt_division_vibrometer']*VIBROMETER_HEIGHT_VOLTAGE)/MAX_VALUE_OSC_DATA
-        self.zScale = 3.90625e-06 # 3.90625e-06 Valid when Voltage division 30 mV / 0.0013020799932065218 Valid when Voltage division 10000 mV / 1.302080078125e-05 Valid when Voltage division 100 mV / 6.510419921875e-05  Valid when Voltage division 500 mV
+        self.zScale = Z_SCALE
+
+        # Function (x, y, shot, channel) giving the column names of get_data().
+        self.columnName = None
+        # Traces actually measured, shape (points, shots, channels), None if all.
+        self.filled = None
+        # Traces, shape (points, shots, channels, samples), see setTensor().
+        self.samples = None
+        # File the dataset was saved to or loaded from.
+        self.filename = None
+        # Min/max/mean of the traces by bins, see get_pyramid().
+        self.pyramid = None
+        # Summary statistics of each trace, see get_statistics().
+        self.statistics = None
+        # Index of the points by coordinates, see get_index().
+        self.spatialIndex = None
+        # Amplitude and phase maps last computed, see get_frequency_maps().
+        self.frequencyMaps = None
+        # Shots reduced in each trace of a reduced scan, shape (points, channels), None otherwise.
+        self.shotCount = None
+        # Statistics of the shots of a reduced scan, each of shape (points, channels, samples).
+        self.shotStatistics = {}
+        # Raw shots kept by a reduced scan, shape (points, shots, channels, samples).
+        self.rawShots = None
+
+        if data is not None:
+            self.set_data(data)
+
+    def fromArrays(samples, x, y, channels=None, experimentParameters=None, ix=None, iy=None, shotExcitation=None, columnName=None):
+        """
+        Create a dataset from its arrays.
+
+        :param samples: The traces, shape ``(points, shots, channels, samples)``.
+        :type samples: np.ndarray
+        :param x: X machine coordinate of each point.
+        :type x: np.ndarray
+        :param y: Y machine coordinate of each point.
+        :type y: np.ndarray
+        :param channels: Names of the channels (default: ``data``, ``data1``, ...).
+        :type channels: list
+        :param experimentParameters: The experiment parameters (default: the default parameters).
+        :type experimentParameters: dict
+        :param ix: Column of each point in the grid (default: rank of ``x``).
+        :type ix: np.ndarray
+        :param iy: Row of each point in the grid (default: rank of ``y``).
+        :type iy: np.ndarray
+        :param shotExcitation: Excitation of each shot (default: 0).
+        :type shotExcitation: np.ndarray
+        :param columnName: Function ``(x, y, shot, channelName)`` naming the columns of :py:meth:`get_data`.
+        :type columnName: function
+
+        :return: The dataset
+        :rtype: MeasureDataset
+
+        """
+        params = experimentParameters if experimentParameters is not None else ExpParamIO.getDefaultParameters()
+        dataset = MeasureDataset(None, params)
+        if channels is None:
+            channels = ["data"] + [f'data{c}' for c in range(1, samples.shape[2])]
+        dataset.columnName = columnName
+        dataset.setTensor(samples, x, y, channels, ix, iy, shotExcitation)
+        return dataset
+
+    def fromScanResult(result, experimentParameters, columnName):
+        """
+        Create the dataset of a scan from what its sink produced (see
+        :py:mod:`scan_engine`). The arrays of a
+        :py:class:`sample_store.SampleStore` are used directly. The mean of a
+        reduced scan (:py:class:`shot_statistics.ShotStatistics`,
+        :py:class:`coherent_averaging.CoherentAverage`) is the only shot of its
+        points, the other statistics and the raw shots are kept as they are
+        (see :py:meth:`setShotStatistics`).
+
+        :param result: The result of :py:meth:`scan_engine.ScanEngine.run`.
+        :type result: sample_store.SampleStore
+        :param experimentParameters: The experiment parameters
+        :type experimentParameters: dict
+        :param columnName: Function ``(x, y, shot, channelName)`` naming the columns of :py:meth:`get_data`, see the excitations.
+        :type columnName: function
+
+        :return: The dataset
+        :rtype: MeasureDataset
 
+        """
+        if not hasattr(result, "filled"):
+            dataset = MeasureDataset.fromArrays(result.mean[:, np.newaxis], result.x, result.y, result.channels, \
+                                                experimentParameters, columnName=columnName)
+            dataset.setShotStatistics(result.count, {name: getattr(result, name) for name in SHOT_STATISTICS \
+                                                      if getattr(result, name, None) is not None}, getattr(result, "raw", None))
+            return dataset
+        nbShots = result.data.shape[1]
+        dataset = MeasureDataset.fromArrays(result.data, result.x, result.y, result.channels, experimentParameters, \
+                                            shotExcitation=np.repeat(np.arange(result.nbExcitations), nbShots//result.nbExcitations), \
+                                            columnName=columnName)
+        dataset.filled = result.filled
+        return dataset
+
+    def setTensor(self, samples, x, y, channels, ix=None, iy=None, shotExcitation=None):
+        """
+        Set the traces and their description. The legacy ``pd.DataFrame`` is
+        rebuilt from them when needed.
+
+        """
+        self.samples = samples
+        self.data = None
+        self.pyramid = None
+        self.statistics = None
+        self.spatialIndex = None
+        self.frequencyMaps = None
+        self.shotCount = None
+        self.shotStatistics = {}
+        self.rawShots = None
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.channels = list(channels)
+        self.ix = np.asarray(ix, dtype=np.int64) if ix is not None else gridIndices(self.x)
+        self.iy = np.asarray(iy, dtype=np.int64) if iy is not None else gridIndices(self.y)
+        self.shotExcitation = np.asarray(shotExcitation if shotExcitation is not None else np.zeros(samples.shape[1]), dtype=np.int64)
+
+        self.grid = -np.ones((self.ix.max() + 1 if self.ix.size else 0, self.iy.max() + 1 if self.iy.size else 0), dtype=np.int64)
+        self.grid[self.ix, self.iy] = np.arange(self.x.size)
+
+        self.numberOfSamples = samples.shape[-1]
         self.timeScale = (NUMBER_TIME_DIVISION_OSC*self.experimentParameters['time_division'])/(self.numberOfSamples*TIME_UNIT_SCALE)
+        self.axes = {"point": {"unit": "mm", "grid_shape": list(self.grid.shape)}, \
+                     "shot": {"excitation": self.shotExcitation.tolist()}, \
+                     "channel": {"names": self.channels, "z_scale": self.zScale}, \
+                     "sample": {"unit": "s", "period": self.samplePeriod()}}
+
+    def setShotStatistics(self, count, statistics, rawShots=None):
+        """
+        Mark the dataset as the reduction of the shots of each point: its
+        traces are their mean.
+
+        :param count: Number of shots reduced in each trace, shape ``(points, channels)``.
+        :type count: np.ndarray
+        :param statistics: The other statistics of the shots (see ``SHOT_STATISTICS``), each of shape ``(points, channels, samples)``.
+        :type statistics: dict
+        :param rawShots: The raw shots kept, shape ``(points, shots, channels, samples)``.
+        :type rawShots: np.ndarray
+
+        """
+        self.shotCount = np.asarray(count)
+        self.shotStatistics = dict(statistics)
+        self.rawShots = rawShots if rawShots is not None and rawShots.shape[1] > 0 else None
+        self.filled = (self.shotCount > 0)[:, np.newaxis]
+        self.data = None
+
+    def _setTensorFromDataFrame(self, data):
+        """
+        Build the arrays from the legacy ``pd.DataFrame``. Missing traces are zeros.
+
+        """
+        (traces, coordinates, channels, shotKeys, names) = columnLayout(data.columns)
+
+        values = data.iloc[:, [column for (column, point, shot, channel) in traces]].to_numpy()
+        fitsInt16 = values.size > 0 and np.issubdtype(values.dtype, np.integer) and \
+                    values.min() >= np.iinfo(np.int16).min and values.max() <= np.iinfo(np.int16).max
+        samples = np.zeros((coordinates.shape[0], len(shotKeys), len(channels), data.shape[0]), dtype=np.int16 if fitsInt16 else np.float64)
+        for (i, (column, point, shot, channel)) in enumerate(traces):
+            samples[point, shot, channel] = values[:, i]
+
+        self.setTensor(samples, coordinates[:, 0], coordinates[:, 1], channels, \
+                       shotExcitation=[excitation for (excitation, shot) in shotKeys])
+        # Keep the original names of the columns.
+        self.columnName = lambda x, y, shot, channel: names.get((x, y) + shotKeys[shot] + (channel,), self._legacyColumnName(x, y, shot, channel))
+
+    def samplePeriod(self):
+        """
+        :return: The time between two samples, in s.
+        :rtype: float
+
+        """
+        return SampleStore.samplePeriodFromParameters(self.experimentParameters, self.numberOfSamples)
+
+    def pointAt(self, ix, iy):
+        """
+        :return: The point at column ``ix`` and row ``iy`` of the grid, or -1.
+        :rtype: int
+
+        """
+        if 0 <= ix < self.grid.shape[0] and 0 <= iy < self.grid.shape[1]:
+            return int(self.grid[ix, iy])
+        return -1
+
+    def pointOf(self, x, y):
+        """
+        :return: The point measured at the machine coordinates ``(x, y)``.
+        :rtype: int
+
+        """
+        (points, distances) = self.get_index().nearest(x, y)
+        if points[0] < 0 or not (np.isclose(self.x[points[0]], x) and np.isclose(self.y[points[0]], y)):
+            raise KeyError(f'No point measured at ({x}, {y}).')
+        return int(points[0])
+
+    def pointsIn(self, region):
+        """
+        :param region: ``(xMin, xMax, yMin, yMax)``, in machine coordinates (bounds included).
+        :type region: tuple
+
+        :return: The points in the region: a slice when they are evenly spaced in the arrays, an array of points otherwise.
+        :rtype: slice or np.ndarray
+
+        """
+        if region is None:
+            return slice(None)
+        (xMin, xMax, yMin, yMax) = region
+        points = self.get_index().rectangle(xMin, xMax, yMin, yMax)
+        if points.size == 1:
+            return slice(points[0], points[0] + 1)
+        steps = np.diff(points)
+        if points.size > 1 and np.all(steps == steps[0]):
+            return slice(points[0], points[-1] + 1, steps[0])
+        return points
+
+    def get_frame(self, t, shot=0, channel=0):
+        """
+        Get the values of all the points at one sample. ``frame[dataset.grid]``
+        places them on the grid, where the cells of ``dataset.grid`` equal to -1
+        were not measured.
+
+        :param t: The sample.
+        :type t: int
+        :param shot: The shot.
+        :type shot: int
+        :param channel: The channel.
+        :type channel: int
+
+        :return: The values, shape ``(points,)``. A view of the traces, except for the compressed datasets.
+        :rtype: np.ndarray
+
+        """
+        return self.samples[:, shot, channel, t]
+
+    def get_trace(self, x, y, shot=0, channel=0):
+        """
+        Get the trace of one point.
+
+        :param x: X machine coordinate of the point.
+        :type x: float
+        :param y: Y machine coordinate of the point.
+        :type y: float
+        :param shot: The shot, or None for all the shots.
+        :type shot: int
+        :param channel: The channel, or None for all the channels.
+        :type channel: int
+
+        :return: The trace, shape ``(samples,)`` (with the shots and channels axes if they are None). A view of the traces, except for the compressed datasets.
+        :rtype: np.ndarray
+
+        """
+        return self.samples[self.pointOf(x, y), slice(None) if shot is None else shot, slice(None) if channel is None else channel]
+
+    def get_window(self, t0, t1, region=None):
+        """
+        Get the samples ``t0`` to ``t1`` (excluded) of the points of a region.
+
+        :param t0: First sample.
+        :type t0: int
+        :param t1: End sample (excluded).
+        :type t1: int
+        :param region: ``(xMin, xMax, yMin, yMax)`` in machine coordinates, or None for all the points, see :py:meth:`pointsIn`.
+        :type region: tuple
+
+        :return: The window, shape ``(points, shots, channels, t1 - t0)``. A view of the traces when the points of the region are evenly spaced in the arrays (e.g. one line of the grid, or all the points), except for the compressed datasets.
+        :rtype: np.ndarray
+
+        """
+        return self.samples[self.pointsIn(region), :, :, t0:t1]
+
+    def get_statistics(self):
+        """
+        Get the minimum, maximum, peak amplitude, time of the peak and RMS of
+        each trace (see :py:mod:`trace_statistics`). They are read with the
+        dataset, or computed on the first call.
+
+        :return: The statistics, each of shape ``(points, shots, channels)``.
+        :rtype: dict
+
+        """
+        if self.statistics is None:
+            self.statistics = TraceStatistics.computeStatistics(self.samples, self.samplePeriod())
+        return self.statistics
+
+    def get_pyramid(self):
+        """
+        Get the min/max/mean of the traces by bins of a power of two samples
+        (see :py:mod:`time_pyramid`). It is read from the container of the
+        dataset, or computed on the first call and then stored in the
+        container.
+
+        :return: The pyramid
+        :rtype: time_pyramid.TimePyramid
+
+        """
+        if self.pyramid is None:
+            container = self.filename is not None and Container.isContainer(self.filename)
+            if container:
+                self.pyramid = TimePyramid.load(self.filename)
+            if self.pyramid is None and container:
+                try:
+                    with Container.ContainerWriter(self.filename, append=True) as writer:
+                        self.pyramid = TimePyramid.build(self.samples, writer)
+                except OSError as e:
+                    log.warning(f'Cannot store the pyramid in {self.filename}: {str(e)}')
+            if self.pyramid is None:
+                self.pyramid = TimePyramid.build(self.samples)
+        return self.pyramid
+
+    def get_index(self):
+        """
+        Get the index of the points by coordinates (see
+        :py:mod:`spatial_index`). It is read from the container of the
+        dataset, or built on the first call and then stored in the container.
+
+        :return: The index
+        :rtype: spatial_index.SpatialIndex
+
+        """
+        if self.spatialIndex is None:
+            container = self.filename is not None and Container.isContainer(self.filename)
+            if container:
+                self.spatialIndex = SpatialIndex.load(self.filename, self.x, self.y)
+            if self.spatialIndex is None and container:
+                try:
+                    with Container.ContainerWriter(self.filename, append=True) as writer:
+                        self.spatialIndex = SpatialIndex.build(self.x, self.y, writer)
+                except OSError as e:
+                    log.warning(f'Cannot store the index in {self.filename}: {str(e)}')
+            if self.spatialIndex is None:
+                self.spatialIndex = SpatialIndex.build(self.x, self.y)
+        return self.spatialIndex
+
+    def get_frequency_maps(self, frequencies=None, windowName=FrequencyMaps.DEFAULT_WINDOW, padding=None):
+        """
+        Get the amplitude and phase of the traces at some frequencies (see
+        :py:mod:`frequency_maps`). The maps last computed are kept, and stored
+        in the container of the dataset.
+
+        :param frequencies: The frequencies, in Hz (default: the ``frequency`` of the experiment parameters).
+        :type frequencies: list
+        :param windowName: The window (see ``frequency_maps.WINDOWS``).
+        :type windowName: string
+        :param padding: Evaluate the maps at the bins of the FFT of the traces zero-padded to ``padding`` times their length.
+        :type padding: float
+
+        :return: ``frequencies``, ``amplitude`` and ``phase``, shape ``(points, shots, channels, frequencies)``.
+        :rtype: dict
+
+        """
+        if frequencies is None:
+            frequencies = [self.experimentParameters['frequency']]
+        if self.frequencyMaps is not None and FrequencyMaps.matches(self.frequencyMaps["description"], frequencies, windowName, padding):
+            return self.frequencyMaps
+        container = self.filename is not None and Container.isContainer(self.filename)
+        maps = FrequencyMaps.load(self.filename, frequencies, windowName, padding) if container else None
+        if maps is None:
+            maps = FrequencyMaps.frequencyMaps(self.samples, self.samplePeriod(), frequencies, windowName, padding)
+            if container:
+                try:
+                    with Container.ContainerWriter(self.filename, append=True) as writer:
+                        FrequencyMaps.store(maps, writer)
+                except OSError as e:
+                    log.warning(f'Cannot store the maps in {self.filename}: {str(e)}')
+        self.frequencyMaps = maps
+        return maps
+
+    def _legacyColumnName(self, x, y, shot, channel):
+        excitation = self.shotExcitation[shot]
+        first = int(np.flatnonzero(self.shotExcitation == excitation)[0])
+        name = f'{x},{y},S{shot - first + 1},{channel}'
+        return f'{name},E{excitation + 1}' if self.shotExcitation.max() > 0 else name
 
     def set_data(self, data):
         """
@@ -79,18 +565,42 @@ class MeasureDataset():
         :type data: pd.Dataframe
 
         """
+        self._setTensorFromDataFrame(data)
         self.data = data
 
     def get_data(self):
         """
         Get the data.
 
-        :return: The data stored in the MeasureDataset object.
+        :return: The data stored in the MeasureDataset object, one column per trace.
         :rtype: pd.Dataframe
 
         """
+        if self.data is None and self.samples is not None and self.shotCount is not None:
+            self.data = pd.DataFrame(self._shotStatisticsColumns())
+        if self.data is None and self.samples is not None:
+            columnName = self.columnName if self.columnName is not None else self._legacyColumnName
+            columns = {}
+            filled = self.filled if self.filled is not None else np.ones(self.samples.shape[:3], dtype=bool)
+            for (point, shot, channel) in zip(*np.nonzero(filled)):
+                columns[columnName(self.x[point], self.y[point], shot, self.channels[channel])] = self.samples[point, shot, channel]
+            self.data = pd.DataFrame(columns)
         return self.data
 
+    def _shotStatisticsColumns(self):
+        # Columns of a reduced scan, as written by shot_statistics.ShotStatistics.to_dataframe().
+        columnName = self.columnName if self.columnName is not None else self._legacyColumnName
+        columns = {}
+        for (point, channel) in zip(*np.nonzero(self.shotCount)):
+            name = columnName(self.x[point], self.y[point], 0, self.channels[channel])
+            columns[f'{name},mean'] = self.samples[point, 0, channel]
+            for (statistic, values) in self.shotStatistics.items():
+                columns[f'{name},{statistic}'] = values[point, channel]
+            nbRawShots = min(self.rawShots.shape[1], self.shotCount[point, channel]) if self.rawShots is not None else 0
+            for shot in range(nbRawShots):
+                columns[columnName(self.x[point], self.y[point], shot, self.channels[channel])] = self.rawShots[point, shot, channel]
+        return columns
+
     def to_json(self):
         """
         Get the object in the form of a JSON string
@@ -103,17 +613,13 @@ class MeasureDataset():
 
         try:
             bufferCSV = StringIO()
-            self.data.to_csv(bufferCSV)
+            self.get_data().to_csv(bufferCSV)
             rootString['csv_data'] = bufferCSV.getvalue()
             bufferCSV.close()
         except Exception as e:
             log.error(str(e))
 
-        metadata = {}
-
-        metadata['height_coefficient'] = self.height_coefficient
-
-        rootString['metadata'] = json.dumps(metadata, indent=4)
+        rootString['metadata'] = json.dumps(self.metadata(), indent=4)
 
         rootString['experimentParameters'] = ExpParamIO.toJSONFromExpParams(self.experimentParameters)
 
@@ -129,34 +635,76 @@ class MeasureDataset():
         """
         rootString = json.loads(inputJson)
 
+        self.experimentParameters = ExpParamIO.toExpParamsFromJSON(rootString['experimentParameters'])
+
         try:
             dataBuffer = StringIO(rootString['csv_data'])
-            self.data = pd.read_csv(dataBuffer)
+            self.set_data(pd.read_csv(dataBuffer))
         except Exception as e:
             self.data = None
             log.error(str(e))
 
-        metadata = json.loads(rootString['metadata'])
+        self.setMetadata(json.loads(rootString['metadata']))
+
+    def metadata(self):
+        """
+        Get the metadata saved with the dataset. The statistics of the traces
+        are computed if they were not yet.
 
-        self.height_coefficient = metadata['height_coefficient']
+        :return: The metadata
+        :rtype: dict
 
-        self.experimentParameters = ExpParamIO.toExpParamsFromJSON(rootString['experimentParameters'])
+        """
+        metadata = {}
+
+        metadata['height_coefficient'] = self.height_coefficient
+        if self.quality is not None:
+            metadata['quality'] = self.quality
+        if self.samples is not None:
+            metadata['statistics'] = TraceStatistics.toMetadata(self.get_statistics())
+
+        return metadata
 
-    def save_to(self, filename):
+    def setMetadata(self, metadata):
         """
-        Save the object as JSON in the specified file.
+        Set the metadata read with the dataset.
+
+        :param metadata: The metadata
+        :type metadata: dict
+
+        """
+        self.height_coefficient = metadata.get('height_coefficient', 0)
+        self.quality = metadata.get('quality')
+        if 'statistics' in metadata:
+            self.statistics = TraceStatistics.fromMetadata(metadata['statistics'])
+
+    def save_to(self, filename, codec="raw"):
+        """
+        Save the object in the specified file: in the binary container (see
+        :py:mod:`dataset_container`) if its extension is ``.sds``, as JSON
+        otherwise.
 
         :param filename: Path to the file
         :type filename: string
+        :param codec: Compression of the traces in the container, see :py:mod:`waveform_codecs`.
+        :type codec: string
 
         """
+        self.filename = filename
+        if filename.endswith(Container.CONTAINER_EXTENSION):
+            Container.saveDataset(self, filename, codec=codec)
+            with Container.ContainerWriter(filename, append=True) as writer:
+                self.pyramid = TimePyramid.build(self.samples, writer)
+                self.spatialIndex = SpatialIndex.build(self.x, self.y, writer)
+            return
         fhandle = open(filename, "w")
         fhandle.write(self.to_json())
         fhandle.close()
 
     def load_from(filename):
         """
-        Creat an object from the specified JSON file.
+        Creat an object from the specified file: a binary container (the
+        traces are mapped, not read), a JSON or a CSV file.
 
         :param filename: Path to the file
         :type filename: string
@@ -165,6 +713,12 @@ class MeasureDataset():
         :rtype: MeasureDataset
 
         """
+        if Container.isContainer(filename):
+            log.debug("Opening container...")
+            dataset = Container.loadDataset(filename)
+            dataset.filename = filename
+            return dataset
+
         filterJson =  re.compile('.json')
         filterCSV = re.compile('.csv')
         matchJson = filterJson.search(filename)
@@ -187,11 +741,15 @@ class MeasureDataset():
 
             fhandle.close()
 
-            return MeasureDataset(data, parameters)
+            dataset = MeasureDataset(data, parameters)
+            dataset.setMetadata(json.loads(rootString.get('metadata', "{}")))
+            dataset.filename = filename
+            return dataset
         elif matchCSV != None:
             log.debug("Opening CSV file...")
-            data = pd.read_csv(filename)
-            return MeasureDataset(data)
+            dataset = MeasureDataset(pd.read_csv(filename))
+            dataset.filename = filename
+            return dataset
         else:
             raise NameError("The format is not supported.")
 
@@ -0,0 +1,118 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``ScanWorker`` module
+=========================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module runs a scan on a worker thread for the GUI. The scan engine calls
+its callbacks from its own threads; the worker turns them into Qt signals,
+which are delivered to the slots of the GUI in the main thread.
+
+:Example:
+
+>>> thread = QtCore.QThread()
+>>> worker = ScanWorker(cnc, osc, sg, params, VibrationExcitation(params), "scan.journal")
+>>> worker.moveToThread(thread)
+>>> thread.started.connect(worker.run)
+>>> worker.progress.connect(progressBar.setValue)
+>>> thread.start()
+
+"""
+
+import logging as log
+
+from PyQt5 import QtCore
+
+import scan_engine as SE
+import MeasureDataset
+
+class ScanWorker(QtCore.QObject):
+    """
+    Run a scan and save its dataset in the ``data_filename`` of the parameters.
+
+    :param cnc: The handler which controls the CNC.
+    :type cnc: CNC.Cnc
+    :param osc: The handler which controls the oscilloscope.
+    :type osc: Osc.Oscilloscope
+    :param sg: The handler which controls the signal generator.
+    :type sg: SG.SignalGeneratorTCPIP
+    :param params: The experiment parameters
+    :type params: dict
+    :param excitation: The excitation strategy
+    :type excitation: SE.Excitation
+    :param journalFile: Path to the checkpoint journal.
+    :type journalFile: string
+
+    """
+    # Shots done, shots to do.
+    progress = QtCore.pyqtSignal(int, int)
+    # Index of the point in the plan; see sink.liveView().
+    pointDone = QtCore.pyqtSignal(int)
+    # The saved MeasureDataset.
+    finished = QtCore.pyqtSignal(object)
+    cancelled = QtCore.pyqtSignal()
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, cnc, osc, sg, params, excitation, journalFile):
+        super(ScanWorker, self).__init__()
+        self.experimentParameters = params
+        self.excitation = excitation
+        self.sink = SE.sinkFromParameters(params, journalFile)
+        self.engine = SE.ScanEngine(cnc, osc, sg, params, excitation, sink=self.sink, \
+                                    progress=self._progress, pointDone=self.pointDone.emit)
+
+    def _progress(self, shot, done, total):
+        self.progress.emit(done, total)
+
+    @QtCore.pyqtSlot()
+    def run(self):
+        """
+        Run the scan. Called in the worker thread.
+
+        """
+        try:
+            store = self.engine.run()
+            dataset = MeasureDataset.MeasureDataset.fromScanResult(store, self.experimentParameters, self.excitation.columnName)
+            dataset.quality = self.engine.qualityReport()
+            dataset.save_to(self.experimentParameters['data_filename'])
+            self.finished.emit(dataset)
+        except SE.ScanCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            log.error(f'Scan failed: {str(e)}')
+            self.failed.emit(str(e))
+
+    # The engine methods only set events: they can be called from the GUI thread.
+
+    def pause(self):
+        self.engine.pause()
+
+    def resume(self):
+        self.engine.resume()
+
+    def cancel(self):
+        self.engine.cancel()
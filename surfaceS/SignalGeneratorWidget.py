@@ -1,5 +1,6 @@
 
 
+from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import (QApplication, QCheckBox, QComboBox, QDateTimeEdit,
         QDial, QDialog, QGridLayout, QGroupBox, QHBoxLayout, QLabel, QLineEdit,
         QProgressBar, QPushButton, QRadioButton, QScrollBar, QSizePolicy,
@@ -85,3 +86,33 @@ class SignalGeneratorWidget(QVBoxLayout):
         dialog.fileSelected.connect(setFile)
         if dialog.exec_():
             log.debug(f'File selected : {self.mFilePath}')
+
+class SignalPlot(FigureCanvas):
+    """
+    Plot of the signal to send to the signal generator. It lives here rather
+    than in the instrument modules so that these can be imported without Qt.
+
+    """
+    def __init__(self, parent=None, width=5, height=4, dpi=100):
+        self.fig = Figure(figsize=(width, height), dpi=dpi)
+
+        FigureCanvas.__init__(self, self.fig)
+
+        FigureCanvas.setSizePolicy(self,
+                                   QtWidgets.QSizePolicy.Expanding,
+                                   QtWidgets.QSizePolicy.Expanding)
+        FigureCanvas.updateGeometry(self)
+
+        self.ax = self.fig.add_subplot(111)
+
+        self.ready = True
+
+    def plot(self, data):
+        # discards the old graph
+        self.ax.clear()
+
+        # plot data
+        self.ax.plot(data, '*-')
+
+        # refresh canvas
+        self.draw()
@@ -23,6 +23,14 @@
  ################################################################################
 
 if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) > 1:
+        # Headless mode, see the cli module. Qt is never imported.
+        import cli
+
+        sys.exit(cli.main(sys.argv[1:]))
+
     from PyQt5.QtWidgets import QApplication, QLabel
 
     import GUI
@@ -26,24 +26,17 @@ The ``acquire ImpulseResponse`` module
 =================================
 
 *Author:* [Camilo Herandez](mailto:camilo.hernandez@epfl.ch) /
-*Last modification:* 09.11.2020
+*Last modification:* 19.10.2026
 
 In this scenario, we Acquire the data to estimate the impulse response of a piezo ina  plate by recording the response to a sine sweep.
 
 """
 
-import threading
 import time
-import queue
 import logging as log
-import string
-import serial
 
-import pandas as pd
-
-import Oscilloscope as Osc
-import SignalGenerator as SG
-import cnc as CNC
+import scan_engine as SE
+import scan_estimator as Estimator
 
 # CNC default parameters
 CNC_PORT = "COM5"
@@ -77,6 +70,64 @@ TRIGGER_DELAY = -20
 
 log.basicConfig(level=log.DEBUG)
 
+class SineSweepExcitation(SE.Excitation):
+    """
+    Excitation strategy of the sine sweep acquisitions: the signal generator
+    outputs a sine sweep, which is recorded on the channel 3 of the
+    oscilloscope together with the response of the surface.
+
+    :param params: The experiment parameters
+    :type params: dict
+
+    """
+    signalGeneratorParameters = ('channel_sg', 'frequencyStart', 'frequencyEnd', 'sweepTime')
+
+    def __init__(self, params):
+        super(SineSweepExcitation, self).__init__(params)
+        self.channelOnSG = params['channel_sg']
+        self.TRIGchannel = SE.otherChannel(self.channelOnSG)
+        self.channels = [("response", params['vibrometer_channel']), ("sineSweep", 3)]
+        self.extraChannels = [(3, 10000)]
+
+    def shotsPerPoint(self):
+        return self.experimentParameters['samples_per_point']
+
+    def configureSignalGenerator(self, sg):
+        p = self.experimentParameters
+        sg.SetSineSweep_withTrigger(p['frequencyStart'], p['frequencyEnd'], p['sweepTime'])
+        sg.beep()
+
+    def start(self, sg):
+        sg.setChannel(self.channelOnSG)
+        sg.setOutput(state=True)
+        sg.setChannel(self.TRIGchannel)
+        sg.setOutput(state=True)
+
+    def atPoint(self, sg, osc):
+        time.sleep(self.experimentParameters['delay_before_measuring']/2)
+
+    def fire(self, sg, osc, shot):
+        time.sleep(self.experimentParameters['delay_before_measuring'])
+        self.armTrigger(osc)
+        sg.burst()
+        time.sleep(self.experimentParameters['time_division']*0.01) # Time in ms
+
+    def pointDelay(self):
+        return self.experimentParameters['delay_before_measuring']/2
+
+    def shotDelay(self):
+        p = self.experimentParameters
+        return p['delay_before_measuring'] + p['time_division']*0.01
+
+    def stop(self, sg):
+        sg.setChannel(self.channelOnSG)
+        sg.setOutput(state=False)
+        sg.setChannel(self.TRIGchannel)
+        sg.setOutput(state=False)
+
+    def columnName(self, x, y, shot, channel):
+        return f'{x},{y},S{shot + 1},{channel}'
+
 class SurfaceSineSweep():
     """
     Class which handle the SineSweep acquisition process.
@@ -93,6 +144,8 @@ class SurfaceSineSweep():
     """
     def __init__(self, cnc, osc, sg, params):
         self.experimentParameters = params
+        # Quality check of the last scan, see scan_engine.ScanEngine.qualityReport().
+        self.quality = None
         self.signalGenerator = sg
         self.osc = osc
         self.cnc = cnc
@@ -108,6 +161,21 @@ class SurfaceSineSweep():
         self.startX = self.experimentParameters['start_x']
         self.startY = self.experimentParameters['start_y']
 
+    def estimateDuration(self, model=None):
+        """
+        Dry run: estimate the duration of the scan without using the instruments.
+
+        :param model: The cost model (default: calibrated on the ``timings_file`` of the parameters).
+        :type model: scan_estimator.CostModel
+
+        :return: The estimate, see ``scan_estimator.CostModel.estimate``.
+        :rtype: dict
+
+        """
+        if model is None:
+            model = Estimator.CostModel.fromTimings(self.experimentParameters.get('timings_file'))
+        return model.estimate(self.experimentParameters, SineSweepExcitation)
+
     def startAcquiringSineSweep(self):
         """
         Start the sine sweep acquisiton process.
@@ -116,124 +184,10 @@ class SurfaceSineSweep():
         :rtype: pd.Dataframe
 
         """
-        # Configure signal generator
-
-        self.signalGenerator.SetSineSweep_withTrigger(self.frequencyStart, self.frequencyEnd, self.sweepTime)
-        self.signalGenerator.beep()
-
-        self.osc.setGrid(self.experimentParameters['time_division'], \
-                         self.experimentParameters['volt_division_reference'], \
-                         self.experimentParameters['reference_channel'], \
-                         self.experimentParameters['unit_volt_division'], \
-                         self.experimentParameters['unit_time_division'], \
-                         self.experimentParameters['OSCNumSamples'])
-        self.osc.setGrid(self.experimentParameters['time_division'], \
-                         self.experimentParameters['volt_division_vibrometer'], \
-                         self.experimentParameters['vibrometer_channel'], \
-                         self.experimentParameters['unit_volt_division'], \
-                         self.experimentParameters['unit_time_division'], \
-                         self.experimentParameters['OSCNumSamples'])
-        self.osc.setGrid(self.experimentParameters['time_division'], \
-                         10000, \
-                         3, \
-                         self.experimentParameters['unit_volt_division'], \
-                         self.experimentParameters['unit_time_division'], \
-                         self.experimentParameters['OSCNumSamples'])
-        self.osc.setTrigger(self.experimentParameters['trigger_level'], \
-                            self.experimentParameters['trigger_delay'], \
-                            self.experimentParameters['reference_channel'], \
-                            self.experimentParameters['trigger_mode'], \
-                            self.experimentParameters['unit_volt_division'])
-
-        time.sleep(5)
-
-        self.cnc.unlock()
-
-        positionLock = threading.Event()
-
-        ########################################################################
-        # Make measurements
-        ########################################################################
-
-        measuring = True
-        nbPoint = self.nbPointX * self.nbPointY
-
-        xpoint = 0
-        ypoint = 0
-        xIncrement = 1
-        actualSample = 1
-
-        data = pd.DataFrame()
-
-        targetX = xpoint*self.experimentParameters['step_x'] + self.startX
-        targetY = ypoint*self.experimentParameters['step_y'] + self.startY
-
-        self.cnc.goTo(x=self.startX, y=self.startY, event=positionLock)
-
-        self.signalGenerator.setChannel(self.channelOnSG)
-        self.signalGenerator.setOutput(state=True)
-        if self.channelOnSG == 1:
-            self.TRIGchannel = 2
-        else:
-            self.TRIGchannel = 1
-        self.signalGenerator.setChannel(self.TRIGchannel)
-        self.signalGenerator.setOutput(state=True)
-
-        while measuring:
-            log.debug("Start signal and sine sweep acquisition")
-            #time.sleep(2)
-
-            log.debug("Waiting to be in position...")
-            positionLock.wait()
-            log.debug("In position !")
-            positionLock.clear()
-            time.sleep(self.experimentParameters['delay_before_measuring']/2)
-            while actualSample <= self.experimentParameters['samples_per_point']: # While Sample Number minor or equal to Number of samples per point
-                time.sleep(self.experimentParameters['delay_before_measuring'])
-                self.osc.setTrigger(self.experimentParameters['trigger_level'], \
-                                    self.experimentParameters['trigger_delay'], \
-                                    self.experimentParameters['reference_channel'], \
-                                    self.experimentParameters['trigger_mode'], \
-                                    self.experimentParameters['unit_volt_division'])
-
-                self.signalGenerator.burst()
-                time.sleep(self.experimentParameters['time_division']*0.01) # Time in ms
-
-                tmpData = self.osc.acquire(readOnly=True, channel=self.experimentParameters['vibrometer_channel'])
-                data[f'{targetX},{targetY},S{actualSample},response'] = tmpData['data']
-                tmpData = self.osc.acquire(readOnly=True, channel=3)
-                data[f'{targetX},{targetY},S{actualSample},sineSweep'] = tmpData['data']
-                log.debug(f' Measurement done in position {targetX},{targetY}')
-                #Save Data in a Temporal File
-                data.to_pickle("EXPdataTEMP.pkl")
-
-                actualSample += 1 # Increment Sample number counter
-
-            actualSample = 1 # Reset Sample number counter
-
-            # Count the number of point measured
-            xpoint += xIncrement
-            if xpoint >= self.nbPointX or xpoint < 0 :
-                xIncrement = -xIncrement
-                xpoint += xIncrement
-                ypoint +=1
-                if ypoint > self.nbPointY:
-                    measuring = False
-
-            targetX = xpoint*self.experimentParameters['step_x'] + self.startX
-            targetY = ypoint*self.experimentParameters['step_y'] + self.startY
-            log.debug(f'Going to {targetX},{targetY}')
-            self.cnc.goTo(x=targetX, y=targetY, event=positionLock)
-
-
+        excitation = SineSweepExcitation(self.experimentParameters)
+        engine = SE.ScanEngine(self.cnc, self.osc, self.signalGenerator, self.experimentParameters, \
+                               excitation, sink=SE.sinkFromParameters(self.experimentParameters, "EXPdataTEMP.journal"))
+        data = engine.run().to_dataframe(excitation.columnName)
+        self.quality = engine.qualityReport()
         log.info("SineSweep Acquisition done !")
-        self.signalGenerator.setChannel(self.channelOnSG)
-        self.signalGenerator.setOutput(state=False)
-        if self.channelOnSG == 1:
-            self.TRIGchannel = 2
-        else:
-            self.TRIGchannel = 1
-        self.signalGenerator.setChannel(self.TRIGchannel)
-        self.signalGenerator.setOutput(state=False)
-
         return data
@@ -26,7 +26,7 @@ The ``Acquire Impacts`` module
 =================================
 
 *Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
-*Last modification:* 26.11.2019
+*Last modification:* 19.10.2026
 
 In this scenario, we acquire the flexural waves that porgapage in a surface after
 an impact has occured, the vibrations are acquired at a single point or at an array
@@ -37,18 +37,11 @@ developements need to be and will be done to acquire musing a DaQ.
 
 """
 
-import threading
 import time
-import queue
 import logging as log
-import string
-import serial
 
-import pandas as pd
-
-import Oscilloscope as Osc
-import SignalGeneratorTCPIP as SG
-import cnc as CNC
+import scan_engine as SE
+import scan_estimator as Estimator
 
 # CNC default parameters
 CNC_PORT = "COM5"
@@ -83,6 +76,58 @@ TRIGGER_DELAY = -20
 
 log.basicConfig(level=log.DEBUG)
 
+class ImpactExcitation(SE.Excitation):
+    """
+    Excitation strategy of the impact acquisitions: the signal generator sends
+    a pulse to the pneumatic impactor for each shot.
+
+    :param params: The experiment parameters
+    :type params: dict
+
+    """
+    signalGeneratorParameters = ('channel_sg', 'frequency', 'pulse_ampVPP_sg', 'pulse_width_sg')
+
+    def __init__(self, params):
+        super(ImpactExcitation, self).__init__(params)
+        self.channelOnSG = params['channel_sg']
+
+    def shotsPerPoint(self):
+        return self.experimentParameters['samples_per_point']
+
+    def configureSignalGenerator(self, sg):
+        p = self.experimentParameters
+        sg.setChannel(self.channelOnSG)
+        sg.setWave("PULSE")
+        sg.setPulse(p['frequency'], p['pulse_ampVPP_sg']/2, "VPP", p['pulse_ampVPP_sg']/4, p['pulse_width_sg'])
+        sg.setBurstMode(self.channelOnSG)
+        sg.beep()
+
+    def start(self, sg):
+        sg.setOutput(state=True)
+
+    def atPoint(self, sg, osc):
+        sg.burst() #IMPORTANT Forced Impact to lubrify the Pneumatic piston NOT RECORDED
+        time.sleep(self.experimentParameters['delay_before_measuring']/2) # Wait half of the delay_before_measuring time
+
+    def fire(self, sg, osc, shot):
+        time.sleep(self.experimentParameters['delay_before_measuring'])
+        self.armTrigger(osc)
+        sg.burst()
+        time.sleep(self.experimentParameters['time_division']*0.01) # Time in ms
+
+    def pointDelay(self):
+        return self.experimentParameters['delay_before_measuring']/2
+
+    def shotDelay(self):
+        p = self.experimentParameters
+        return p['delay_before_measuring'] + p['time_division']*0.01
+
+    def stop(self, sg):
+        sg.setOutput(state=False)
+
+    def columnName(self, x, y, shot, channel):
+        return f'X{x}_Y{y}_S{shot + 1}'
+
 class SurfaceImpactGenerator():
     """
     Class which handle the acquisition process.
@@ -99,6 +144,8 @@ class SurfaceImpactGenerator():
     """
     def __init__(self, cnc, osc, sg, params):
         self.experimentParameters = params
+        # Quality check of the last scan, see scan_engine.ScanEngine.qualityReport().
+        self.quality = None
         self.signalGenerator = sg
         self.osc = osc
         self.cnc = cnc
@@ -113,6 +160,21 @@ class SurfaceImpactGenerator():
         self.startX = self.experimentParameters['start_x']
         self.startY = self.experimentParameters['start_y']
 
+    def estimateDuration(self, model=None):
+        """
+        Dry run: estimate the duration of the scan without using the instruments.
+
+        :param model: The cost model (default: calibrated on the ``timings_file`` of the parameters).
+        :type model: scan_estimator.CostModel
+
+        :return: The estimate, see ``scan_estimator.CostModel.estimate``.
+        :rtype: dict
+
+        """
+        if model is None:
+            model = Estimator.CostModel.fromTimings(self.experimentParameters.get('timings_file'))
+        return model.estimate(self.experimentParameters, ImpactExcitation)
+
     def startAcquiring(self):
         """
         Start the impact acquisition process.
@@ -121,105 +183,10 @@ class SurfaceImpactGenerator():
         :rtype: pd.Dataframe
 
         """
-        # Configure signal generator
-        self.signalGenerator.setChannel(self.channelOnSG)
-        self.signalGenerator.setWave("PULSE")
-        self.signalGenerator.setPulse(self.frequency, self.pulseAmpVPPSG/2, "VPP", self.pulseAmpVPPSG/4, self.pulseWidtSG)
-        self.signalGenerator.setBurstMode(self.channelOnSG)
-        self.signalGenerator.beep()
-
-        # Configure oscilloscope
-        self.osc.setGrid(self.experimentParameters['time_division'], \
-                         self.experimentParameters['volt_division_reference'], \
-                         self.experimentParameters['reference_channel'], \
-                         self.experimentParameters['unit_volt_division'], \
-                         self.experimentParameters['unit_time_division'], \
-                         self.experimentParameters['OSCNumSamples'])
-        self.osc.setGrid(self.experimentParameters['time_division'], \
-                         self.experimentParameters['volt_division_vibrometer'], \
-                         self.experimentParameters['vibrometer_channel'], \
-                         self.experimentParameters['unit_volt_division'], \
-                         self.experimentParameters['unit_time_division'], \
-                         self.experimentParameters['OSCNumSamples'])
-        self.osc.setTrigger(self.experimentParameters['trigger_level'], \
-                            self.experimentParameters['trigger_delay'], \
-                            self.experimentParameters['reference_channel'], \
-                            self.experimentParameters['trigger_mode'], \
-                            self.experimentParameters['unit_volt_division'])
-
-        time.sleep(5)
-
-        self.cnc.unlock()
-
-        positionLock = threading.Event()
-
-        ########################################################################
-        # Make acquisition
-        ########################################################################
-
-        acquiring = True
-        nbPoint = self.nbPointX * self.nbPointY
-
-        xpoint = 0
-        ypoint = 0
-        xIncrement = 1
-        actualSample = 1
-
-        data = pd.DataFrame()
-
-        targetX = xpoint*self.experimentParameters['step_x'] + self.startX
-        targetY = ypoint*self.experimentParameters['step_y'] + self.startY
-
-        self.cnc.goTo(x=self.startX, y=self.startY, event=positionLock)
-
-        self.signalGenerator.setOutput(state=True)
-
-        while acquiring:
-            log.debug(f'Start signal and acquisition in position {targetX},{targetY}')
-            #time.sleep(2)
-
-            log.debug("Waiting to be in position...")
-            positionLock.wait()
-            log.debug("In position !")
-            positionLock.clear()
-            self.signalGenerator.burst() #IMPORTANT Forced Impact to lubrify the Pneumatic piston NOT RECORDED
-            time.sleep(self.experimentParameters['delay_before_measuring']/2) # Wait half of the delay_before_measuring time
-            while actualSample <= self.experimentParameters['samples_per_point']: # While Sample Number minor or equal to Number of samples per point
-                time.sleep(self.experimentParameters['delay_before_measuring'])
-                self.osc.setTrigger(self.experimentParameters['trigger_level'], \
-                                    self.experimentParameters['trigger_delay'], \
-                                    self.experimentParameters['reference_channel'], \
-                                    self.experimentParameters['trigger_mode'], \
-                                    self.experimentParameters['unit_volt_division'])
-
-                self.signalGenerator.burst()
-                time.sleep(self.experimentParameters['time_division']*0.01) # Time in ms
-                tmpData = self.osc.acquire(readOnly=True, channel=self.experimentParameters['vibrometer_channel'])
-                data[f'X{targetX}_Y{targetY}_S{actualSample}'] = tmpData['data']
-                log.debug(f'Acquired Sample Number {actualSample} in position {targetX},{targetY}')
-                #Save Data in a Temporal File
-                data.to_pickle("dataTEMP.pkl")
-
-                actualSample += 1 # Increment Sample number counter
-
-            actualSample = 1 # Reset Sample number counter
-
-            # Count the number of point acquired
-            xpoint += xIncrement
-            if xpoint >= self.nbPointX or xpoint < 0 :
-                xIncrement = -xIncrement
-                xpoint += xIncrement
-                ypoint +=1
-                if ypoint > self.nbPointY:
-                    acquiring = False
-
-            targetX = xpoint*self.experimentParameters['step_x'] + self.startX
-            targetY = ypoint*self.experimentParameters['step_y'] + self.startY
-            log.debug(f'Going to {targetX},{targetY}')
-            self.cnc.goTo(x=targetX, y=targetY, event=positionLock)
-
-            log.info("Acquisiton done !")
-
-        self.signalGenerator.setOutput(state=False)
-
+        excitation = ImpactExcitation(self.experimentParameters)
+        engine = SE.ScanEngine(self.cnc, self.osc, self.signalGenerator, self.experimentParameters, \
+                               excitation, sink=SE.sinkFromParameters(self.experimentParameters, "dataTEMP.journal"))
+        data = engine.run().to_dataframe(excitation.columnName)
+        self.quality = engine.qualityReport()
+        log.info("Acquisiton done !")
         return data
@@ -0,0 +1,310 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``adaptive_scan`` module
+============================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+Adaptive spatial refinement of a scan.
+
+The grid of the experiment parameters (``nb_point_x`` by ``nb_point_y + 1``
+points, ``step_x`` and ``step_y`` apart) is the finest resolution. The scan
+starts on a coarse subgrid taking one point every ``adaptive_coarse_step``
+grid points. Each cell of the coarse grid gets a score: the largest change of
+the measured field between its corners. The cells with the highest scores are
+split in four, which adds the points at the middle of their edges and at their
+center, and the new cells are scored in turn. Only the cells whose score is
+above ``adaptive_threshold`` times the highest score of the coarse grid are
+split. This goes on until ``adaptive_budget`` points are measured or no cell
+can be split any more.
+
+Each round of refinement is one run of the :py:class:`scan_engine.ScanEngine`.
+The field is either the RMS amplitude of the first channel (``"amplitude"``)
+or its phase at the ``frequency`` of the experiment (``"phase"``).
+
+:Example:
+
+>>> scan = AdaptiveScan(cnc, osc, sg, params, VibrationExcitation(params), budget=400)
+>>> store = scan.run()
+>>> plan = scan.plan
+
+"""
+
+import os
+import logging as log
+
+import numpy as np
+
+import scan_engine as SE
+import sample_store as SampleStore
+
+FIELD_AMPLITUDE = "amplitude"
+FIELD_PHASE = "phase"
+
+# Grid points between the points of the coarse grid.
+DEFAULT_COARSE_STEP = 4
+
+# Cells scoring below this fraction of the best coarse cell are not refined.
+DEFAULT_THRESHOLD = 0.1
+
+def pointFeatures(store, field=FIELD_AMPLITUDE, frequency=None, samplePeriod=None):
+    """
+    Value of the field at each point of a store, computed on the first
+    channel averaged over the shots.
+
+    :param store: The measured points.
+    :type store: sample_store.SampleStore
+    :param field: ``FIELD_AMPLITUDE`` (RMS) or ``FIELD_PHASE`` (phase at ``frequency``).
+    :type field: string
+    :param frequency: Frequency of the phase, in Hz.
+    :type frequency: float
+    :param samplePeriod: Time between two samples, in s.
+    :type samplePeriod: float
+
+    :return: The field, as complex numbers so that the phase wraps: the
+             amplitude for ``FIELD_AMPLITUDE``, :math:`e^{i\\phi}` for
+             ``FIELD_PHASE``.
+    :rtype: np.ndarray
+
+    """
+    traces = store.data[:, :, 0].mean(axis=1, dtype=np.float64)
+    if field == FIELD_AMPLITUDE:
+        return np.sqrt(np.mean(traces**2, axis=-1)).astype(np.complex128)
+    elif field == FIELD_PHASE:
+        t = np.arange(traces.shape[-1])*samplePeriod
+        component = traces @ np.exp(-2j*np.pi*frequency*t)
+        return np.exp(1j*np.angle(component))
+    raise ValueError(f'Unknown field {field}.')
+
+def coarseIndices(nbPoints, step):
+    """
+    :return: The indices of the coarse grid along one axis, including the last point.
+    :rtype: np.ndarray
+
+    """
+    indices = np.arange(0, nbPoints, step)
+    if indices[-1] != nbPoints - 1:
+        indices = np.append(indices, nbPoints - 1)
+    return indices
+
+def serpentineOrder(ix, iy):
+    """
+    :return: The order in which to visit the grid points ``(ix, iy)``: row by row, every other row backwards.
+    :rtype: np.ndarray
+
+    """
+    ix = np.asarray(ix)
+    iy = np.asarray(iy)
+    rows = np.unique(iy, return_inverse=True)[1]
+    direction = np.where(rows % 2 == 0, ix, -ix)
+    return np.lexsort((direction, iy))
+
+class AdaptiveScan():
+    """
+    Scan with adaptive spatial refinement.
+
+    :param cnc: The handler which controls the CNC.
+    :type cnc: CNC.Cnc
+    :param osc: The handler which controls the oscilloscope.
+    :type osc: Osc.Oscilloscope
+    :param sg: The handler which controls the signal generator.
+    :type sg: SG.SignalGeneratorTCPIP
+    :param params: The experiment parameters
+    :type params: dict
+    :param excitation: The excitation strategy
+    :type excitation: SE.Excitation
+    :param budget: Maximum number of points (default: ``adaptive_budget``).
+    :type budget: int
+    :param coarseStep: Grid points between the coarse points (default: ``adaptive_coarse_step``).
+    :type coarseStep: int
+    :param field: ``FIELD_AMPLITUDE`` or ``FIELD_PHASE`` (default: ``adaptive_field``).
+    :type field: string
+    :param threshold: Fraction of the best coarse score below which cells are not split (default: ``adaptive_threshold``).
+    :type threshold: float
+    :param journalFile: Base name of the checkpoint journals, one per round (None to disable).
+    :type journalFile: string
+    :param progress: Progress callback given to each engine.
+    :type progress: function
+
+    After :py:meth:`run`, ``plan`` holds the measured points in the order of
+    the returned store, with their indices in the fine grid.
+
+    """
+    def __init__(self, cnc, osc, sg, params, excitation, budget=None, coarseStep=None, field=None, threshold=None, journalFile=None, progress=None):
+        self.cnc = cnc
+        self.osc = osc
+        self.sg = sg
+        self.experimentParameters = params
+        self.excitation = excitation
+        self.budget = budget if budget is not None else int(params['adaptive_budget'])
+        self.coarseStep = coarseStep if coarseStep is not None else int(params.get('adaptive_coarse_step', DEFAULT_COARSE_STEP))
+        self.field = field if field is not None else params.get('adaptive_field', FIELD_AMPLITUDE)
+        self.threshold = threshold if threshold is not None else float(params.get('adaptive_threshold', DEFAULT_THRESHOLD))
+        self.journalFile = journalFile
+        self.progress = progress
+        self.nbPointX = int(params['nb_point_x'])
+        self.nbPointY = int(params['nb_point_y']) + 1
+        self.plan = None
+        self.rounds = 0
+        # Excitation the instruments are configured for.
+        self.previous = None
+
+    def run(self):
+        """
+        Run the coarse scan and the refinement rounds.
+
+        :return: All the measured points
+        :rtype: sample_store.SampleStore
+
+        """
+        (cx, cy) = np.meshgrid(coarseIndices(self.nbPointX, self.coarseStep), coarseIndices(self.nbPointY, self.coarseStep))
+        cells = []
+        for (x0, x1) in zip(np.unique(cx)[:-1], np.unique(cx)[1:]):
+            for (y0, y1) in zip(np.unique(cy)[:-1], np.unique(cy)[1:]):
+                cells.append((x0, x1, y0, y1))
+
+        self.stores = []
+        self.features = {}
+        self.qualityReports = []
+        self._measure(list(zip(cx.ravel(), cy.ravel())))
+        minScore = self.threshold*max([self._score(c) for c in cells], default=0)
+
+        while len(self.features) < self.budget:
+            splittable = [c for c in cells if (c[1] - c[0] > 1 or c[3] - c[2] > 1) and self._score(c) > minScore]
+            if len(splittable) == 0:
+                break
+            splittable.sort(key=self._score, reverse=True)
+
+            newPoints = set()
+            split = []
+            for cell in splittable:
+                points = [q for q in self._children(cell)[1] if q not in self.features and q not in newPoints]
+                if len(self.features) + len(newPoints) + len(points) > self.budget:
+                    break
+                newPoints.update(points)
+                split.append(cell)
+            if len(split) == 0:
+                break
+
+            for cell in split:
+                cells.remove(cell)
+                cells.extend(self._children(cell)[0])
+            if len(newPoints) > 0:
+                self._measure(sorted(newPoints))
+
+        log.info(f'Adaptive scan done: {len(self.features)} points in {self.rounds} rounds, {self.nbPointX*self.nbPointY} in the full grid.')
+        return self._merge()
+
+    def _score(self, cell):
+        (x0, x1, y0, y1) = cell
+        corners = np.array([self.features[q] for q in ((x0, y0), (x1, y0), (x0, y1), (x1, y1))])
+        return np.abs(corners[:, np.newaxis] - corners[np.newaxis, :]).max()
+
+    def _children(self, cell):
+        """
+        :return: The cells obtained by splitting ``cell`` and the grid points of their corners.
+        :rtype: (list, list)
+
+        """
+        (x0, x1, y0, y1) = cell
+        xs = [x0, (x0 + x1)//2, x1] if x1 - x0 > 1 else [x0, x1]
+        ys = [y0, (y0 + y1)//2, y1] if y1 - y0 > 1 else [y0, y1]
+        cells = [(xs[i], xs[i + 1], ys[j], ys[j + 1]) for i in range(len(xs) - 1) for j in range(len(ys) - 1)]
+        points = [(x, y) for x in xs for y in ys]
+        return (cells, points)
+
+    def _measure(self, points):
+        """
+        Measure a set of grid points with one run of the scan engine.
+
+        """
+        p = self.experimentParameters
+        ix = np.array([q[0] for q in points])
+        iy = np.array([q[1] for q in points])
+        order = serpentineOrder(ix, iy)
+        (ix, iy) = (ix[order], iy[order])
+        plan = SE.ScanPlan(ix*p['step_x'] + p['start_x'], iy*p['step_y'] + p['start_y'], ix, iy)
+
+        log.info(f'Adaptive scan round {self.rounds}: {len(plan)} points.')
+        # The rounds already finished by an interrupted adaptive scan are loaded from their journal.
+        engine = SE.ScanEngine(self.cnc, self.osc, self.sg, p, self.excitation, \
+                               sink=SE.SampleStoreSink(self._journal(self.rounds), keepComplete=True), \
+                               plan=plan, progress=self.progress, previous=self.previous)
+        store = engine.run()
+        if engine.nbShotsDone > 0:
+            self.previous = self.excitation
+        self.qualityReports.append(engine.qualityReport())
+        self.rounds += 1
+
+        samplePeriod = SampleStore.samplePeriodFromParameters(p, store.data.shape[-1])
+        features = pointFeatures(store, self.field, p.get('frequency'), samplePeriod)
+        for (point, q) in enumerate(zip(ix, iy)):
+            self.features[q] = features[point]
+        self.stores.append((plan, store))
+
+    def _journal(self, round):
+        return f'{self.journalFile}.{round}' if self.journalFile is not None else None
+
+    def removeJournals(self):
+        """
+        Remove the journals of the rounds, once the dataset is saved.
+
+        """
+        for round in range(self.rounds):
+            journal = self._journal(round)
+            if journal is not None and os.path.exists(journal):
+                os.remove(journal)
+
+    def qualityReport(self):
+        """
+        Quality check of all the rounds, in the order of the merged plan (see
+        :py:meth:`scan_engine.ScanEngine.qualityReport`).
+
+        :return: The report, or None without quality check.
+        :rtype: dict
+
+        """
+        reports = [report for report in self.qualityReports if report is not None]
+        if len(reports) == 0:
+            return None
+        problems = {}
+        for report in reports:
+            for (problem, count) in report["problems"].items():
+                problems[problem] = problems.get(problem, 0) + count
+        return {"retries": sum((report["retries"] for report in reports), []), \
+                "failed_shots": sum((report["failed_shots"] for report in reports), []), \
+                "problems": problems}
+
+    def _merge(self):
+        plans = [plan for (plan, store) in self.stores]
+        stores = [store for (plan, store) in self.stores]
+        self.plan = SE.ScanPlan(np.concatenate([plan.x for plan in plans]), np.concatenate([plan.y for plan in plans]), \
+                                np.concatenate([plan.ix for plan in plans]), np.concatenate([plan.iy for plan in plans]))
+        merged = SampleStore.SampleStore(len(self.plan), stores[0].data.shape[1], stores[0].channels, 0, self.plan.x, self.plan.y, \
+                                         nbExcitations=stores[0].nbExcitations)
+        merged.data = np.concatenate([store.data for store in stores])
+        merged.filled = np.concatenate([store.filled for store in stores])
+        return merged
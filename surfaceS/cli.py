@@ -0,0 +1,245 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``cli`` module
+==================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+Headless scan runner. It runs one scan per experiment parameters file, without
+the GUI, and writes the datasets to the ``data_filename`` of each file.
+
+Only the modules needed by the chosen mode are imported: neither PyQt5 nor
+matplotlib are loaded. With ``--dry-run``, the duration of the scans is
+estimated (see :py:mod:`scan_estimator`) and no instrument is used. With
+``--group``, the excitations of all the files are played at each point of the
+grid of the first file, and a single dataset is written (see
+:py:class:`scan_engine.ExcitationGroup`).
+
+:Example:
+
+.. code-block:: bash
+
+  python surfaceS --mode impacts plate_A.json plate_B.json
+
+"""
+
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import importlib
+import logging as log
+
+import ExperimentParametersIO as ExpParamIO
+import scan_estimator as Estimator
+from scan_estimator import formatDuration
+
+# Module and excitation class of each scan mode.
+MODES = {
+    "vibrations": ("measure_vibrations", "VibrationExcitation"),
+    "impacts": ("acquire_impacts", "ImpactExcitation"),
+    "sinesweep": ("acquire_SineSweep", "SineSweepExcitation"),
+}
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(prog="surfaceS", description="Run scans without the GUI.")
+    parser.add_argument("parameters", nargs="+", help="Experiment parameters files (JSON).")
+    parser.add_argument("--mode", choices=sorted(MODES.keys()), required=True, help="Kind of scan.")
+    parser.add_argument("--dry-run", action="store_true", help="Only estimate the duration of the scans, without connecting to the instruments.")
+    parser.add_argument("--group", action="store_true", help="Play the excitations of all the files at each point of a single scan.")
+    parser.add_argument("--keep-order", action="store_true", help="Run the scans in the order of the files.")
+    parser.add_argument("--verbose", action="store_true", help="Show the debug messages.")
+    return parser.parse_args(argv)
+
+class ProgressReport():
+    """
+    Print the progress and the estimated remaining time of a scan on stdout.
+
+    :param name: Name of the scan.
+    :type name: string
+
+    """
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.lastPoint = None
+
+    def __call__(self, shot, done, total):
+        if self.lastPoint is None:
+            # Queued scans: count from the first shot of this scan.
+            self.start = time.perf_counter()
+        # One line per point is enough.
+        if shot.point == self.lastPoint and done != total:
+            return
+        self.lastPoint = shot.point
+        elapsed = time.perf_counter() - self.start
+        eta = elapsed/done*(total - done)
+        print(f'[{self.name}] {done}/{total} shots ({100.0*done/total:.1f} %), point {shot.point} at {shot.x},{shot.y}, elapsed {formatDuration(elapsed)}, ETA {formatDuration(eta)}', flush=True)
+
+def connectInstruments(params):
+    """
+    Open the sessions with the oscilloscope, the signal generator and the CNC.
+
+    :return: The CNC, the oscilloscope and the signal generator handlers.
+    :rtype: (CNC.Cnc, Osc.Oscilloscope, SG.SignalGeneratorTCPIP)
+
+    """
+    import Oscilloscope as Osc
+    import SignalGeneratorTCPIP as SG
+    import cnc as CNC
+
+    osc = Osc.Oscilloscope()
+    osc.connect(params['osc_ip'])
+    sg = SG.SignalGeneratorTCPIP()
+    sg.connect(params['sg_ip'])
+    cnc = CNC.Cnc()
+    cnc.connect(params['cnc_port'])
+    cnc.start()
+    return (cnc, osc, sg)
+
+def disconnectInstruments(cnc, osc, sg):
+    for close in (cnc.stop, sg.disconnect, osc.disconnect):
+        try:
+            close()
+        except Exception as e:
+            log.error(f'Problem freeing resources: {str(e)}')
+
+def runAdaptiveScan(cnc, osc, sg, params, excitationClass):
+    """
+    Run one adaptive scan (see :py:mod:`adaptive_scan`) and save its dataset.
+
+    """
+    import adaptive_scan
+    import MeasureDataset
+
+    excitation = excitationClass(params)
+    filename = params['data_filename']
+    scan = adaptive_scan.AdaptiveScan(cnc, osc, sg, params, excitation, \
+                                      journalFile=f'{filename}.journal', progress=ProgressReport(filename))
+    store = scan.run()
+
+    dataset = MeasureDataset.MeasureDataset.fromScanResult(store, params, excitation.columnName)
+    dataset.quality = scan.qualityReport()
+    dataset.save_to(filename)
+    scan.removeJournals()
+    print(f'[{filename}] Dataset written to {filename}', flush=True)
+
+def runGroupedScan(cnc, osc, sg, allParameters, excitationClass):
+    """
+    Run one scan playing the excitations of all the parameters at each point,
+    on the grid of the first parameters, and save its dataset.
+
+    """
+    import scan_engine as SE
+    import MeasureDataset
+
+    params = allParameters[0]
+    filename = params['data_filename']
+    group = SE.ExcitationGroup([excitationClass(p) for p in allParameters])
+    engine = SE.ScanEngine(cnc, osc, sg, params, group, sink=SE.SampleStoreSink(f'{filename}.journal'), \
+                           progress=ProgressReport(filename))
+    store = engine.run()
+
+    dataset = MeasureDataset.MeasureDataset.fromScanResult(store, params, group.columnName)
+    dataset.quality = engine.qualityReport()
+    dataset.save_to(filename)
+    print(f'[{filename}] Dataset of {len(allParameters)} excitations written to {filename}', flush=True)
+
+def main(argv):
+    """
+    Entry point of the headless mode.
+
+    The scans are run as an :py:class:`experiment_queue.ExperimentQueue`,
+    reordered unless ``--keep-order`` is given. The adaptive scans are run
+    after the queue.
+
+    :param argv: Command line arguments (without the program name).
+    :type argv: list
+
+    :return: The exit status
+    :rtype: int
+
+    """
+    args = parseArguments(argv)
+
+    (moduleName, className) = MODES[args.mode]
+    excitationClass = getattr(importlib.import_module(moduleName), className)
+    # After the import: the scan modules call log.basicConfig() when they are loaded.
+    log.basicConfig(level=log.DEBUG if args.verbose else log.WARNING, force=True)
+    allParameters = [ExpParamIO.readParametersFromFile(f) for f in args.parameters]
+    print(f'Startup done in {time.perf_counter() - _START:.2f} s', flush=True)
+
+    if args.dry_run:
+        for (filename, params) in zip(args.parameters, allParameters):
+            model = Estimator.CostModel.fromTimings(params.get('timings_file'))
+            print(f'[{filename}] {Estimator.formatEstimate(model.estimate(params, excitationClass))}', flush=True)
+        return 0
+
+    import experiment_queue
+
+    (cnc, osc, sg) = connectInstruments(allParameters[0])
+    status = 0
+    if args.group:
+        try:
+            runGroupedScan(cnc, osc, sg, allParameters, excitationClass)
+        except Exception as e:
+            log.error(f'Grouped scan failed: {str(e)}')
+            print(f'FAILED: {str(e)}', flush=True)
+            status = 1
+        finally:
+            disconnectInstruments(cnc, osc, sg)
+        return status
+
+    try:
+        queue = experiment_queue.ExperimentQueue(cnc, osc, sg)
+        for params in allParameters:
+            if params.get('adaptive_budget', 0) <= 0:
+                queue.add(params, excitationClass)
+        if not args.keep_order:
+            queue.reorder()
+
+        reports = {run: ProgressReport(run.name()) for run in queue.runs}
+        def runDone(run):
+            if run.error is None:
+                print(f'[{run.name()}] Dataset written, scan done in {formatDuration(time.perf_counter() - reports[run].start)}', flush=True)
+            else:
+                print(f'[{run.name()}] FAILED: {run.error}', flush=True)
+        runs = queue.run(progress=lambda run, shot, done, total: reports[run](shot, done, total), runDone=runDone)
+        if any(run.error is not None for run in runs):
+            status = 1
+
+        for params in allParameters:
+            if params.get('adaptive_budget', 0) > 0:
+                try:
+                    runAdaptiveScan(cnc, osc, sg, params, excitationClass)
+                except Exception as e:
+                    log.error(f'Scan {params["data_filename"]} failed: {str(e)}')
+                    print(f'[{params["data_filename"]}] FAILED: {str(e)}', flush=True)
+                    status = 1
+    finally:
+        disconnectInstruments(cnc, osc, sg)
+    return status
@@ -0,0 +1,332 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``coherent_averaging`` module
+=================================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+Averaging of repeated shots corrected for the trigger jitter.
+
+The delay of every shot relative to a reference is estimated by FFT
+cross-correlation, refined below one sample by a parabolic fit around the
+correlation peak. The shots are then aligned by a phase shift in the frequency
+domain and averaged. All the shots of a batch are processed at once.
+
+The delays can be estimated on another channel than the one averaged, when a
+channel recording the excitation is acquired, for instance the ``sineSweep``
+channel of a sine sweep scan, which is the same for every shot up to the
+jitter.
+
++ :py:func:`coherentAverage` works on an array of shots.
++ :py:func:`averageStore` works on a stored scan (:py:class:`sample_store.SampleStore`).
++ :py:func:`averageDataset` works on a saved dataset (:py:class:`MeasureDataset.MeasureDataset`).
++ :py:class:`CoherentAverage` accumulates the shots during the acquisition and
+  averages each point as soon as its last shot arrives.
+
+"""
+
+import logging as log
+
+import numpy as np
+
+def _fftLength(nbSamples):
+    # Zero padding to avoid the circular wrap-around of the correlation and of the shifts.
+    return 1 << int(np.ceil(np.log2(2*nbSamples)))
+
+def estimateDelays(shots, reference=None, maxDelay=None):
+    """
+    Estimate the delay of each shot relative to a reference.
+
+    :param shots: The shots, shape ``(..., shots, samples)``.
+    :type shots: np.ndarray
+    :param reference: The reference, shape ``(..., samples)`` (default: the first shot).
+    :type reference: np.ndarray
+    :param maxDelay: Largest delay searched, in samples (default: no limit).
+    :type maxDelay: float
+
+    :return: The delays in samples, shape ``(..., shots)``. A positive delay
+             means that the shot arrives after the reference.
+    :rtype: np.ndarray
+
+    """
+    shots = np.asarray(shots, dtype=np.float64)
+    if reference is None:
+        reference = shots[..., 0, :]
+    reference = np.asarray(reference, dtype=np.float64)
+    nfft = _fftLength(shots.shape[-1])
+
+    spectrum = np.fft.rfft(shots, nfft)*np.conj(np.fft.rfft(reference, nfft))[..., np.newaxis, :]
+    correlation = np.fft.irfft(spectrum, nfft)
+    # Negative lags are at the end: put them first.
+    correlation = np.fft.fftshift(correlation, axes=-1)
+    lags = np.arange(nfft) - nfft//2
+    if maxDelay is not None:
+        correlation[..., np.abs(lags) > maxDelay] = -np.inf
+
+    peak = np.argmax(correlation, axis=-1)
+    peak = np.clip(peak, 1, nfft - 2)
+    left = np.take_along_axis(correlation, (peak - 1)[..., np.newaxis], axis=-1)[..., 0]
+    center = np.take_along_axis(correlation, peak[..., np.newaxis], axis=-1)[..., 0]
+    right = np.take_along_axis(correlation, (peak + 1)[..., np.newaxis], axis=-1)[..., 0]
+
+    # Vertex of the parabola through the three points around the peak.
+    curvature = left - 2*center + right
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.where(np.isfinite(curvature) & (curvature < 0), 0.5*(left - right)/curvature, 0.0)
+    return lags[peak] + fraction
+
+def alignShots(shots, delays):
+    """
+    Remove the delays of the shots by a phase shift in the frequency domain.
+
+    :param shots: The shots, shape ``(..., shots, samples)``.
+    :type shots: np.ndarray
+    :param delays: The delays in samples, shape ``(..., shots)``.
+    :type delays: np.ndarray
+
+    :return: The aligned shots, same shape as ``shots``.
+    :rtype: np.ndarray of float64
+
+    """
+    shots = np.asarray(shots, dtype=np.float64)
+    nbSamples = shots.shape[-1]
+    nfft = _fftLength(nbSamples)
+    frequencies = np.fft.rfftfreq(nfft)
+    phase = np.exp(2j*np.pi*frequencies*np.asarray(delays)[..., np.newaxis])
+    return np.fft.irfft(np.fft.rfft(shots, nfft)*phase, nfft)[..., :nbSamples]
+
+def coherentAverage(shots, alignOn=None, reference=None, maxDelay=None):
+    """
+    Align and average repeated shots.
+
+    :param shots: The shots, shape ``(shots, channels, samples)``.
+    :type shots: np.ndarray
+    :param alignOn: Channel used to estimate the delays (default: each channel is aligned on itself).
+    :type alignOn: int
+    :param reference: Reference of the delay estimation (default: the first shot).
+    :type reference: np.ndarray
+    :param maxDelay: Largest delay searched, in samples.
+    :type maxDelay: float
+
+    :return: The average, shape ``(channels, samples)``, and the delays, shape
+             ``(shots,)`` if ``alignOn`` is given, ``(channels, shots)``
+             otherwise.
+    :rtype: (np.ndarray, np.ndarray)
+
+    """
+    shots = np.asarray(shots)
+    if alignOn is not None:
+        delays = estimateDelays(shots[:, alignOn], reference, maxDelay)
+        aligned = alignShots(np.swapaxes(shots, 0, 1), delays[np.newaxis])
+    else:
+        byChannel = np.swapaxes(shots, 0, 1)
+        delays = estimateDelays(byChannel, reference, maxDelay)
+        aligned = alignShots(byChannel, delays)
+    return (aligned.mean(axis=1), delays)
+
+def averageStore(store, alignOn=None, maxDelay=None, pointsPerBatch=16):
+    """
+    Coherent average of every point of a stored scan.
+
+    :param store: The scan.
+    :type store: sample_store.SampleStore
+    :param alignOn: Channel used to estimate the delays (default: each channel is aligned on itself).
+    :type alignOn: int
+    :param maxDelay: Largest delay searched, in samples.
+    :type maxDelay: float
+    :param pointsPerBatch: Number of points processed at once (bounds the memory used).
+    :type pointsPerBatch: int
+
+    :return: The averages, shape ``(points, channels, samples)``, and the delays.
+    :rtype: (np.ndarray, np.ndarray)
+
+    """
+    (nbPoints, nbShots, nbChannels, nbSamples) = store.data.shape
+    mean = np.zeros((nbPoints, nbChannels, nbSamples))
+    delays = np.zeros((nbPoints, nbShots) if alignOn is not None else (nbPoints, nbChannels, nbShots))
+    for begin in range(0, nbPoints, pointsPerBatch):
+        batch = store.data[begin:begin + pointsPerBatch]
+        if alignOn is not None:
+            d = estimateDelays(batch[:, :, alignOn], maxDelay=maxDelay)
+            aligned = alignShots(np.swapaxes(batch, 1, 2), d[:, np.newaxis])
+        else:
+            d = estimateDelays(np.swapaxes(batch, 1, 2), maxDelay=maxDelay)
+            aligned = alignShots(np.swapaxes(batch, 1, 2), d)
+        mean[begin:begin + pointsPerBatch] = aligned.mean(axis=2)
+        delays[begin:begin + pointsPerBatch] = d
+    return (mean, delays)
+
+def averageDataset(dataset, alignOn=None, maxDelay=None, pointsPerBatch=16):
+    """
+    Coherent average of the shots of every point of a dataset, e.g. loaded
+    with :py:meth:`MeasureDataset.MeasureDataset.load_from`. The shots of each
+    excitation are averaged separately.
+
+    The average of a group of shots is in the column of its first shot, with a
+    ``,mean`` suffix.
+
+    :param dataset: The dataset.
+    :type dataset: MeasureDataset.MeasureDataset
+    :param alignOn: Name of the channel used to estimate the delays (default: each channel is aligned on itself).
+    :type alignOn: string
+    :param maxDelay: Largest delay searched, in samples.
+    :type maxDelay: float
+    :param pointsPerBatch: Number of points processed at once (bounds the memory used).
+    :type pointsPerBatch: int
+
+    :return: The dataset of the averages and the delays of the shots, as in :py:func:`averageStore` (the excitations one after the other).
+    :rtype: (MeasureDataset.MeasureDataset, np.ndarray)
+
+    """
+    import MeasureDataset
+
+    if alignOn is not None and alignOn not in dataset.channels:
+        raise ValueError(f'No channel {alignOn} in the dataset, its channels are {dataset.channels}.')
+    alignIndex = dataset.channels.index(alignOn) if alignOn is not None else None
+    excitations = np.unique(dataset.shotExcitation)
+    shots = [np.flatnonzero(dataset.shotExcitation == e) for e in excitations]
+    nbShots = min(s.size for s in shots)
+
+    (nbPoints, nbChannels, nbSamples) = (dataset.samples.shape[0], dataset.samples.shape[2], dataset.samples.shape[3])
+    mean = np.zeros((nbPoints, excitations.size, nbChannels, nbSamples))
+    allDelays = []
+    for (e, excitationShots) in enumerate(shots):
+        for begin in range(0, nbPoints, pointsPerBatch):
+            batch = dataset.samples[begin:begin + pointsPerBatch, excitationShots[:nbShots]]
+            if alignIndex is not None:
+                delays = estimateDelays(batch[:, :, alignIndex], maxDelay=maxDelay)
+                aligned = alignShots(np.swapaxes(batch, 1, 2), delays[:, np.newaxis])
+            else:
+                delays = estimateDelays(np.swapaxes(batch, 1, 2), maxDelay=maxDelay)
+                aligned = alignShots(np.swapaxes(batch, 1, 2), delays)
+            mean[begin:begin + pointsPerBatch, e] = aligned.mean(axis=2)
+            allDelays.append(delays)
+
+    sourceName = dataset.columnName if dataset.columnName is not None else dataset._legacyColumnName
+    firstShots = [int(s[0]) for s in shots]
+    averaged = MeasureDataset.MeasureDataset.fromArrays(mean, dataset.x, dataset.y, dataset.channels, dataset.experimentParameters, \
+                                                        dataset.ix, dataset.iy, excitations, \
+                                                        lambda x, y, e, channel: f'{sourceName(x, y, firstShots[e], channel)},mean')
+    return (averaged, np.concatenate(allDelays))
+
+class CoherentAverage():
+    """
+    Coherent average of the shots of each point, computed during the scan.
+
+    The shots of a point are kept until its last shot arrives; they are then
+    aligned and averaged as one batch and released.
+
+    :param nbPoints: Number of points of the plan.
+    :type nbPoints: int
+    :param nbShots: Number of shots per point.
+    :type nbShots: int
+    :param channels: Names of the traces acquired for each shot.
+    :type channels: list
+    :param nbSamples: Expected number of samples per trace.
+    :type nbSamples: int
+    :param x: X coordinate of each point.
+    :type x: np.ndarray
+    :param y: Y coordinate of each point.
+    :type y: np.ndarray
+    :param alignOn: Index of the channel used to estimate the delays (default: each channel is aligned on itself).
+    :type alignOn: int
+    :param maxDelay: Largest delay searched, in samples.
+    :type maxDelay: float
+
+    The averages are in ``mean``, shape ``(points, channels, samples)``, the
+    delays in ``delays`` and the number of shots received in ``count``.
+
+    """
+    def __init__(self, nbPoints, nbShots, channels, nbSamples, x=None, y=None, alignOn=None, maxDelay=None):
+        self.nbShots = nbShots
+        self.channels = list(channels)
+        self.x = np.asarray(x) if x is not None else np.zeros(nbPoints)
+        self.y = np.asarray(y) if y is not None else np.zeros(nbPoints)
+        self.alignOn = alignOn
+        self.maxDelay = maxDelay
+        self.count = np.zeros((nbPoints, len(self.channels)), dtype=np.int32)
+        self.mean = np.zeros((nbPoints, len(self.channels), nbSamples), dtype=np.float32)
+        self.delays = np.zeros((nbPoints, nbShots) if alignOn is not None else (nbPoints, len(self.channels), nbShots))
+        # point -> shots of the points being measured, shape (shots, channels, samples).
+        self._pending = {}
+
+    def add(self, point, shot, channel, trace):
+        """
+        Add one trace. The first trace fixes the number of samples.
+
+        :param channel: Index of the channel in ``channels``.
+        :type channel: int
+
+        """
+        if trace.shape[0] != self.mean.shape[-1]:
+            if self.count.any():
+                raise ValueError(f'Trace of {trace.shape[0]} samples, expected {self.mean.shape[-1]}.')
+            log.info(f'Resizing the coherent average to {trace.shape[0]} samples per trace.')
+            self.mean = np.zeros(self.mean.shape[:-1] + (trace.shape[0],), dtype=np.float32)
+
+        if point not in self._pending:
+            self._pending[point] = np.zeros((self.nbShots, len(self.channels), trace.shape[0]), dtype=np.int16)
+        self._pending[point][shot, channel] = trace
+        self.count[point, channel] += 1
+        if (self.count[point] == self.nbShots).all():
+            self._average(point)
+
+    def _average(self, point):
+        shots = self._pending.pop(point)
+        nbShots = self.count[point].min()
+        (self.mean[point], delays) = coherentAverage(shots[:nbShots], self.alignOn, maxDelay=self.maxDelay)
+        self.delays[point, ..., :nbShots] = delays
+
+    def finish(self):
+        """
+        Average the points which did not receive all their shots.
+
+        """
+        for point in list(self._pending.keys()):
+            if self.count[point].min() > 0:
+                self._average(point)
+            else:
+                del self._pending[point]
+
+    def to_dataframe(self, columnName):
+        """
+        Convert the averages to the legacy ``pd.DataFrame`` format, with the
+        same column names as :py:meth:`shot_statistics.ShotStatistics.to_dataframe`.
+
+        :param columnName: Function ``(x, y, shot, channelName)`` giving the name of a column.
+        :type columnName: function
+
+        :return: The averages
+        :rtype: pd.Dataframe
+
+        """
+        import pandas as pd
+
+        columns = {}
+        for (point, channel) in zip(*np.nonzero(self.count)):
+            name = columnName(self.x[point], self.y[point], 0, self.channels[channel])
+            columns[f'{name},mean'] = self.mean[point, channel]
+        return pd.DataFrame(columns)
@@ -0,0 +1,545 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``dataset_container`` module
+================================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module reads and writes the binary container of the datasets (``.sds``
+files). The traces are written in chunks of a fixed number of points. Raw
+chunks are opened with ``np.memmap``: opening a dataset reads the index only,
+and the traces are read from the disk when they are used. Compressed chunks
+(see :py:mod:`waveform_codecs`) are decoded when they are used.
+
+The container holds named arrays. Besides the traces of a dataset
+(``samples``), their description (``x``, ``y``, ...) and the statistics of the
+shots of a reduced scan, derived arrays can be appended to an existing
+container without rewriting it.
+
+Container format
+----------------
+
+All integers are little endian.
+
++ Header: the magic ``SURFDSET`` and the version (``uint32``).
++ Chunks of the arrays, one after the other. The chunks of an array split it
+  along its first axis.
++ Index: a JSON object with the ``arrays`` (for each name: ``dtype``,
+  ``shape``, ``chunk_points``, ``codec`` and the ``[offset, size, length]``
+  of its chunks) and the ``attributes`` (experiment parameters, metadata,
+  ...).
++ Footer: the offset and the length of the index (``uint64``) and the magic.
+
+"""
+
+import os
+import copy
+import json
+import struct
+import logging as log
+
+import numpy as np
+
+import waveform_codecs as Codecs
+
+CONTAINER_MAGIC = b'SURFDSET'
+CONTAINER_VERSION = 1
+CONTAINER_EXTENSION = ".sds"
+
+# Suffix of the file of a container being written.
+TEMPORARY_EXTENSION = ".tmp"
+
+# Target size of a chunk of traces.
+DEFAULT_CHUNK_BYTES = 4*1024*1024
+
+# Size of the blocks copied when a container is compacted.
+COPY_BLOCK_BYTES = 16*1024*1024
+
+# Number of decoded chunks kept by a ChunkedArray.
+CACHED_CHUNKS = 8
+
+_HEADER = struct.Struct('<8sI')
+_FOOTER = struct.Struct('<QQ8s')
+
+# Arrays describing the traces of a dataset, see MeasureDataset.
+DATASET_ARRAYS = ("samples", "x", "y", "ix", "iy", "shotExcitation")
+
+# Arrays of the reduced scans besides their mean: the count, the statistics (with a ``shot_`` prefix) and the raw shots.
+SHOT_COUNT_ARRAY = "shot_count"
+RAW_SHOTS_ARRAY = "raw_shots"
+
+def chunkPointsFor(shape, dtype, chunkBytes=DEFAULT_CHUNK_BYTES):
+    """
+    :return: The number of points (first axis) of a chunk of about ``chunkBytes`` bytes.
+    :rtype: int
+
+    """
+    pointBytes = np.dtype(dtype).itemsize*int(np.prod(shape[1:], dtype=np.int64))
+    return max(1, chunkBytes//max(1, pointBytes))
+
+class ContainerWriter():
+    """
+    Write the arrays of a container.
+
+    :param filename: Path to the container.
+    :type filename: string
+    :param append: Add arrays to an existing container instead of creating a new one. The arrays of the same name are replaced.
+    :type append: bool
+
+    A new container is written in a temporary file next to ``filename``,
+    which it replaces when it is closed: a dataset mapped from the file (e.g.
+    saved over itself) keeps reading its traces. When arrays are replaced,
+    the container is compacted the same way on closing, so that it does not
+    grow each time they are recomputed. On error, an existing container is
+    left as it was.
+
+    """
+    def __init__(self, filename, append=False):
+        self.filename = filename
+        self.current = None
+        if append:
+            (self.arrays, self.attributes, indexOffset) = _readIndex(filename)
+            # Index restored on error.
+            self.previous = (copy.deepcopy(self.arrays), copy.deepcopy(self.attributes), indexOffset)
+            self.path = filename
+            self.fhandle = open(filename, "r+b")
+            self.fhandle.truncate(indexOffset)
+            self.fhandle.seek(indexOffset)
+        else:
+            (self.arrays, self.attributes, self.previous) = ({}, {}, None)
+            self.path = filename + TEMPORARY_EXTENSION
+            self.fhandle = open(self.path, "w+b")
+            self.fhandle.write(_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION))
+
+    def beginArray(self, name, shape, dtype, chunkPoints=None, codec="raw"):
+        """
+        Start an array written chunk by chunk with :py:meth:`writeChunk`.
+
+        :param name: Name of the array.
+        :type name: string
+        :param shape: Shape of the array.
+        :type shape: tuple
+        :param dtype: Type of the elements.
+        :type dtype: np.dtype
+        :param chunkPoints: Length of the chunks along the first axis (default: chunks of about ``DEFAULT_CHUNK_BYTES``).
+        :type chunkPoints: int
+        :param codec: Compression of the chunks, see :py:class:`waveform_codecs.Codec`.
+        :type codec: string
+
+        """
+        self.endArray()
+        self.codec = Codecs.Codec(codec)
+        if not self.codec.supports(dtype):
+            raise ValueError(f'The codec {codec} cannot encode the {np.dtype(dtype)} array {name}.')
+        dtype = np.dtype(dtype).newbyteorder('<') if np.dtype(dtype).itemsize > 1 else np.dtype(dtype)
+        self.current = name
+        self.written = 0
+        self.arrays[name] = {"dtype": dtype.str, "shape": [int(n) for n in shape], \
+                             "chunk_points": int(chunkPoints if chunkPoints is not None else chunkPointsFor(shape, dtype)), \
+                             "codec": codec, "chunks": []}
+
+    def writeChunk(self, block):
+        """
+        Write the next chunk of the current array. The blocks may be smaller
+        than a chunk: they are written as they come.
+
+        :param block: The next elements along the first axis.
+        :type block: np.ndarray
+
+        """
+        description = self.arrays[self.current]
+        block = np.ascontiguousarray(block, dtype=np.dtype(description["dtype"]))
+        if tuple(block.shape[1:]) != tuple(description["shape"][1:]):
+            raise ValueError(f'Chunk of shape {block.shape} written in the array {self.current} of shape {tuple(description["shape"])}.')
+        offset = self.fhandle.tell()
+        payload = self.codec.encode(block)
+        self.fhandle.write(payload)
+        description["chunks"].append([offset, len(payload), block.shape[0]])
+        self.written += block.shape[0]
+
+    def endArray(self):
+        """
+        Check that the current array was completely written.
+
+        """
+        if self.current is not None and self.written != self.arrays[self.current]["shape"][0]:
+            raise ValueError(f'{self.written} elements written in the array {self.current} of length {self.arrays[self.current]["shape"][0]}.')
+        self.current = None
+
+    def writeArray(self, name, array, chunkPoints=None, codec="raw"):
+        """
+        Write a whole array, in chunks of ``chunkPoints``.
+
+        """
+        if not hasattr(array, "shape"):
+            array = np.asarray(array)
+        if array.ndim == 0:
+            array = array.reshape(1)
+        self.beginArray(name, array.shape, array.dtype, chunkPoints, codec)
+        chunkPoints = self.arrays[name]["chunk_points"]
+        for begin in range(0, array.shape[0], chunkPoints):
+            self.writeChunk(array[begin:begin + chunkPoints])
+        self.endArray()
+
+    def reserveArray(self, name, shape, dtype, chunkPoints=None):
+        """
+        Allocate an array in the container and map it, to fill it in any
+        order (e.g. sample by sample when converting a CSV file).
+
+        :return: The array, mapped read-write. Call its ``flush()`` method to write the changes.
+        :rtype: np.memmap
+
+        """
+        self.beginArray(name, shape, dtype, chunkPoints)
+        description = self.arrays[name]
+        dtype = np.dtype(description["dtype"])
+        pointBytes = dtype.itemsize*int(np.prod(shape[1:], dtype=np.int64))
+        offset = self.fhandle.tell()
+        for begin in range(0, shape[0], description["chunk_points"]):
+            length = min(description["chunk_points"], shape[0] - begin)
+            description["chunks"].append([offset + begin*pointBytes, length*pointBytes, length])
+        self.written = shape[0]
+        self.endArray()
+        self.fhandle.truncate(offset + shape[0]*pointBytes)
+        self.fhandle.seek(0, os.SEEK_END)
+        self.fhandle.flush()
+        if shape[0]*pointBytes == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode='r+', offset=offset, shape=tuple(shape))
+
+    def close(self):
+        """
+        Write the index and close the container.
+
+        """
+        if self.fhandle is None:
+            return
+        self.endArray()
+        dataEnd = self.fhandle.tell()
+        if self.path == self.filename and self._orphanedBytes(dataEnd) > 0:
+            try:
+                self._compact()
+                return
+            except OSError as e:
+                log.warning(f'Cannot compact {self.filename}, the replaced arrays are kept in it: {str(e)}')
+                self.fhandle.seek(dataEnd)
+        self._writeIndex(self.fhandle)
+        self.fhandle.close()
+        self.fhandle = None
+        if self.path != self.filename:
+            os.replace(self.path, self.filename)
+
+    def _writeIndex(self, fhandle):
+        index = json.dumps({"arrays": self.arrays, "attributes": self.attributes}).encode()
+        indexOffset = fhandle.tell()
+        fhandle.write(index)
+        fhandle.write(_FOOTER.pack(indexOffset, len(index), CONTAINER_MAGIC))
+
+    def _chunks(self):
+        # The chunks of all the arrays, by offset.
+        return sorted((chunk for description in self.arrays.values() for chunk in description["chunks"]), key=lambda chunk: chunk[0])
+
+    def _orphanedBytes(self, dataEnd):
+        # Bytes of the chunks of replaced arrays.
+        return dataEnd - _HEADER.size - sum(chunk[1] for chunk in self._chunks())
+
+    def _compact(self):
+        # The chunks before the first orphaned one keep their offset: the
+        # traces, written first, stay where the mapped datasets read them.
+        chunks = self._chunks()
+        kept = _HEADER.size
+        while chunks and chunks[0][0] == kept:
+            kept += chunks.pop(0)[1]
+        offsets = [chunk[0] for chunk in chunks]
+        compacted = self.filename + TEMPORARY_EXTENSION
+        try:
+            with open(compacted, "wb") as output:
+                self.fhandle.seek(0)
+                _copyBytes(self.fhandle, output, kept)
+                for chunk in chunks:
+                    self.fhandle.seek(chunk[0])
+                    chunk[0] = output.tell()
+                    _copyBytes(self.fhandle, output, chunk[1])
+                self._writeIndex(output)
+            self.fhandle.close()
+            os.replace(compacted, self.filename)
+        except OSError:
+            for (chunk, offset) in zip(chunks, offsets):
+                chunk[0] = offset
+            if self.fhandle.closed:
+                self.fhandle = open(self.filename, "r+b")
+            if os.path.exists(compacted):
+                os.remove(compacted)
+            raise
+        self.fhandle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is not None and self.fhandle is not None and self.previous is None:
+            # The new container is dropped, the file is left as it was.
+            self.fhandle.close()
+            self.fhandle = None
+            os.remove(self.path)
+            return
+        if excType is not None and self.fhandle is not None:
+            # Keep the container as it was: the chunks written are dropped and the replaced arrays restored.
+            (self.arrays, self.attributes, indexOffset) = self.previous
+            self.current = None
+            self.fhandle.truncate(indexOffset)
+            self.fhandle.seek(indexOffset)
+        self.close()
+
+def _copyBytes(source, target, size):
+    while size > 0:
+        block = source.read(min(size, COPY_BLOCK_BYTES))
+        if not block:
+            raise OSError(f'Unexpected end of {source.name}.')
+        target.write(block)
+        size -= len(block)
+
+def _readIndex(filename):
+    with open(filename, "rb") as fhandle:
+        head = fhandle.read(_HEADER.size)
+        if len(head) < _HEADER.size or _HEADER.unpack(head)[0] != CONTAINER_MAGIC:
+            raise ValueError(f'{filename} is not a dataset container.')
+        version = _HEADER.unpack(head)[1]
+        if version != CONTAINER_VERSION:
+            raise ValueError(f'Unsupported container version {version}.')
+        fhandle.seek(0, os.SEEK_END)
+        size = fhandle.tell()
+        if size < _HEADER.size + _FOOTER.size:
+            raise ValueError(f'{filename} is truncated.')
+        fhandle.seek(size - _FOOTER.size)
+        (indexOffset, indexLength, magic) = _FOOTER.unpack(fhandle.read(_FOOTER.size))
+        if magic != CONTAINER_MAGIC or indexOffset + indexLength + _FOOTER.size != size:
+            raise ValueError(f'{filename} is truncated.')
+        fhandle.seek(indexOffset)
+        index = json.loads(fhandle.read(indexLength).decode())
+    return (index["arrays"], index["attributes"], indexOffset)
+
+class Container():
+    """
+    Read the arrays of a container.
+
+    :param filename: Path to the container.
+    :type filename: string
+
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        (self.arrays, self.attributes, _) = _readIndex(filename)
+
+    def names(self):
+        """
+        :return: The names of the arrays of the container.
+        :rtype: list
+
+        """
+        return list(self.arrays.keys())
+
+    def array(self, name, mmap=True):
+        """
+        Get an array of the container.
+
+        :param name: Name of the array.
+        :type name: string
+        :param mmap: Map the array instead of reading it (only the parts used are read from the disk).
+        :type mmap: bool
+
+        :return: The array, read-only when mapped. A compressed array is a :py:class:`ChunkedArray` when mapped.
+        :rtype: np.ndarray
+
+        """
+        if name not in self.arrays:
+            raise KeyError(f'No array {name} in {self.filename}.')
+        description = self.arrays[name]
+        (dtype, shape, chunks) = (np.dtype(description["dtype"]), tuple(description["shape"]), description["chunks"])
+        if not chunks:
+            return np.zeros(shape, dtype=dtype)
+        if description.get("codec", "raw") != "raw":
+            array = ChunkedArray(self.filename, description)
+            return array if mmap else array[:]
+        if mmap:
+            # The chunks of an array are written one after the other.
+            return np.memmap(self.filename, dtype=dtype, mode='r', offset=chunks[0][0], shape=shape)
+        array = np.empty(shape, dtype=dtype)
+        with open(self.filename, "rb") as fhandle:
+            fhandle.seek(chunks[0][0])
+            fhandle.readinto(memoryview(array.reshape(-1).view(np.uint8)))
+        return array
+
+class ChunkedArray():
+    """
+    Compressed array of a container, decoded chunk by chunk when it is
+    indexed. The last decoded chunks are kept.
+
+    Only the first axis selects the chunks: ``array[:, 0, 0]`` decodes the
+    whole array, ``array[10:20]`` the chunks of the points 10 to 19.
+
+    :param filename: Path to the container.
+    :type filename: string
+    :param description: Description of the array in the index.
+    :type description: dict
+
+    """
+    def __init__(self, filename, description, cacheChunks=CACHED_CHUNKS):
+        self.filename = filename
+        self.description = description
+        self.codec = Codecs.Codec(description["codec"])
+        self.dtype = np.dtype(description["dtype"])
+        self.shape = tuple(description["shape"])
+        self.ndim = len(self.shape)
+        self.size = int(np.prod(self.shape, dtype=np.int64))
+        self.nbytes = self.size*self.dtype.itemsize
+        self.cacheChunks = cacheChunks
+        self.cache = {}
+        # First element of each chunk.
+        lengths = [chunk[2] for chunk in description["chunks"]]
+        self.starts = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def chunk(self, i):
+        """
+        :return: The decoded chunk ``i``.
+        :rtype: np.ndarray
+
+        """
+        if i not in self.cache:
+            (offset, size, length) = self.description["chunks"][i]
+            with open(self.filename, "rb") as fhandle:
+                fhandle.seek(offset)
+                payload = fhandle.read(size)
+            if len(self.cache) >= self.cacheChunks:
+                del self.cache[next(iter(self.cache))]
+            self.cache[i] = self.codec.decode(payload, (length,) + self.shape[1:], self.dtype)
+        return self.cache[i]
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        (first, rest) = (slice(None), key) if len(key) == 0 or key[0] is Ellipsis else (key[0], key[1:])
+        points = np.arange(self.shape[0])[first]
+        scalar = np.ndim(points) == 0
+        points = np.atleast_1d(points)
+        chunks = np.searchsorted(self.starts, points, side='right') - 1
+        parts = []
+        # Consecutive points of the same chunk are read together.
+        breaks = np.flatnonzero(np.diff(chunks)) + 1
+        for (begin, end) in zip(np.concatenate([[0], breaks]), np.concatenate([breaks, [points.size]])):
+            if end > begin:
+                c = chunks[begin]
+                parts.append(self.chunk(c)[(points[begin:end] - self.starts[c],) + tuple(rest)])
+        result = np.concatenate(parts) if parts else np.zeros((0,) + self.shape[1:], dtype=self.dtype)[(slice(None),) + tuple(rest)]
+        return result[0] if scalar else result
+
+    def __array__(self, dtype=None):
+        array = self[:]
+        return array if dtype is None else array.astype(dtype)
+
+def isContainer(filename):
+    """
+    :return: True if the file is a dataset container.
+    :rtype: bool
+
+    """
+    try:
+        with open(filename, "rb") as fhandle:
+            return fhandle.read(len(CONTAINER_MAGIC)) == CONTAINER_MAGIC
+    except OSError:
+        return False
+
+def saveDataset(dataset, filename, chunkPoints=None, codec="raw"):
+    """
+    Write a dataset in a container.
+
+    :param dataset: The dataset.
+    :type dataset: MeasureDataset.MeasureDataset
+    :param filename: Path to the container.
+    :type filename: string
+    :param chunkPoints: Number of points of a chunk of traces.
+    :type chunkPoints: int
+    :param codec: Compression of the traces, see :py:class:`waveform_codecs.Codec`. The traces which are not ``int16`` can only be compressed without predictor.
+    :type codec: string
+
+    """
+    if not Codecs.Codec(codec).supports(dataset.samples.dtype):
+        log.warning(f'The codec {codec} cannot encode {dataset.samples.dtype} traces, they are written raw.')
+        codec = "raw"
+    with ContainerWriter(filename) as writer:
+        writer.writeArray("samples", dataset.samples, chunkPoints, codec)
+        for name in DATASET_ARRAYS[1:]:
+            writer.writeArray(name, getattr(dataset, name))
+        if dataset.shotCount is not None:
+            writer.writeArray(SHOT_COUNT_ARRAY, dataset.shotCount)
+            for (name, values) in dataset.shotStatistics.items():
+                writer.writeArray(f'shot_{name}', values, chunkPoints)
+            if dataset.rawShots is not None:
+                writer.writeArray(RAW_SHOTS_ARRAY, dataset.rawShots, chunkPoints)
+        writer.attributes.update(datasetAttributes(dataset))
+
+def datasetAttributes(dataset):
+    """
+    :return: The attributes of the container of a dataset: experiment parameters, channels and metadata.
+    :rtype: dict
+
+    """
+    return {"experiment_parameters": dataset.experimentParameters, \
+            "channels": dataset.channels, \
+            "axes": dataset.axes, \
+            "metadata": dataset.metadata()}
+
+def loadDataset(filename, mmap=True):
+    """
+    Open a dataset written with :py:func:`saveDataset`.
+
+    :param filename: Path to the container.
+    :type filename: string
+    :param mmap: Map the traces instead of reading them.
+    :type mmap: bool
+
+    :return: The dataset
+    :rtype: MeasureDataset.MeasureDataset
+
+    """
+    import MeasureDataset
+
+    container = Container(filename)
+    attributes = container.attributes
+    arrays = {name: container.array(name, mmap=(mmap and name == "samples")) for name in DATASET_ARRAYS}
+    dataset = MeasureDataset.MeasureDataset.fromArrays(arrays["samples"], arrays["x"], arrays["y"], attributes["channels"], \
+                                                       attributes["experiment_parameters"], arrays["ix"], arrays["iy"], \
+                                                       arrays["shotExcitation"])
+    if SHOT_COUNT_ARRAY in container.arrays:
+        statistics = {name: container.array(f'shot_{name}', mmap) for name in MeasureDataset.SHOT_STATISTICS \
+                      if f'shot_{name}' in container.arrays}
+        dataset.setShotStatistics(container.array(SHOT_COUNT_ARRAY, mmap=False), statistics, \
+                                  container.array(RAW_SHOTS_ARRAY, mmap) if RAW_SHOTS_ARRAY in container.arrays else None)
+    dataset.setMetadata(attributes.get("metadata", {}))
+    log.debug(f'Opened {filename}: {dataset.samples.shape} traces')
+    return dataset
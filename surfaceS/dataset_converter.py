@@ -0,0 +1,349 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``dataset_converter`` module
+================================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module converts the legacy datasets (JSON files written by
+:py:meth:`MeasureDataset.MeasureDataset.save_to`, CSV files and pickled
+``pd.DataFrame``) to the binary container (see :py:mod:`dataset_container`).
+
+The CSV text of a JSON dataset is decoded from the file block by block and
+parsed a block of rows at a time, which is written in the mapped traces of the
+container: the memory used does not depend on the size of the dataset. A
+pickle cannot be read partially, it is loaded whole.
+
+The blocks are made of rows and not of columns: a line of the CSV holds one
+sample of every trace, so a block of columns would need the whole text to be
+decoded and scanned once per block. A block of rows is the same time window
+of all the traces, written in place in the mapped samples, with the same
+bound on the memory and a single pass on the file.
+
+The files of a directory are converted in parallel, one process per file.
+
+:Example:
+
+.. code-block:: bash
+
+  python surfaceS/dataset_converter.py --processes 4 measurements/
+
+"""
+
+import os
+import re
+import sys
+import csv
+import json
+import glob
+import time
+import argparse
+import logging as log
+from io import StringIO
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import dataset_container as Container
+import ExperimentParametersIO as ExpParamIO
+import MeasureDataset
+
+# Memory used to convert one file.
+DEFAULT_MAX_MEMORY = 256*1024*1024
+
+# Size of the blocks read from the files.
+READ_BLOCK_BYTES = 1024*1024
+
+# Memory used by a value of a block of rows: its text and its parsed value.
+BYTES_PER_VALUE = 64
+
+DEFAULT_PATTERNS = ("EXP*.json", "*.csv", "*.pkl")
+
+_CSV_KEY = re.compile(r'"csv_data"\s*:\s*"')
+# Longest run of complete characters and escapes of a JSON string.
+_JSON_STRING_PART = re.compile(r'(?:[^"\\]+|\\u[0-9a-fA-F]{4}|\\[^u])*')
+
+class LegacyJsonReader():
+    """
+    Read the CSV text of a JSON dataset line by line, without loading it.
+
+    The other fields of the file (experiment parameters, metadata) are in
+    ``skeleton`` once all the lines have been read.
+
+    :param filename: Path to the JSON file.
+    :type filename: string
+
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.skeleton = None
+
+    def lines(self):
+        """
+        :return: The lines of the CSV text, without their end of line.
+        :rtype: generator
+
+        """
+        with open(self.filename, "r") as fhandle:
+            # Text before the CSV string.
+            prefix = ""
+            while True:
+                block = fhandle.read(READ_BLOCK_BYTES)
+                if not block:
+                    raise ValueError(f'No csv_data in {self.filename}.')
+                prefix += block
+                match = _CSV_KEY.search(prefix)
+                if match is not None:
+                    (prefix, pending) = (prefix[:match.end()], prefix[match.end():])
+                    break
+
+            line = ""
+            while True:
+                part = _JSON_STRING_PART.match(pending).group(0)
+                finished = len(part) < len(pending) and pending[len(part)] == '"'
+                text = json.loads(f'"{part}"')
+                pending = pending[len(part):]
+                lines = (line + text).split("\n")
+                line = lines.pop()
+                for l in lines:
+                    yield l.rstrip("\r")
+                if finished:
+                    break
+                block = fhandle.read(READ_BLOCK_BYTES)
+                if not block:
+                    raise ValueError(f'{self.filename} is truncated.')
+                pending += block
+            if line:
+                yield line.rstrip("\r")
+
+            # The CSV string is replaced by an empty one.
+            self.skeleton = json.loads(prefix + pending + fhandle.read())
+
+class LegacyCsvReader():
+    """
+    Read a CSV dataset line by line. It has no other fields than the traces.
+
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.skeleton = None
+
+    def lines(self):
+        with open(self.filename, "r") as fhandle:
+            for line in fhandle:
+                yield line.rstrip("\r\n")
+
+def _rowBlocks(lines, nbRows):
+    """
+    Group the rows after the header line by blocks of ``nbRows``.
+
+    :return: The header (list of the column names), then the blocks (arrays of shape ``(rows, columns)``).
+    :rtype: generator
+
+    """
+    import pandas as pd
+
+    lines = iter(lines)
+    yield next(csv.reader([next(lines)]))
+    block = []
+    for line in lines:
+        if line:
+            block.append(line)
+        if len(block) == nbRows:
+            yield pd.read_csv(StringIO("\n".join(block)), header=None)
+            block = []
+    if block:
+        yield pd.read_csv(StringIO("\n".join(block)), header=None)
+
+def _isInt16(block):
+    values = block.to_numpy()
+    return all(np.issubdtype(dtype, np.integer) for dtype in block.dtypes) and \
+           (values.size == 0 or (values.min() >= np.iinfo(np.int16).min and values.max() <= np.iinfo(np.int16).max))
+
+def convertFile(filename, output=None, maxMemory=DEFAULT_MAX_MEMORY, dtype=None):
+    """
+    Convert a legacy dataset to a container.
+
+    :param filename: Path to the dataset (``.json``, ``.csv`` or ``.pkl``).
+    :type filename: string
+    :param output: Path to the container (default: the same name with the ``.sds`` extension).
+    :type output: string
+    :param maxMemory: Memory used for the conversion, in bytes (except for the pickles).
+    :type maxMemory: int
+    :param dtype: Type of the traces. By default, ``int16`` if all the values are integers which fit, ``float64`` otherwise, which costs one more pass on the file.
+    :type dtype: np.dtype
+
+    :return: The statistics of the conversion: ``input``, ``output``, ``bytes`` (size of the input), ``traces``, ``samples`` (per trace) and ``seconds``.
+    :rtype: dict
+
+    """
+    start = time.perf_counter()
+    if output is None:
+        output = os.path.splitext(filename)[0] + Container.CONTAINER_EXTENSION
+    extension = os.path.splitext(filename)[1].lower()
+
+    if extension in (".pkl", ".pickle"):
+        import pandas as pd
+
+        log.warning(f'{filename}: a pickle is loaded whole, and it has no experiment parameters (the default ones are used).')
+        dataset = MeasureDataset.MeasureDataset(pd.read_pickle(filename), ExpParamIO.getDefaultParameters())
+        Container.saveDataset(dataset, output)
+        (traces, nbSamples) = (int(np.prod(dataset.samples.shape[:3])), dataset.numberOfSamples)
+    else:
+        readerClass = LegacyJsonReader if extension == ".json" else LegacyCsvReader
+        (traces, nbSamples) = _convertCsv(filename, readerClass, output, maxMemory, dtype)
+
+    seconds = time.perf_counter() - start
+    log.info(f'{filename} converted to {output} in {seconds:.1f} s')
+    return {"input": filename, "output": output, "bytes": os.path.getsize(filename), \
+            "traces": traces, "samples": nbSamples, "seconds": seconds}
+
+def _convertCsv(filename, readerClass, output, maxMemory, dtype):
+    lines = lambda: readerClass(filename).lines()
+    # The header gives the size of the blocks.
+    header = next(csv.reader([next(lines())]))
+    (layout, coordinates, channels, shotKeys, names) = MeasureDataset.columnLayout(header)
+    if not layout:
+        raise ValueError(f'No trace in {filename}.')
+    nbRows = max(1, maxMemory//(len(header)*BYTES_PER_VALUE))
+
+    # A first pass counts the samples, without parsing them.
+    nbSamples = sum(1 for line in lines() if line) - 1
+
+    # The traces are written as int16 unless a value does not fit, in which
+    # case the conversion is restarted with float64.
+    reader = readerClass(filename)
+    columns = np.array([column for (column, point, shot, channel) in layout])
+    (points, shots, channelIndices) = (np.array([l[1] for l in layout]), np.array([l[2] for l in layout]), np.array([l[3] for l in layout]))
+    with Container.ContainerWriter(output) as writer:
+        samples = writer.reserveArray("samples", (coordinates.shape[0], len(shotKeys), len(channels), nbSamples), \
+                                      dtype if dtype is not None else np.int16)
+        begin = 0
+        blocks = _rowBlocks(reader.lines(), nbRows)
+        next(blocks)
+        for block in blocks:
+            block = block.iloc[:, columns]
+            if dtype is None and not _isInt16(block):
+                log.debug(f'{filename}: the traces are not int16, converting them as float64')
+                del samples
+                writer.close()
+                return _convertCsv(filename, readerClass, output, maxMemory, np.float64)
+            samples[points, shots, channelIndices, begin:begin + block.shape[0]] = block.to_numpy().T
+            begin += block.shape[0]
+            samples.flush()
+
+        params = ExpParamIO.getDefaultParameters()
+        metadata = {}
+        if reader.skeleton is not None:
+            params = ExpParamIO.toExpParamsFromJSON(reader.skeleton['experimentParameters'])
+            metadata = json.loads(reader.skeleton.get('metadata', "{}"))
+        dataset = MeasureDataset.MeasureDataset.fromArrays(samples, coordinates[:, 0], coordinates[:, 1], channels, params, \
+                                                           shotExcitation=[excitation for (excitation, shot) in shotKeys])
+        dataset.setMetadata(metadata)
+        for name in Container.DATASET_ARRAYS[1:]:
+            writer.writeArray(name, getattr(dataset, name))
+        writer.attributes.update(Container.datasetAttributes(dataset))
+        del samples
+    return (len(layout), nbSamples)
+
+def convertDirectory(directory, outputDirectory=None, patterns=DEFAULT_PATTERNS, processes=None, maxMemory=DEFAULT_MAX_MEMORY):
+    """
+    Convert the legacy datasets of a directory, in parallel.
+
+    :param directory: The directory.
+    :type directory: string
+    :param outputDirectory: Directory of the containers (default: next to the datasets).
+    :type outputDirectory: string
+    :param patterns: Names of the files to convert.
+    :type patterns: tuple
+    :param processes: Number of files converted at once (default: number of processors).
+    :type processes: int
+    :param maxMemory: Memory used by each process, in bytes.
+    :type maxMemory: int
+
+    :return: The statistics of each conversion (see :py:func:`convertFile`), with an ``error`` for the files which could not be converted.
+    :rtype: list
+
+    """
+    filenames = sorted({f for pattern in patterns for f in glob.glob(os.path.join(directory, pattern))})
+    outputs = [None if outputDirectory is None else \
+               os.path.join(outputDirectory, os.path.splitext(os.path.basename(f))[0] + Container.CONTAINER_EXTENSION) \
+               for f in filenames]
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(convertFile, f, o, maxMemory) for (f, o) in zip(filenames, outputs)]
+        for (filename, future) in zip(filenames, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                log.error(f'Conversion of {filename} failed: {str(e)}')
+                results.append({"input": filename, "error": str(e)})
+    return results
+
+def formatThroughput(results, seconds):
+    """
+    :return: A summary of conversions which lasted ``seconds``.
+    :rtype: string
+
+    """
+    done = [r for r in results if "error" not in r]
+    megabytes = sum(r["bytes"] for r in done)/1e6
+    traces = sum(r["traces"] for r in done)
+    return f'{len(done)}/{len(results)} files, {megabytes:.1f} MB in {seconds:.1f} s: ' \
+           f'{megabytes/max(seconds, 1e-9):.1f} MB/s, {traces/max(seconds, 1e-9):.0f} traces/s'
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="dataset_converter", description="Convert legacy datasets to the binary container.")
+    parser.add_argument("paths", nargs="+", help="Datasets or directories of datasets.")
+    parser.add_argument("--output", help="Directory of the containers (default: next to the datasets).")
+    parser.add_argument("--processes", type=int, help="Number of files converted at once.")
+    parser.add_argument("--max-memory", type=int, default=DEFAULT_MAX_MEMORY//(1024*1024), help="Memory used by each process, in MB.")
+    args = parser.parse_args(argv)
+    log.basicConfig(level=log.INFO)
+
+    start = time.perf_counter()
+    results = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            results += convertDirectory(path, args.output, processes=args.processes, maxMemory=args.max_memory*1024*1024)
+        else:
+            output = None if args.output is None else \
+                     os.path.join(args.output, os.path.splitext(os.path.basename(path))[0] + Container.CONTAINER_EXTENSION)
+            try:
+                results.append(convertFile(path, output, args.max_memory*1024*1024))
+            except Exception as e:
+                log.error(f'Conversion of {path} failed: {str(e)}')
+                results.append({"input": path, "error": str(e)})
+    for r in results:
+        if "error" in r:
+            print(f'[{r["input"]}] FAILED: {r["error"]}', flush=True)
+        else:
+            print(f'[{r["input"]}] {r["traces"]} traces of {r["samples"]} samples written to {r["output"]} in {r["seconds"]:.1f} s', flush=True)
+    print(formatThroughput(results, time.perf_counter() - start), flush=True)
+    return 0 if all("error" not in r for r in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
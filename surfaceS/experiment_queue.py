@@ -0,0 +1,229 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``experiment_queue`` module
+===============================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+Queue of scans run one after the other on the same instrument sessions, e.g.
+a sweep over several frequencies or amplitudes on the same area.
+
++ The oscilloscope, the signal generator and the CNC stay connected between the
+  runs.
++ Between two runs, only the instruments whose settings changed are configured
+  again, and the settling time is skipped when nothing changed (see
+  :py:meth:`scan_engine.Excitation.reconfigure`).
++ Each dataset is saved to the ``data_filename`` of its parameters.
++ The runs can be reordered to reduce the reconfigurations and the travel of
+  the CNC between the end of a scan and the beginning of the next one.
+
+:Example:
+
+>>> queue = ExperimentQueue(cnc, osc, sg)
+>>> for frequency in (1000, 2000, 5000):
+...     params = dict(baseParameters, frequency=frequency, data_filename=f'sweep_{frequency}.json')
+...     queue.add(params, VibrationExcitation)
+>>> queue.reorder()
+>>> results = queue.run()
+
+"""
+
+import os
+import logging as log
+
+import numpy as np
+
+import scan_engine as SE
+import scan_estimator as Estimator
+import MeasureDataset
+
+class Run():
+    """
+    One scan of the queue.
+
+    :param params: The experiment parameters
+    :type params: dict
+    :param excitationClass: The class of the excitation strategy.
+    :type excitationClass: class
+
+    After the run, ``dataset`` holds the saved dataset, or ``error`` the
+    message of the failure.
+
+    """
+    def __init__(self, params, excitationClass):
+        self.experimentParameters = params
+        self.excitationClass = excitationClass
+        self.excitation = excitationClass(params)
+        self.plan = SE.ScanPlan.fromParameters(params)
+        self.dataset = None
+        self.error = None
+
+    def name(self):
+        return self.experimentParameters['data_filename']
+
+def transitionCost(current, following, model=None):
+    """
+    Estimated time lost between two runs: the configuration of the instruments
+    which change and the travel from the last point of ``current`` to the
+    first point of ``following``.
+
+    :param current: The run done first (None at the beginning of the queue).
+    :type current: Run
+    :param following: The next run.
+    :type following: Run
+    :param model: Cost model giving the configuration time and the CNC speed.
+    :type model: scan_estimator.CostModel
+
+    :return: The cost in s
+    :rtype: float
+
+    """
+    c = (model if model is not None else Estimator.CostModel()).coefficients
+    configure = c["configure_time"] + SE.SETTLING_TIME_AFTER_CONFIGURATION
+    if current is None:
+        return configure
+    cost = 0.0
+    a = current.excitation
+    b = following.excitation
+    if type(a) is not type(b) or a.differsFrom(b, b.signalGeneratorParameters) or \
+       a.differsFrom(b, SE.OSCILLOSCOPE_PARAMETERS) or a.extraChannels != b.extraChannels:
+        cost += configure
+    distance = np.hypot(following.plan.x[0] - current.plan.x[-1], following.plan.y[0] - current.plan.y[-1])
+    cost += c["move_overhead"] + distance/c["move_speed"]
+    return cost
+
+class ExperimentQueue():
+    """
+    Run several scans on the same instrument sessions.
+
+    :param cnc: The handler which controls the CNC (connected).
+    :type cnc: CNC.Cnc
+    :param osc: The handler which controls the oscilloscope (connected).
+    :type osc: Osc.Oscilloscope
+    :param sg: The handler which controls the signal generator (connected).
+    :type sg: SG.SignalGeneratorTCPIP
+    :param model: Cost model used to reorder the runs (default: calibrated on the ``timings_file`` of the first run).
+    :type model: scan_estimator.CostModel
+
+    """
+    def __init__(self, cnc, osc, sg, model=None):
+        self.cnc = cnc
+        self.osc = osc
+        self.sg = sg
+        self.model = model
+        self.runs = []
+
+    def add(self, params, excitationClass):
+        """
+        Queue a scan.
+
+        :return: The queued run
+        :rtype: Run
+
+        """
+        run = Run(params, excitationClass)
+        self.runs.append(run)
+        return run
+
+    def reorder(self):
+        """
+        Reorder the queue to reduce the time lost between the runs. The first
+        run stays first; each following run is the one with the cheapest
+        transition from the previous one (see :py:func:`transitionCost`).
+
+        :return: The estimated time saved, in s.
+        :rtype: float
+
+        """
+        if len(self.runs) < 3:
+            return 0.0
+        if self.model is None:
+            self.model = Estimator.CostModel.fromTimings(self.runs[0].experimentParameters.get('timings_file'))
+
+        before = self.totalTransitionCost()
+        ordered = [self.runs[0]]
+        remaining = self.runs[1:]
+        while len(remaining) > 0:
+            costs = [transitionCost(ordered[-1], run, self.model) for run in remaining]
+            ordered.append(remaining.pop(int(np.argmin(costs))))
+        self.runs = ordered
+        saved = before - self.totalTransitionCost()
+        log.info(f'Queue reordered: {", ".join(run.name() for run in self.runs)} ({saved:.0f} s saved).')
+        return saved
+
+    def totalTransitionCost(self):
+        """
+        :return: The estimated time lost between the runs, in s.
+        :rtype: float
+
+        """
+        previous = None
+        total = 0.0
+        for run in self.runs:
+            total += transitionCost(previous, run, self.model)
+            previous = run
+        return total
+
+    def run(self, progress=None, runDone=None):
+        """
+        Run all the scans and save their datasets. A failed scan does not stop
+        the queue.
+
+        :param progress: Function ``(run, shot, done, total)`` called after each shot.
+        :type progress: function
+        :param runDone: Function called with each run as soon as it is over (check its ``error``).
+        :type runDone: function
+
+        :return: The runs, with their dataset or their error.
+        :rtype: list
+
+        """
+        previous = None
+        for (i, run) in enumerate(self.runs):
+            params = run.experimentParameters
+            log.info(f'Queue: run {i + 1}/{len(self.runs)}, {run.name()}')
+            callback = (lambda shot, done, total, run=run: progress(run, shot, done, total)) if progress is not None else None
+            journal = f'{run.name()}.journal'
+            engine = SE.ScanEngine(self.cnc, self.osc, self.sg, params, run.excitation, \
+                                   sink=SE.sinkFromParameters(params, journal), \
+                                   plan=run.plan, progress=callback, previous=previous)
+            try:
+                result = engine.run()
+                run.dataset = MeasureDataset.MeasureDataset.fromScanResult(result, params, run.excitation.columnName)
+                run.dataset.quality = engine.qualityReport()
+                run.dataset.save_to(run.name())
+                # The journal is only needed to resume an interrupted run.
+                if os.path.exists(journal):
+                    os.remove(journal)
+                previous = run.excitation
+            except Exception as e:
+                log.error(f'Queue: {run.name()} failed: {str(e)}')
+                run.error = str(e)
+                # The state of the instruments is unknown.
+                previous = None
+            if runDone is not None:
+                runDone(run)
+        return self.runs
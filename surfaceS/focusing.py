@@ -0,0 +1,212 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``focusing`` module
+=======================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module computes the drive signals of the piezoelectric actuators needed to
+focus the vibrations of the surface on one or several points.
+
+The input is the set of measured impulse responses between every actuator and
+every point of the surface, as an array of shape
+``(actuators, points, samples)``. Two strategies are available:
+
++ ``"TR"``: time reversal. The drive signal of each actuator is its impulse
+  response to the focal point played backwards.
++ ``"IF"``: regularised inverse filter. For each frequency bin, the drive
+  signals are the least-squares solution that produces a unit impulse at the
+  focal point and nothing at the other measured points.
+
+All the focal points are computed at once: the linear systems of every
+frequency bin are solved as a single batched ``numpy.linalg.solve`` call.
+
+:Example:
+
+>>> import focusing
+>>> signals = focusing.computeFocusingSignals(ir, [12, 40], method="IF")
+>>> sg.setArbitraryWaveform(focusing.toArbitraryWaveform(signals[0, 0]), register=1)
+
+"""
+
+import logging as log
+import numpy as np
+
+METHOD_TIME_REVERSAL = "TR"
+METHOD_INVERSE_FILTER = "IF"
+
+DEFAULT_REGULARIZATION = 1e-3
+
+# Number of frequency bins solved together. Bounds the memory used by the
+# (bins, actuators, points) spectra of the inverse filter.
+FREQUENCY_CHUNK_SIZE = 2048
+
+# Maximum value accepted by the arbitrary waveform memory of the TG2512A.
+ARB_MAX_VALUE = 16383
+
+def computeFocusingSignals(impulseResponses, focalPoints, method:str=METHOD_TIME_REVERSAL, regularization:float=DEFAULT_REGULARIZATION, signalLength:int=None):
+    """
+    Compute the drive signals that focus the vibrations on the focal points.
+
+    :param impulseResponses: Impulse responses, shape ``(actuators, points, samples)``.
+    :type impulseResponses: np.ndarray
+    :param focalPoints: Index (or list of indexes) of the focal points along the ``points`` axis.
+    :type focalPoints: int or list
+    :param method: ``"TR"`` for time reversal or ``"IF"`` for the regularised inverse filter.
+    :type method: string
+    :param regularization: Tikhonov regularisation of the inverse filter, relative to the mean energy of each frequency bin.
+    :type regularization: float
+    :param signalLength: Length of the output signals (default: the length of the impulse responses).
+    :type signalLength: int
+
+    :return: The drive signals, shape ``(focal points, actuators, signalLength)``, normalised so that the largest absolute value of each focal point is 1.
+    :rtype: np.ndarray
+
+    """
+    impulseResponses = np.asarray(impulseResponses, dtype=np.float64)
+    if impulseResponses.ndim != 3:
+        raise ValueError("The impulse responses must be of shape (actuators, points, samples).")
+
+    focalPoints = np.atleast_1d(np.asarray(focalPoints, dtype=np.intp))
+    nbActuators, nbPoints, nbSamples = impulseResponses.shape
+    if np.any(focalPoints < 0) or np.any(focalPoints >= nbPoints):
+        raise IndexError(f'Focal points must be in [0, {nbPoints}).')
+
+    if signalLength is None:
+        signalLength = nbSamples
+
+    if method == METHOD_TIME_REVERSAL:
+        signals = impulseResponses[:, focalPoints, ::-1].transpose(1, 0, 2)
+        signals = _fitLength(signals, signalLength)
+    elif method == METHOD_INVERSE_FILTER:
+        signals = _inverseFilter(impulseResponses, focalPoints, regularization, signalLength)
+    else:
+        raise ValueError(f'Unknown focusing method: {method}')
+
+    return _normalize(signals)
+
+def _inverseFilter(impulseResponses, focalPoints, regularization, signalLength):
+    """
+    Solve the regularised least-squares focusing problem bin by bin.
+
+    For each bin, with ``H`` the ``(points, actuators)`` transfer matrix, the
+    drive spectra are ``S = (H^H H + lambda I)^-1 H^H e`` where ``e`` is the
+    unit vector of the focal point. The target is delayed by half of the FFT
+    length so that the resulting filters are causal.
+
+    """
+    nbActuators, nbPoints, nbSamples = impulseResponses.shape
+    nfft = 1 << int(np.ceil(np.log2(2*max(nbSamples, signalLength))))
+    delay = nfft//2
+
+    spectra = np.fft.rfft(impulseResponses, n=nfft, axis=-1) # (actuators, points, bins)
+    nbBins = spectra.shape[-1]
+    log.debug(f'Inverse filter: {nbActuators} actuators, {nbPoints} points, {nbBins} bins, {focalPoints.size} focal points')
+
+    # Linear phase of the delayed target impulse.
+    targetPhase = np.exp(-2j*np.pi*np.arange(nbBins)*delay/nfft)
+
+    drive = np.empty((nbBins, nbActuators, focalPoints.size), dtype=np.complex128)
+    identity = np.eye(nbActuators)
+    for start in range(0, nbBins, FREQUENCY_CHUNK_SIZE):
+        stop = min(start + FREQUENCY_CHUNK_SIZE, nbBins)
+        H = spectra[:, :, start:stop].transpose(2, 1, 0) # (bins, points, actuators)
+        gram = np.einsum('fpa,fpb->fab', H.conj(), H)
+        energy = np.trace(gram, axis1=1, axis2=2).real/nbActuators
+        lam = regularization*np.maximum(energy, np.finfo(np.float64).tiny)
+        gram += lam[:, None, None]*identity
+        rhs = H[:, focalPoints, :].conj().transpose(0, 2, 1)*targetPhase[start:stop, None, None]
+        drive[start:stop] = np.linalg.solve(gram, rhs)
+
+    signals = np.fft.irfft(drive.transpose(2, 1, 0), n=nfft, axis=-1) # (focal, actuators, nfft)
+
+    # Keep the part of the filters that ends at the focusing instant.
+    begin = max(delay - signalLength, 0)
+    return _fitLength(signals[:, :, begin:], signalLength)
+
+def _fitLength(signals, length):
+    """
+    Crop or zero-pad the last axis of the signals to the given length.
+
+    """
+    if signals.shape[-1] >= length:
+        return np.ascontiguousarray(signals[..., :length])
+    padding = [(0, 0)]*(signals.ndim - 1) + [(0, length - signals.shape[-1])]
+    return np.pad(signals, padding)
+
+def _normalize(signals):
+    """
+    Scale the signals of each focal point so that their peak is 1.
+
+    """
+    peak = np.max(np.abs(signals), axis=(1, 2), keepdims=True)
+    peak[peak == 0] = 1.0
+    return signals/peak
+
+def simulateFocusing(impulseResponses, signals):
+    """
+    Predict the vibration of every point when the actuators play the signals.
+
+    Useful to evaluate the contrast of a set of focusing signals before sending
+    them to the signal generator.
+
+    :param impulseResponses: Impulse responses, shape ``(actuators, points, samples)``.
+    :type impulseResponses: np.ndarray
+    :param signals: Drive signals, shape ``(focal points, actuators, length)``.
+    :type signals: np.ndarray
+
+    :return: The predicted responses, shape ``(focal points, points, samples + length - 1)``.
+    :rtype: np.ndarray
+
+    """
+    impulseResponses = np.asarray(impulseResponses, dtype=np.float64)
+    signals = np.asarray(signals, dtype=np.float64)
+    length = impulseResponses.shape[-1] + signals.shape[-1] - 1
+    nfft = 1 << int(np.ceil(np.log2(length)))
+    H = np.fft.rfft(impulseResponses, n=nfft, axis=-1)
+    S = np.fft.rfft(signals, n=nfft, axis=-1)
+    response = np.einsum('apf,naf->npf', H, S)
+    return np.fft.irfft(response, n=nfft, axis=-1)[..., :length]
+
+def toArbitraryWaveform(signal, maxValue:int=ARB_MAX_VALUE):
+    """
+    Convert a drive signal to the unsigned format expected by
+    ``setArbitraryWaveform()``. Zero is mapped to the middle of the range.
+
+    :param signal: The drive signal of one actuator.
+    :type signal: np.ndarray
+    :param maxValue: Largest value of the arbitrary waveform memory.
+    :type maxValue: int
+
+    :return: The waveform ready to be uploaded.
+    :rtype: np.ndarray of uint16
+
+    """
+    signal = np.asarray(signal, dtype=np.float64)
+    peak = np.max(np.abs(signal))
+    if peak == 0:
+        peak = 1.0
+    return np.rint((signal/peak + 1.0)*maxValue/2).astype(np.uint16)
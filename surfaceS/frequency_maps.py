@@ -0,0 +1,237 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``frequency_maps`` module
+=============================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module computes the frequency response of every trace of a dataset: the
+amplitude and phase maps at one or more frequencies (e.g. the ``frequency`` of
+the excitation of :py:mod:`measure_vibrations`), or the full spectra.
+
+The traces are windowed and processed a batch of points at a time. The full
+spectra are real FFTs of the traces, zero-padded to ``padding`` times their
+length. A map only needs a few frequencies: the spectrum is evaluated at them
+by a product of the batch of traces with the windowed complex exponentials of
+these frequencies, which costs ``O(samples)`` per trace and frequency instead
+of ``O(samples log(samples))`` for the whole FFT, and runs on the BLAS
+threads. It is the spectrum of the infinitely zero-padded traces; with a
+``padding``, the frequencies are moved to the nearest bin of the padded FFT
+and the maps are equal to these bins.
+
+The amplitude of a sinusoid of amplitude ``A`` (in units of the samples) at a
+frequency of the map is ``A``, whatever the window. The phase is relative to
+the first sample, in radians.
+
+:Example:
+
+>>> import frequency_maps as FrequencyMaps
+>>> maps = dataset.get_frequency_maps()
+>>> amplitude = maps["amplitude"][:, 0, 0, 0]  # First shot and channel, first frequency.
+
+"""
+
+import time
+import logging as log
+
+import numpy as np
+
+import dataset_container as Container
+
+WINDOWS = {"rectangular": np.ones, "hann": np.hanning, "hamming": np.hamming, "blackman": np.blackman}
+
+DEFAULT_WINDOW = "hann"
+
+# Memory used by a batch of points, in bytes of traces.
+BATCH_BYTES = 64*1024*1024
+
+MAP_ARRAYS = ("frequency_amplitude", "frequency_phase")
+
+def window(name, nbSamples):
+    """
+    :return: The window of ``nbSamples`` samples (see ``WINDOWS``).
+    :rtype: np.ndarray
+
+    """
+    if name not in WINDOWS:
+        raise ValueError(f'Unknown window {name}, expected one of {tuple(WINDOWS)}.')
+    return WINDOWS[name](nbSamples)
+
+def fftLength(nbSamples, padding=1):
+    """
+    :return: The length of the FFT of traces zero-padded to ``padding`` times their length.
+    :rtype: int
+
+    """
+    return max(1, int(round(padding*nbSamples)))
+
+def _computeType(dtype):
+    # Samples of up to 16 bits are exact in float32, which halves the memory and time.
+    return np.float32 if np.dtype(dtype).itemsize <= 2 or np.dtype(dtype) == np.float32 else np.float64
+
+def _pointsPerBatch(samples, itemsize, batchBytes):
+    pointBytes = max(1, itemsize*int(np.prod(samples.shape[1:], dtype=np.int64)))
+    return max(1, batchBytes//pointBytes)
+
+def spectra(samples, samplePeriod, windowName=DEFAULT_WINDOW, padding=1, writer=None, batchBytes=BATCH_BYTES):
+    """
+    Compute the full spectra of the traces.
+
+    :param samples: The traces, shape ``(points, shots, channels, samples)``. It can be mapped or compressed.
+    :type samples: np.ndarray
+    :param samplePeriod: Time between two samples, in s.
+    :type samplePeriod: float
+    :param windowName: The window (see ``WINDOWS``).
+    :type windowName: string
+    :param padding: Length of the FFT relative to the length of the traces.
+    :type padding: float
+    :param writer: The spectra are written in this container (array ``spectrum``) instead of memory.
+    :type writer: dataset_container.ContainerWriter
+    :param batchBytes: Memory used by a batch of points.
+    :type batchBytes: int
+
+    :return: The frequencies in Hz and the spectra (``complex64``), normalised as the maps, shape ``(points, shots, channels, frequencies)``.
+    :rtype: (np.ndarray, np.ndarray)
+
+    """
+    start = time.perf_counter()
+    nbSamples = samples.shape[-1]
+    nfft = fftLength(nbSamples, padding)
+    frequencies = np.fft.rfftfreq(nfft, samplePeriod)
+    weights = window(windowName, nbSamples)
+    scale = _amplitudeScale(frequencies, weights)
+    shape = tuple(samples.shape[:-1]) + (frequencies.size,)
+    result = writer.reserveArray("spectrum", shape, np.complex64) if writer is not None else np.empty(shape, dtype=np.complex64)
+    computeType = _computeType(samples.dtype)
+    pointsPerBatch = _pointsPerBatch(samples, 2*np.dtype(computeType).itemsize, batchBytes)
+    for begin in range(0, samples.shape[0], pointsPerBatch):
+        batch = np.asarray(samples[begin:begin + pointsPerBatch], dtype=computeType)*weights.astype(computeType)
+        result[begin:begin + pointsPerBatch] = np.fft.rfft(batch, n=nfft, axis=-1)*scale
+    if writer is not None:
+        result.flush()
+    log.info(f'Spectra of {samples.shape} traces computed in {time.perf_counter() - start:.1f} s')
+    return (frequencies, result)
+
+def _amplitudeScale(frequencies, weights):
+    # Single-sided spectrum: the amplitude of a sinusoid is twice the modulus of
+    # its bin over the sum of the window, except at 0 Hz.
+    return np.where(frequencies == 0, 1.0, 2.0)/max(weights.sum(), np.finfo(float).tiny)
+
+def frequencyMaps(samples, samplePeriod, frequencies, windowName=DEFAULT_WINDOW, padding=None, batchBytes=BATCH_BYTES):
+    """
+    Compute the amplitude and phase maps of the traces at some frequencies.
+
+    :param samples: The traces, shape ``(points, shots, channels, samples)``. It can be mapped or compressed.
+    :type samples: np.ndarray
+    :param samplePeriod: Time between two samples, in s.
+    :type samplePeriod: float
+    :param frequencies: The frequencies of the maps, in Hz.
+    :type frequencies: list
+    :param windowName: The window (see ``WINDOWS``).
+    :type windowName: string
+    :param padding: Evaluate the maps at the nearest bin of the FFT of the traces zero-padded to ``padding`` times their length, instead of at the exact frequencies.
+    :type padding: float
+    :param batchBytes: Memory used by a batch of points.
+    :type batchBytes: int
+
+    :return: ``frequencies`` (those of the maps), ``amplitude`` and ``phase``, shape ``(points, shots, channels, frequencies)``, and the ``description`` of the computation.
+    :rtype: dict
+
+    """
+    start = time.perf_counter()
+    nbSamples = samples.shape[-1]
+    frequencies = np.atleast_1d(np.asarray(frequencies, dtype=np.float64))
+    description = mapDescription(frequencies, windowName, padding)
+    if padding is not None:
+        binWidth = 1.0/(fftLength(nbSamples, padding)*samplePeriod)
+        frequencies = np.round(frequencies/binWidth)*binWidth
+    weights = window(windowName, nbSamples)
+
+    # Windowed exponentials, the cosines then the sines: a real product.
+    computeType = _computeType(samples.dtype)
+    phases = 2*np.pi*np.outer(np.arange(nbSamples)*samplePeriod, frequencies)
+    basis = np.concatenate((np.cos(phases), -np.sin(phases)), axis=1)*weights[:, np.newaxis]
+    basis = basis.astype(computeType)
+    scale = _amplitudeScale(frequencies, weights)
+
+    shape = tuple(samples.shape[:-1]) + (frequencies.size,)
+    (amplitude, phase) = (np.zeros(shape), np.zeros(shape))
+    pointsPerBatch = _pointsPerBatch(samples, np.dtype(computeType).itemsize, batchBytes)
+    for begin in range(0, samples.shape[0], pointsPerBatch):
+        batch = np.asarray(samples[begin:begin + pointsPerBatch], dtype=computeType)
+        projection = (batch @ basis).astype(np.float64)
+        spectrum = (projection[..., :frequencies.size] + 1j*projection[..., frequencies.size:])*scale
+        amplitude[begin:begin + pointsPerBatch] = np.abs(spectrum)
+        phase[begin:begin + pointsPerBatch] = np.angle(spectrum)
+    log.info(f'Maps of {samples.shape} traces at {frequencies.size} frequencies computed in {time.perf_counter() - start:.1f} s')
+    description["evaluated"] = frequencies.tolist()
+    return {"frequencies": frequencies, "amplitude": amplitude, "phase": phase, "description": description}
+
+def mapDescription(frequencies, windowName=DEFAULT_WINDOW, padding=None):
+    """
+    :return: The parameters of maps (the frequencies requested), as stored in the container of the dataset.
+    :rtype: dict
+
+    """
+    return {"frequencies": np.atleast_1d(frequencies).astype(float).tolist(), "window": windowName, "padding": padding}
+
+def matches(description, frequencies, windowName=DEFAULT_WINDOW, padding=None):
+    """
+    :return: True if maps described by ``description`` were computed with these parameters.
+    :rtype: bool
+
+    """
+    requested = mapDescription(frequencies, windowName, padding)
+    return description["window"] == requested["window"] and description["padding"] == requested["padding"] and \
+           len(description["frequencies"]) == len(requested["frequencies"]) and \
+           np.allclose(description["frequencies"], requested["frequencies"], rtol=1e-12, atol=0)
+
+def store(maps, writer):
+    """
+    Write maps in a container. The maps stored before are replaced.
+
+    :param maps: The maps (see :py:func:`frequencyMaps`).
+    :type maps: dict
+    :param writer: The container.
+    :type writer: dataset_container.ContainerWriter
+
+    """
+    writer.writeArray(MAP_ARRAYS[0], maps["amplitude"])
+    writer.writeArray(MAP_ARRAYS[1], maps["phase"])
+    writer.attributes["frequency_maps"] = maps["description"]
+
+def load(filename, frequencies, windowName=DEFAULT_WINDOW, padding=None):
+    """
+    :return: The maps stored in a container, or None if it has none with these parameters.
+    :rtype: dict
+
+    """
+    container = Container.Container(filename)
+    description = container.attributes.get("frequency_maps")
+    if description is None or not matches(description, frequencies, windowName, padding):
+        return None
+    return {"frequencies": np.asarray(description["evaluated"]), "amplitude": container.array(MAP_ARRAYS[0], mmap=False), \
+            "phase": container.array(MAP_ARRAYS[1], mmap=False), "description": description}
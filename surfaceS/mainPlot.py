@@ -50,10 +50,14 @@ from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as Navigatio
 from matplotlib.figure import Figure
 
 import MeasureDataset
+import trace_statistics as TraceStatistics
 
 Z_LIM_UP_DEFAULT = 0.1
 Z_LIM_DOWN_DEFAULT = -0.1
 
+# Largest number of columns (or rows) of the grid on which irregular points are displayed.
+DISPLAY_CELLS = 100
+
 class MainPlot(FigureCanvas):
     def __init__(self, parent=None, width=5, height=4, dpi=100):
         self.fig = Figure(figsize=(width, height), dpi=dpi)
@@ -67,6 +71,8 @@ class MainPlot(FigureCanvas):
         FigureCanvas.updateGeometry(self)
 
         self.ready = False
+        self.type = None
+        self.irregular = False
 
         self.zLimDown = Z_LIM_DOWN_DEFAULT
         self.zLimUp = Z_LIM_UP_DEFAULT
@@ -85,33 +91,34 @@ class MainPlot(FigureCanvas):
         """
         self.type = type
         self.dataset = data
-        self.data = data.get_data()
 
-        self.datalength = self.data.shape[0]
+        self.datalength = data.numberOfSamples
 
         if type=="3D_MAP":
             self.ax = self.fig.gca(projection='3d')
 
-            tmpHead = self.data.columns
-            self.x = np.empty(tmpHead.size)
-            self.y = np.empty(tmpHead.size)
-            for i in range(1,tmpHead.size):
-                coord = tmpHead[i].split(",")
-                try:
-                    self.x[i-1] = float(coord[0])
-                    self.y[i-1] = float(coord[1])
-                except Exception as e:
-                    self.x[i-1] = 0.0
-                    self.y[i-1] = 0.0
-                    log.warning(f'Problem converting coordinates, {str(e)}')
-                #z[i-1] = data.iloc[t,i-1]
-
-            self.listX = np.unique(self.x)
-            self.listY = np.unique(self.y)
-            self.listX = np.delete(self.listX, self.listX.size-1)
-            self.listY = np.delete(self.listY, self.listY.size-1)
-
-            self.z = np.empty((self.listX.size,self.listY.size))
+            # First shot of the first channel of each point.
+            self.traces = data.samples[:, 0, 0]
+            if data.samples.size > 0:
+                # Fit the Z axis to the traces shown, without reading them.
+                (self.zLimDown, self.zLimUp) = TraceStatistics.zLimits(data.get_statistics(), data.zScale)
+
+            self.listX = np.unique(data.x)
+            self.listY = np.unique(data.y)
+            self.pX, self.pY = np.meshgrid(self.listX, self.listY, indexing='ij')
+            self.z = np.zeros(data.grid.shape)
+
+            # Points of an adaptive scan or of a mosaic are not on a full grid:
+            # they are placed on a regular display grid by their index.
+            self.irregular = data.x.size >= 3 and (data.grid.shape != self.pX.shape or np.any(data.grid < 0))
+            if self.irregular:
+                (width, height) = (np.ptp(data.x), np.ptp(data.y))
+                # About one point per cell, at most DISPLAY_CELLS cells per axis.
+                cell = max(np.sqrt(width*height/data.x.size), max(width, height)/DISPLAY_CELLS) or 1.0
+                self.listX = np.arange(data.x.min(), data.x.max() + cell/2, cell)
+                self.listY = np.arange(data.y.min(), data.y.max() + cell/2, cell)
+                self.pX, self.pY = np.meshgrid(self.listX, self.listY, indexing='ij')
+                self.displayPoints = data.get_index().gridPoints(self.listX, self.listY)
 
             log.debug(f'size listX = {self.listX.shape}, size listY = {self.listY.shape}')
         elif self.type=="2D_signal":
@@ -132,32 +139,25 @@ class MainPlot(FigureCanvas):
         """
         if self.ready == False:
             return
-        t = time*int(self.data.shape[0] / totalTime)
+        if self.type == "LIVE_MAP":
+            nbSamples = self.liveTraces.shape[-1]
+            self.liveSample = min(int(time*nbSamples/totalTime), nbSamples - 1)
+            measured = np.flatnonzero(self.liveMeasured)
+            self.z[self.plan.ix[measured], self.plan.iy[measured]] = self.liveTraces[measured, self.liveSample]*self.liveZScale
+            self.draw_live()
+            return
+        t = min(int(time*self.datalength/totalTime), self.datalength - 1)
         log.debug(f't={t}')
 
         self.ax.clear()
 
-        i = 0
-        for uX in self.listX:
-            tt = np.where(self.x==uX)
-            j = 0
-            #log.debug('OK 1')
-            for uY in self.listY:
-                tz = np.where(self.y==uY)
-                zidx = self.findCoincidentIdx(tt[0], tz[0])
-                #log.debug('OK 2')
-                if zidx >= 0:
-                    #log.debug(f'Registering...')
-                    #log.debug(f'OK 3 t: {t} i:{i} j: {j} tt: {tt} tz: {tz} zidx: {zidx}')
-                    self.z[i][j] = self.data.iloc[t,zidx+1]*self.dataset.zScale
-                else:
-                    #log.debug('OK 4')
-                    self.z[i][j] = 0
-
-                j = j+1
-            i = i+1
+        if self.irregular:
+            # Nodes of the display grid outside of the measured area are not drawn.
+            self.z = np.where(self.displayPoints >= 0, self.traces[self.displayPoints, t]*self.dataset.zScale, np.nan)
+        else:
+            self.z[self.dataset.ix, self.dataset.iy] = self.traces[:, t]*self.dataset.zScale
 
-        pX, pY = np.meshgrid(self.listX,self.listY, indexing='ij')
+        pX, pY = (self.pX, self.pY)
 
         log.debug(f'size pX = {pX.size}, size pY = {pY.size}, shape z ={self.z.shape}')
         #log.debug(f'shape z ={self.z.shape}')
@@ -180,6 +180,60 @@ class MainPlot(FigureCanvas):
         self.ax.set_zlim(self.zLimDown, self.zLimUp)
         self.draw()
 
+    def init_live(self, traces, measured, plan, zScale=MeasureDataset.Z_SCALE):
+        """
+        Initialize the plot to follow a running scan. The traces are read where
+        the scan stores them, only one sample per point is copied.
+
+        :param traces: The traces of the scan, shape ``(points, samples)`` (see ``Sink.liveView()``).
+        :type traces: np.ndarray
+        :param measured: Nonzero for the points already measured.
+        :type measured: np.ndarray
+        :param plan: The plan of the scan (its grid indices place the points).
+        :type plan: SE.ScanPlan
+        :param zScale: Conversion from oscilloscope units to micrometers.
+        :type zScale: float
+
+        """
+        self.type = "LIVE_MAP"
+        self.liveTraces = traces
+        self.liveMeasured = measured
+        self.plan = plan
+        self.liveZScale = zScale
+        self.liveSample = 0
+
+        shape = (plan.ix.max() + 1, plan.iy.max() + 1)
+        self.pX = np.zeros(shape)
+        self.pY = np.zeros(shape)
+        self.pX[plan.ix, plan.iy] = plan.x
+        self.pY[plan.ix, plan.iy] = plan.y
+        self.z = np.zeros(shape)
+
+        self.fig.clear()
+        self.ax = self.fig.gca(projection='3d')
+        self.ready = True
+        self.draw_live()
+
+    def update_point(self, point):
+        """
+        Add a newly measured point to the live plot.
+
+        :param point: Index of the point in the plan.
+        :type point: int
+
+        """
+        if self.ready == False or self.type != "LIVE_MAP":
+            return
+        self.z[self.plan.ix[point], self.plan.iy[point]] = self.liveTraces[point, self.liveSample]*self.liveZScale
+        self.draw_live()
+
+    def draw_live(self):
+        self.ax.clear()
+        self.surf = self.ax.plot_surface(self.pX, self.pY, self.z, cmap=cm.coolwarm, linewidth=0, antialiased=True)
+        self.ax.set_zlabel('Amplitude in $\mu m$')
+        self.ax.set_zlim(self.zLimDown, self.zLimUp)
+        self.draw()
+
     def findCoincidentIdx(self, tt, tz):
         w = 0
         for a in tt:
@@ -239,32 +293,11 @@ class MainPlot(FigureCanvas):
 
         self.canvas = FigureCanvas(fig)
 
-        tmpHead = self.data.columns
-        self.animX = np.empty(tmpHead.size)
-        self.animY = np.empty(tmpHead.size)
-        self.animListX = []
-        self.animListY = []
-
-        self.animZ = []
+        dataset = self.dataset
+        self.animZ = np.zeros(dataset.grid.shape)
+        pX, pY = np.meshgrid(np.unique(dataset.x), np.unique(dataset.y), indexing='ij')
 
         def init_anim():
-            for i in range(1,tmpHead.size):
-                coord = tmpHead[i].split(",")
-                try:
-                    self.animX[i-1] = float(coord[0])
-                    self.animY[i-1] = float(coord[1])
-                except Exception as e:
-                    self.animX[i-1] = 0.0
-                    self.animY[i-1] = 0.0
-                    log.warning(f'Problem converting coordinates, {str(e)}')
-                #z[i-1] = data.iloc[t,i-1]
-
-            self.animListX = np.unique(self.animX)
-            self.animListY = np.unique(self.animY)
-            self.animListX = np.delete(self.animListX, self.animListX.size-1)
-            self.animListY = np.delete(self.animListY, self.animListY.size-1)
-
-            self.animZ = np.empty((self.animListX.size,self.animListY.size))
             return iterate_anim(1)
 
         def iterate_anim(frame):
@@ -275,28 +308,7 @@ class MainPlot(FigureCanvas):
 
             ax.clear()
 
-            i = 0
-            # try:
-            #     if(listX == None):
-            #         return
-            # except Exception as e:
-            #     log.warning(str(e))
-
-            for uX in self.animListX:
-                tt = np.where(self.animX==uX)
-                j = 0
-                for uY in self.animListY:
-                    tz = np.where(self.animY==uY)
-                    zidx = self.findCoincidentIdx(tt[0], tz[0])
-                    if zidx >= 0:
-                        #log.debug(f'Registering...')
-                        self.animZ[i][j] = self.data.iloc[t,zidx+1]*self.dataset.zScale
-                    else:
-                        self.animZ[i][j] = 0
-                    j = j+1
-                i = i+1
-
-            pX, pY = np.meshgrid(self.animListX,self.animListY, indexing='ij')
+            self.animZ[dataset.ix, dataset.iy] = dataset.samples[:, 0, 0, t]*dataset.zScale
 
             # Plot the surface.
             surf = ax.plot_surface(pX, pY, self.animZ, cmap=cm.coolwarm, linewidth=0, antialiased=True)
@@ -26,24 +26,17 @@ The ``Measure vibrations`` module
 =================================
 
 *Author:* [Jérémy Jayet](mailto:jeremy.jayet@epfl.ch)
-*Last modification:* 24.05.2019
+*Last modification:* 19.10.2026
 
 In this scenario, we measure the vibration on an array of points.
 
 """
 
-import threading
 import time
-import queue
 import logging as log
-import string
-import serial
 
-import pandas as pd
-
-import Oscilloscope as Osc
-import SignalGenerator as SG
-import cnc as CNC
+import scan_engine as SE
+import scan_estimator as Estimator
 
 # CNC default parameters
 CNC_PORT = "COM5"
@@ -77,6 +70,60 @@ TRIGGER_DELAY = -20
 
 log.basicConfig(level=log.DEBUG)
 
+class VibrationExcitation(SE.Excitation):
+    """
+    Excitation strategy of the vibration measurements: a burst of the
+    configured wave on the signal generator, with a trigger pulse on the other
+    output of the signal generator.
+
+    :param params: The experiment parameters
+    :type params: dict
+
+    """
+    signalGeneratorParameters = ('channel_sg', 'frequency', 'wave_type', 'Trigger_pulse_delay_sg')
+
+    def __init__(self, params):
+        super(VibrationExcitation, self).__init__(params)
+        self.channelOnSG = params['channel_sg']
+        self.TRIGchannel = SE.otherChannel(self.channelOnSG)
+        self.extraChannels = [(3, 10000)]
+
+    def configureSignalGenerator(self, sg):
+        p = self.experimentParameters
+        sg.setChannel(self.channelOnSG)
+        sg.setFrequency(p['frequency'])
+        sg.setWave(p['wave_type'], 1)
+        sg.setAmplitude(5.0)
+        sg.setBurstMode(1)
+        sg.setTriggerSignal(self.channelOnSG, p['Trigger_pulse_delay_sg'])
+
+        log.info("Config for additional trigger OK.")
+        sg.beep()
+
+    def start(self, sg):
+        sg.setOutput(state=True)
+        sg.setChannel(self.TRIGchannel)
+        sg.setOutput(state=True)
+        sg.setChannel(self.channelOnSG)
+
+    def fire(self, sg, osc, shot):
+        log.debug("Start signal and acquisition")
+        self.armTrigger(osc)
+        time.sleep(self.experimentParameters['delay_before_measuring'])
+        sg.burst()
+        time.sleep(self.experimentParameters['delay_before_measuring'])
+        time.sleep(self.experimentParameters['time_division']*0.01) # Time in ms
+
+    def shotDelay(self):
+        p = self.experimentParameters
+        return 2*p['delay_before_measuring'] + p['time_division']*0.01
+
+    def stop(self, sg):
+        sg.setOutput(state=False)
+        sg.setChannel(self.TRIGchannel)
+        sg.setOutput(state=False)
+        sg.setChannel(self.channelOnSG)
+
 class SurfaceVibrationsScanner():
     """
     Class which handle the measuring process.
@@ -93,6 +140,8 @@ class SurfaceVibrationsScanner():
     """
     def __init__(self, cnc, osc, sg, params):
         self.experimentParameters = params
+        # Quality check of the last scan, see scan_engine.ScanEngine.qualityReport().
+        self.quality = None
         self.signalGenerator = sg
         self.osc = osc
         self.cnc = cnc
@@ -106,6 +155,21 @@ class SurfaceVibrationsScanner():
         self.startX = self.experimentParameters['start_x']
         self.startY = self.experimentParameters['start_y']
 
+    def estimateDuration(self, model=None):
+        """
+        Dry run: estimate the duration of the scan without using the instruments.
+
+        :param model: The cost model (default: calibrated on the ``timings_file`` of the parameters).
+        :type model: scan_estimator.CostModel
+
+        :return: The estimate, see ``scan_estimator.CostModel.estimate``.
+        :rtype: dict
+
+        """
+        if model is None:
+            model = Estimator.CostModel.fromTimings(self.experimentParameters.get('timings_file'))
+        return model.estimate(self.experimentParameters, VibrationExcitation)
+
     def startScanning(self):
         """
         Start the scanning process.
@@ -114,121 +178,10 @@ class SurfaceVibrationsScanner():
         :rtype: pd.Dataframe
 
         """
-        # Configure signal generator
-        self.signalGenerator.setChannel(self.channelOnSG)
-        self.signalGenerator.setFrequency(self.frequency)
-        self.signalGenerator.setWave(self.waveType, 1)
-        self.signalGenerator.setAmplitude(5.0)
-        self.signalGenerator.setBurstMode(1)
-        self.signalGenerator.setTriggerSignal(self.channelOnSG, self.triggerPulseDelaySG)
-
-        log.info("Config for additional trigger OK.")
-        self.signalGenerator.beep()
-
-        self.osc.setGrid(self.experimentParameters['time_division'], \
-                         self.experimentParameters['volt_division_reference'], \
-                         self.experimentParameters['reference_channel'], \
-                         self.experimentParameters['unit_volt_division'], \
-                         self.experimentParameters['unit_time_division'], \
-                         self.experimentParameters['OSCNumSamples'])
-        self.osc.setGrid(self.experimentParameters['time_division'], \
-                         self.experimentParameters['volt_division_vibrometer'], \
-                         self.experimentParameters['vibrometer_channel'], \
-                         self.experimentParameters['unit_volt_division'], \
-                         self.experimentParameters['unit_time_division'], \
-                         self.experimentParameters['OSCNumSamples'])
-        self.osc.setGrid(self.experimentParameters['time_division'], \
-                         10000, \
-                         3, \
-                         self.experimentParameters['unit_volt_division'], \
-                         self.experimentParameters['unit_time_division'], \
-                         self.experimentParameters['OSCNumSamples'])
-        self.osc.setTrigger(self.experimentParameters['trigger_level'], \
-                            self.experimentParameters['trigger_delay'], \
-                            self.experimentParameters['reference_channel'], \
-                            self.experimentParameters['trigger_mode'], \
-                            self.experimentParameters['unit_volt_division'])
-
-        time.sleep(5)
-
-        self.cnc.unlock()
-
-        positionLock = threading.Event()
-
-        ########################################################################
-        # Make measurements
-        ########################################################################
-
-        measuring = True
-        nbPoint = self.nbPointX * self.nbPointY
-
-        xpoint = 0
-        ypoint = 0
-        xIncrement = 1
-
-        data = pd.DataFrame()
-
-        targetX = xpoint*self.experimentParameters['step_x'] + self.startX
-        targetY = ypoint*self.experimentParameters['step_y'] + self.startY
-
-        self.cnc.goTo(x=self.startX, y=self.startY, event=positionLock)
-
-        self.signalGenerator.setOutput(state=True)
-        if self.channelOnSG == 1:
-            self.TRIGchannel = 2
-        else:
-            self.TRIGchannel = 1
-        self.signalGenerator.setChannel(self.TRIGchannel)
-        self.signalGenerator.setOutput(state=True)
-        self.signalGenerator.setChannel(self.channelOnSG)
-
-        while measuring:
-            log.debug("Start signal and acquisition")
-            #time.sleep(2)
-            self.osc.setTrigger(self.experimentParameters['trigger_level'], \
-                                self.experimentParameters['trigger_delay'], \
-                                self.experimentParameters['reference_channel'], \
-                                self.experimentParameters['trigger_mode'], \
-                                self.experimentParameters['unit_volt_division'])
-            log.debug("Waiting to be in position...")
-            positionLock.wait()
-            log.debug("In position !")
-            positionLock.clear()
-            time.sleep(self.experimentParameters['delay_before_measuring'])
-            self.signalGenerator.burst()
-            time.sleep(self.experimentParameters['delay_before_measuring'])
-            time.sleep(self.experimentParameters['time_division']*0.01) # Time in ms
-
-            # Count the number of point measured
-            xpoint += xIncrement
-            if xpoint >= self.nbPointX or xpoint < 0 :
-                xIncrement = -xIncrement
-                xpoint += xIncrement
-                ypoint +=1
-                if ypoint > self.nbPointY:
-                    measuring = False
-
-            targetX = xpoint*self.experimentParameters['step_x'] + self.startX
-            targetY = ypoint*self.experimentParameters['step_y'] + self.startY
-            log.debug(f'Going to {targetX},{targetY}')
-            self.cnc.goTo(x=targetX, y=targetY, event=positionLock)
-
-            tmpData = self.osc.acquire(readOnly=True, channel=self.experimentParameters['vibrometer_channel'])
-            data[f'{targetX},{targetY}'] = tmpData['data']
-            log.debug(f' Measurement done in position {targetX},{targetY}')
-            #Save Data in a Temporal File
-            data.to_pickle("EXPdataTEMP.pkl")
-
-
+        excitation = VibrationExcitation(self.experimentParameters)
+        engine = SE.ScanEngine(self.cnc, self.osc, self.signalGenerator, self.experimentParameters, \
+                               excitation, sink=SE.sinkFromParameters(self.experimentParameters, "EXPdataTEMP.journal"))
+        data = engine.run().to_dataframe(excitation.columnName)
+        self.quality = engine.qualityReport()
         log.info("Measurement done !")
-        self.signalGenerator.setOutput(state=False)
-        if self.channelOnSG == 1:
-            self.TRIGchannel = 2
-        else:
-            self.TRIGchannel = 1
-        self.signalGenerator.setChannel(self.TRIGchannel)
-        self.signalGenerator.setOutput(state=False)
-        self.signalGenerator.setChannel(self.channelOnSG)
-
-        #data.to_csv("data1.csv")
         return data
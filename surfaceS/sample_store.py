@@ -0,0 +1,296 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``sample_store`` module
+===========================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module keeps the waveforms acquired during a scan.
+
++ :py:class:`SampleStore` is an ``int16`` array of shape
+  ``(points, shots, channels, samples)`` allocated once from the scan plan.
++ :py:class:`CheckpointJournal` is an append-only file in which every trace is
+  written as soon as it is acquired. The cost of a checkpoint is the size of
+  one trace, whatever the progress of the scan.
+
+Journal format
+--------------
+
+All integers are little endian.
+
++ Header: the magic ``SURFJRNL``, the version (``uint32``), the length of the
+  JSON description (``uint32``) and the JSON description itself.
++ Records: ``kind`` (``uint8``), ``point`` (``uint32``), ``shot``
+  (``uint16``), ``channel`` (``uint16``), number of samples (``uint32``),
+  CRC32 of the samples (``uint32``), followed by the samples (``int16``).
+  The kind is ``RECORD_SAMPLES`` for a trace and ``RECORD_COMPLETE`` for the
+  (empty) record closing a scan which ended normally.
+
+"""
+
+import os
+import json
+import struct
+import zlib
+import logging as log
+
+import numpy as np
+
+JOURNAL_MAGIC = b'SURFJRNL'
+JOURNAL_VERSION = 1
+
+_HEADER = struct.Struct('<8sII')
+_RECORD = struct.Struct('<BIHHII')
+
+RECORD_SAMPLES = 1
+RECORD_COMPLETE = 2
+
+# Number of samples of the memory sizes of the oscilloscope.
+_SIZE_SUFFIXES = {"K": 1000, "M": 1000000}
+
+def samplesFromParameters(params):
+    """
+    Number of samples per trace configured on the oscilloscope.
+
+    :param params: The experiment parameters (``OSCNumSamples`` is e.g. ``"50K"`` or ``"2.5M"``)
+    :type params: dict
+
+    :return: The number of samples
+    :rtype: int
+
+    """
+    size = str(params['OSCNumSamples']).strip().upper()
+    if size[-1] in _SIZE_SUFFIXES:
+        return int(round(float(size[:-1])*_SIZE_SUFFIXES[size[-1]]))
+    return int(float(size))
+
+# Number of horizontal divisions on the screen of the oscilloscope.
+NUMBER_TIME_DIVISION_OSC = 10
+
+_TIME_UNITS = {"S": 1.0, "MS": 1e-3, "US": 1e-6, "NS": 1e-9}
+
+def samplePeriodFromParameters(params, nbSamples):
+    """
+    Time between two samples of a trace.
+
+    :param params: The experiment parameters (``time_division`` in ``unit_time_division``)
+    :type params: dict
+    :param nbSamples: Number of samples of the traces.
+    :type nbSamples: int
+
+    :return: The sample period in s
+    :rtype: float
+
+    """
+    unit = _TIME_UNITS[str(params.get('unit_time_division', "MS")).upper()]
+    return NUMBER_TIME_DIVISION_OSC*params['time_division']*unit/nbSamples
+
+class SampleStore():
+    """
+    Preallocated storage of the traces of a scan.
+
+    :param nbPoints: Number of points of the plan.
+    :type nbPoints: int
+    :param nbShots: Number of shots per point.
+    :type nbShots: int
+    :param channels: Names of the traces acquired for each shot.
+    :type channels: list
+    :param nbSamples: Expected number of samples per trace.
+    :type nbSamples: int
+    :param x: X coordinate of each point.
+    :type x: np.ndarray
+    :param y: Y coordinate of each point.
+    :type y: np.ndarray
+    :param nbExcitations: Number of excitations played at each point. The shots are numbered excitation by excitation (see :py:meth:`byExcitation`).
+    :type nbExcitations: int
+
+    """
+    def __init__(self, nbPoints, nbShots, channels, nbSamples, x=None, y=None, nbExcitations=1):
+        if nbShots % nbExcitations != 0:
+            raise ValueError(f'{nbShots} shots per point cannot be split between {nbExcitations} excitations.')
+        self.channels = list(channels)
+        self.nbExcitations = nbExcitations
+        self.x = np.asarray(x) if x is not None else np.zeros(nbPoints)
+        self.y = np.asarray(y) if y is not None else np.zeros(nbPoints)
+        self.data = np.zeros((nbPoints, nbShots, len(self.channels), nbSamples), dtype=np.int16)
+        self.filled = np.zeros((nbPoints, nbShots, len(self.channels)), dtype=bool)
+        log.debug(f'Sample store allocated: {self.data.shape}, {self.data.nbytes/1e6:.1f} MB')
+
+    def put(self, point, shot, channel, trace):
+        """
+        Store one trace.
+
+        The oscilloscope may return a few samples more or less than the
+        configured memory size. The first trace fixes the length of the store;
+        the other traces must have the same length.
+
+        :param channel: Index of the channel in ``channels``.
+        :type channel: int
+
+        """
+        if trace.shape[0] != self.data.shape[-1]:
+            if self.filled.any():
+                raise ValueError(f'Trace of {trace.shape[0]} samples, expected {self.data.shape[-1]}.')
+            log.info(f'Resizing the sample store to {trace.shape[0]} samples per trace.')
+            self.data = np.zeros(self.data.shape[:-1] + (trace.shape[0],), dtype=np.int16)
+        self.data[point, shot, channel] = trace
+        self.filled[point, shot, channel] = True
+
+    def byExcitation(self):
+        """
+        View of the store with an excitation dimension. No data is copied.
+
+        :return: The traces, shape ``(points, excitations, shots, channels, samples)``, and the stored flags, shape ``(points, excitations, shots, channels)``.
+        :rtype: (np.ndarray, np.ndarray)
+
+        """
+        (nbPoints, nbShots) = self.filled.shape[:2]
+        shape = (nbPoints, self.nbExcitations, nbShots//self.nbExcitations)
+        return (self.data.reshape(shape + self.data.shape[2:]), self.filled.reshape(shape + self.filled.shape[2:]))
+
+    def to_dataframe(self, columnName):
+        """
+        Convert the store to the legacy ``pd.DataFrame`` format (one column
+        per trace). Only the stored traces are exported.
+
+        :param columnName: Function ``(x, y, shot, channelName)`` giving the name of a column.
+        :type columnName: function
+
+        :return: The traces
+        :rtype: pd.Dataframe
+
+        """
+        import pandas as pd
+
+        columns = {}
+        for (point, shot, channel) in zip(*np.nonzero(self.filled)):
+            name = columnName(self.x[point], self.y[point], shot, self.channels[channel])
+            columns[name] = self.data[point, shot, channel]
+        return pd.DataFrame(columns)
+
+class CheckpointJournal():
+    """
+    Append-only journal of the traces of a scan.
+
+    :param filename: Path to the journal.
+    :type filename: string
+    :param description: JSON serialisable description of the scan (written in the header).
+    :type description: dict
+    :param syncEvery: Force the records to disk (``os.fsync``) every ``syncEvery`` records (0 to only flush).
+    :type syncEvery: int
+    :param validSize: To append to an existing journal: the size of its valid part, as returned by ``read()``. The rest of the file is discarded.
+    :type validSize: int
+
+    """
+    def __init__(self, filename, description=None, syncEvery=0, validSize=None):
+        self.filename = filename
+        self.syncEvery = syncEvery
+        self.nbRecords = 0
+
+        if validSize is not None:
+            # Continue an existing journal after its last valid record.
+            self.fhandle = open(filename, "r+b")
+            self.fhandle.truncate(validSize)
+            self.fhandle.seek(validSize)
+        else:
+            header = json.dumps(description).encode()
+            self.fhandle = open(filename, "wb")
+            self.fhandle.write(_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, len(header)))
+            self.fhandle.write(header)
+            self.fhandle.flush()
+
+    def append(self, point, shot, channel, trace):
+        """
+        Append one trace to the journal.
+
+        """
+        trace = np.ascontiguousarray(trace, dtype='<i2')
+        payload = trace.tobytes()
+        self._write(RECORD_SAMPLES, point, shot, channel, payload)
+
+    def markComplete(self):
+        """
+        Append the record indicating that the scan ended normally.
+
+        """
+        self._write(RECORD_COMPLETE, 0, 0, 0, b'')
+
+    def _write(self, kind, point, shot, channel, payload):
+        self.fhandle.write(_RECORD.pack(kind, point, shot, channel, len(payload)//2, zlib.crc32(payload)) + payload)
+        self.fhandle.flush()
+        self.nbRecords += 1
+        if self.syncEvery > 0 and self.nbRecords % self.syncEvery == 0:
+            os.fsync(self.fhandle.fileno())
+
+    def close(self):
+        if self.fhandle is not None:
+            self.fhandle.flush()
+            os.fsync(self.fhandle.fileno())
+            self.fhandle.close()
+            self.fhandle = None
+
+    def read(filename):
+        """
+        Read a journal.
+
+        The reading stops at the first incomplete or corrupted record, which is
+        what remains of a record being written when the scan was interrupted.
+
+        :param filename: Path to the journal.
+        :type filename: string
+
+        :return: The description of the scan, the list of records
+                 ``(kind, point, shot, channel, samples)`` and the size in
+                 bytes of the valid part of the file.
+        :rtype: (dict, list, int)
+
+        """
+        records = []
+        with open(filename, "rb") as fhandle:
+            head = fhandle.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                raise ValueError(f'{filename} is not a journal.')
+            (magic, version, headerLength) = _HEADER.unpack(head)
+            if magic != JOURNAL_MAGIC:
+                raise ValueError(f'{filename} is not a journal.')
+            if version != JOURNAL_VERSION:
+                raise ValueError(f'Unsupported journal version {version}.')
+            description = json.loads(fhandle.read(headerLength).decode())
+            validSize = _HEADER.size + headerLength
+
+            while True:
+                head = fhandle.read(_RECORD.size)
+                if len(head) < _RECORD.size:
+                    break
+                (kind, point, shot, channel, nbSamples, crc) = _RECORD.unpack(head)
+                payload = fhandle.read(2*nbSamples)
+                if len(payload) < 2*nbSamples or zlib.crc32(payload) != crc:
+                    log.warning(f'Corrupted record at byte {validSize} of {filename}, ignoring the end of the journal.')
+                    break
+                records.append((kind, point, shot, channel, np.frombuffer(payload, dtype='<i2')))
+                validSize += _RECORD.size + 2*nbSamples
+
+        return (description, records, validSize)
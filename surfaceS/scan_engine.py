@@ -0,0 +1,1158 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``scan_engine`` module
+==========================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module implements the scanning process shared by all the scenarios
+(vibrations, impacts, sine sweep). The scenario specific part, i.e. how the
+instruments are configured and how a shot is fired, is provided by an
+:py:class:`Excitation` object.
+
+Several excitations can be played at each point, before moving to the next
+one (see :py:class:`ExcitationGroup`).
+
+The scan is organised as a pipeline of three stages connected by bounded
+queues:
+
++ *excite*: runs in the calling thread. It moves the CNC, waits to be in
+  position and fires the shots.
++ *transfer*: reads the waveforms from the oscilloscope.
++ *store*: hands the waveforms to the sink which keeps the data.
+
+The waveform transfer and the storage of the last shot of a point run while the
+CNC is already moving to the next point. The oscilloscope is only armed again
+once the previous transfer is over.
+
+When the ``quality_check`` parameter is set, each shot is checked by the
+transfer stage (see :py:mod:`shot_quality`). The CNC then leaves a point only
+once its shots are checked, and the bad shots are measured again in position,
+within a budget of ``quality_retries`` shots per point.
+
+:Example:
+
+>>> engine = ScanEngine(cnc, osc, sg, params, VibrationExcitation(params), sink=SampleStoreSink("scan.journal"))
+>>> store = engine.run()
+
+"""
+
+import os
+import threading
+import time
+import queue
+import json
+import hashlib
+import logging as log
+
+import numpy as np
+
+import sample_store as SampleStore
+import shot_statistics as ShotStats
+import coherent_averaging as CoherentAveraging
+import shot_quality as ShotQuality
+
+# Time to let the instruments settle after their configuration (in seconds).
+SETTLING_TIME_AFTER_CONFIGURATION = 5
+
+# Default capacity of the queue between the transfer and the store stages.
+DEFAULT_PIPELINE_DEPTH = 4
+
+# Period at which the excite stage checks the other stages while waiting (in seconds).
+STAGE_CHECK_PERIOD = 0.1
+
+# Number of moves kept in the timings of a scan.
+MAX_RECORDED_MOVES = 1000
+
+# Experiment parameters used to configure the oscilloscope.
+OSCILLOSCOPE_PARAMETERS = ('time_division', 'unit_time_division', 'OSCNumSamples', 'unit_volt_division', \
+                           'reference_channel', 'volt_division_reference', 'vibrometer_channel', \
+                           'volt_division_vibrometer', 'trigger_level', 'trigger_delay', 'trigger_mode')
+
+def otherChannel(channel):
+    """
+    :return: The output of the signal generator used for the trigger pulse when the signal is on ``channel``.
+    :rtype: int
+
+    """
+    if channel == 1:
+        return 2
+    else:
+        return 1
+
+# Parameters which do not change the measurements. They are ignored when
+# checking that a journal belongs to the same scan.
+RESUME_IGNORED_PARAMETERS = ('cnc_port', 'sg_port', 'sg_ip', 'osc_ip', 'data_filename', 'pipeline_depth', 'timings_file')
+
+def scanFingerprint(params, plan, otherParameters=()):
+    """
+    Digest identifying a scan: its parameters and the points of its plan.
+
+    :param otherParameters: Parameters of the other excitations of an :py:class:`ExcitationGroup`.
+    :type otherParameters: list
+
+    :return: The fingerprint
+    :rtype: string
+
+    """
+    relevant = {k: v for (k, v) in params.items() if k not in RESUME_IGNORED_PARAMETERS}
+    digest = hashlib.sha1(json.dumps(relevant, sort_keys=True).encode())
+    for other in otherParameters:
+        relevant = {k: v for (k, v) in other.items() if k not in RESUME_IGNORED_PARAMETERS}
+        digest.update(json.dumps(relevant, sort_keys=True).encode())
+    digest.update(plan.x.tobytes())
+    digest.update(plan.y.tobytes())
+    return digest.hexdigest()
+
+class ScanPlan():
+    """
+    Ordered list of the points visited during a scan.
+
+    :param x: X machine coordinates of the points, in visiting order.
+    :type x: np.ndarray
+    :param y: Y machine coordinates of the points, in visiting order.
+    :type y: np.ndarray
+    :param ix: Column index of each point in the grid.
+    :type ix: np.ndarray
+    :param iy: Row index of each point in the grid.
+    :type iy: np.ndarray
+
+    """
+    def __init__(self, x, y, ix=None, iy=None):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.ix = np.asarray(ix if ix is not None else np.zeros(self.x.size), dtype=np.int64)
+        self.iy = np.asarray(iy if iy is not None else np.zeros(self.x.size), dtype=np.int64)
+
+    def __len__(self):
+        return self.x.size
+
+    def fromParameters(params):
+        """
+        Build the serpentine plan described by the experiment parameters.
+
+        As in the historical acquisition loops, ``nb_point_x`` points are taken
+        on each row and the rows ``0`` to ``nb_point_y`` (included) are scanned.
+        Odd rows are scanned backwards to avoid the return travel.
+
+        :param params: The experiment parameters
+        :type params: dict
+
+        :return: The plan
+        :rtype: ScanPlan
+
+        """
+        nbPointX = int(params['nb_point_x'])
+        nbRows = int(params['nb_point_y']) + 1
+        ix = np.tile(np.arange(nbPointX), nbRows).reshape(nbRows, nbPointX)
+        ix[1::2] = ix[1::2, ::-1]
+        ix = ix.ravel()
+        iy = np.repeat(np.arange(nbRows), nbPointX)
+        x = ix*params['step_x'] + params['start_x']
+        y = iy*params['step_y'] + params['start_y']
+        return ScanPlan(x, y, ix, iy)
+
+class Shot():
+    """
+    Waveforms acquired for one shot at one point of the plan.
+
+    :param point: Index of the point in the plan.
+    :type point: int
+    :param shot: Index of the shot at this point (starting at 0).
+    :type shot: int
+    :param x: X machine coordinate
+    :type x: float
+    :param y: Y machine coordinate
+    :type y: float
+    :param retry: The shot is measured again if it fails the quality check.
+    :type retry: bool
+
+    """
+    def __init__(self, point, shot, x, y, retry=False):
+        self.point = point
+        self.shot = shot
+        self.x = x
+        self.y = y
+        self.retry = retry
+        self.traces = {}
+        # Problems found by the quality check, see shot_quality.QualityGate.check().
+        self.problems = []
+
+class StageCounter():
+    """
+    Throughput counter of one stage of the pipeline.
+
+    """
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.busyTime = 0.0
+        self.nbBytes = 0
+        self.lock = threading.Lock()
+
+    def add(self, duration, nbBytes=0):
+        with self.lock:
+            self.count += 1
+            self.busyTime += duration
+            self.nbBytes += nbBytes
+
+    def summary(self):
+        """
+        :return: The number of items processed, the busy time, items/s and MB/s.
+        :rtype: dict
+
+        """
+        with self.lock:
+            rate = self.count/self.busyTime if self.busyTime > 0 else 0.0
+            bandwidth = self.nbBytes/self.busyTime/1e6 if self.busyTime > 0 else 0.0
+            return {"count": self.count, "busy_time": self.busyTime, "items_per_s": rate, "MB_per_s": bandwidth}
+
+class Excitation():
+    """
+    Base class of the excitation strategies. A strategy configures the
+    instruments and fires the shots; the scan engine does everything else.
+
+    :param params: The experiment parameters
+    :type params: dict
+
+    """
+    # Experiment parameters used by configureSignalGenerator().
+    signalGeneratorParameters = ()
+
+    def __init__(self, params):
+        self.experimentParameters = params
+        # Name and oscilloscope channel of the traces acquired for each shot.
+        self.channels = [("data", params['vibrometer_channel'])]
+        # Other oscilloscope channels to set up, as (channel, volt division).
+        self.extraChannels = []
+
+    def shotsPerPoint(self):
+        return 1
+
+    def members(self):
+        """
+        :return: The excitations played at each point.
+        :rtype: list
+
+        """
+        return [self]
+
+    def shotOrder(self, shots):
+        """
+        :param shots: Shots still to measure at a point, in increasing order.
+        :type shots: np.ndarray
+
+        :return: The order in which they are fired.
+        :rtype: np.ndarray
+
+        """
+        return shots
+
+    def configure(self, sg, osc):
+        """
+        Configure the instruments before the scan.
+
+        """
+        self.configureSignalGenerator(sg)
+        self.configureOscilloscope(osc)
+
+    def configureSignalGenerator(self, sg):
+        pass
+
+    def reconfigure(self, sg, osc, previous=None):
+        """
+        Configure the instruments, knowing that they are still configured for
+        the ``previous`` excitation. Only the instruments whose parameters
+        changed are configured again.
+
+        :param previous: The excitation of the previous scan on the same instruments (None if unknown).
+        :type previous: Excitation
+
+        :return: True if an instrument was configured.
+        :rtype: bool
+
+        """
+        if previous is None or type(previous) is not type(self):
+            self.configure(sg, osc)
+            return True
+        changed = False
+        if self.differsFrom(previous, self.signalGeneratorParameters):
+            log.info("Configuring the signal generator.")
+            self.configureSignalGenerator(sg)
+            changed = True
+        if self.differsFrom(previous, OSCILLOSCOPE_PARAMETERS) or self.extraChannels != previous.extraChannels:
+            log.info("Configuring the oscilloscope.")
+            self.configureOscilloscope(osc)
+            changed = True
+        return changed
+
+    def differsFrom(self, other, names):
+        """
+        :return: True if one of the experiment parameters ``names`` is different in the ``other`` excitation.
+        :rtype: bool
+
+        """
+        return any(self.experimentParameters.get(n) != other.experimentParameters.get(n) for n in names)
+
+    def start(self, sg):
+        """
+        Turn the outputs on, once the CNC goes to the first point.
+
+        """
+        pass
+
+    def atPoint(self, sg, osc):
+        """
+        Called once the CNC is in position, before the first shot.
+
+        """
+        pass
+
+    def fire(self, sg, osc, shot):
+        """
+        Arm the oscilloscope and excite the surface for one shot.
+
+        """
+        pass
+
+    def pointDelay(self):
+        """
+        :return: The time spent waiting in ``atPoint()``, in s.
+        :rtype: float
+
+        """
+        return 0.0
+
+    def shotDelay(self):
+        """
+        :return: The time spent waiting in ``fire()``, in s.
+        :rtype: float
+
+        """
+        return 0.0
+
+    def stop(self, sg):
+        """
+        Turn the outputs off at the end of the scan (even after an error).
+
+        """
+        pass
+
+    def columnName(self, x, y, shot, channel):
+        """
+        Name of the column of the trace in the legacy ``pd.DataFrame`` format.
+
+        """
+        return f'{x},{y}'
+
+    def armTrigger(self, osc):
+        p = self.experimentParameters
+        osc.setTrigger(p['trigger_level'], p['trigger_delay'], p['reference_channel'], \
+                       p['trigger_mode'], p['unit_volt_division'])
+
+    def configureOscilloscope(self, osc):
+        """
+        Set the grid of the reference and vibrometer channels (plus the
+        ``extraChannels``) and the trigger.
+
+        """
+        p = self.experimentParameters
+        grids = [(p['reference_channel'], p['volt_division_reference']), \
+                 (p['vibrometer_channel'], p['volt_division_vibrometer'])] + list(self.extraChannels)
+        for (channel, voltDivision) in grids:
+            osc.setGrid(p['time_division'], voltDivision, channel, p['unit_volt_division'], \
+                        p['unit_time_division'], p['OSCNumSamples'])
+        self.armTrigger(osc)
+
+class ExcitationGroup(Excitation):
+    """
+    Several excitations (e.g. different waveforms, frequencies or actuator
+    channels) played one after the other at each point, so that the grid is
+    scanned once for all of them.
+
+    The shots are numbered excitation by excitation: shot ``s`` of the
+    excitation ``e`` is the shot ``e*shotsPerExcitation() + s`` of the group.
+    The stores keep their usual shape, and
+    :py:meth:`sample_store.SampleStore.byExcitation` gives the excitation
+    dimension.
+
+    When switching from one excitation to the next, only the instruments whose
+    parameters differ are configured again (see :py:meth:`Excitation.reconfigure`).
+    At each point, the excitation the instruments are set up for is played
+    first, so there are ``len(excitations) - 1`` switches per point.
+
+    :param excitations: The excitations. They must measure the same channels with the same number of shots.
+    :type excitations: list
+
+    """
+    def __init__(self, excitations):
+        if len(excitations) == 0:
+            raise ValueError("An excitation group needs at least one excitation.")
+        first = excitations[0]
+        for other in excitations[1:]:
+            if other.channels != first.channels or other.shotsPerPoint() != first.shotsPerPoint():
+                raise ValueError("The excitations of a group must measure the same channels with the same number of shots.")
+        super(ExcitationGroup, self).__init__(first.experimentParameters)
+        self.excitations = list(excitations)
+        self.channels = first.channels
+        self.extraChannels = first.extraChannels
+        # Index of the excitation the instruments are set up for.
+        self.active = 0
+        self.visited = set()
+        self.nbSwitches = 0
+
+    def shotsPerExcitation(self):
+        return self.excitations[0].shotsPerPoint()
+
+    def shotsPerPoint(self):
+        return len(self.excitations)*self.shotsPerExcitation()
+
+    def members(self):
+        return self.excitations
+
+    def split(self, shot):
+        """
+        :return: The index of the excitation and the shot of this excitation.
+        :rtype: (int, int)
+
+        """
+        return divmod(int(shot), self.shotsPerExcitation())
+
+    def shotOrder(self, shots):
+        excitation = shots//self.shotsPerExcitation()
+        # Stable sort: the shots of an excitation stay in increasing order.
+        return shots[np.argsort((excitation - self.active) % len(self.excitations), kind="stable")]
+
+    def configure(self, sg, osc):
+        self.active = 0
+        self.excitations[0].configure(sg, osc)
+
+    def reconfigure(self, sg, osc, previous=None):
+        if isinstance(previous, ExcitationGroup):
+            previous = previous.excitations[previous.active]
+        self.active = 0
+        return self.excitations[0].reconfigure(sg, osc, previous)
+
+    def start(self, sg):
+        self.excitations[self.active].start(sg)
+
+    def atPoint(self, sg, osc):
+        self.visited = set()
+
+    def fire(self, sg, osc, shot):
+        (index, shot) = self.split(shot)
+        excitation = self.excitations[index]
+        if index != self.active:
+            log.debug(f'Switching to excitation {index}')
+            previous = self.excitations[self.active]
+            previous.stop(sg)
+            excitation.reconfigure(sg, osc, previous)
+            excitation.start(sg)
+            self.active = index
+            self.nbSwitches += 1
+        if index not in self.visited:
+            self.visited.add(index)
+            excitation.atPoint(sg, osc)
+        excitation.fire(sg, osc, shot)
+
+    def pointDelay(self):
+        return sum(excitation.pointDelay() for excitation in self.excitations)
+
+    def shotDelay(self):
+        return sum(excitation.shotDelay() for excitation in self.excitations)/len(self.excitations)
+
+    def stop(self, sg):
+        self.excitations[self.active].stop(sg)
+
+    def columnName(self, x, y, shot, channel):
+        (index, shot) = self.split(shot)
+        return f'{self.excitations[index].columnName(x, y, shot, channel)},E{index + 1}'
+
+    def armTrigger(self, osc):
+        self.excitations[self.active].armTrigger(osc)
+
+    def configureOscilloscope(self, osc):
+        self.excitations[self.active].configureOscilloscope(osc)
+
+class Sink():
+    """
+    Base class of the objects receiving the shots at the end of the pipeline.
+    ``store()`` runs in the store thread.
+
+    """
+    def begin(self, plan, excitation):
+        pass
+
+    def completedShots(self):
+        """
+        :return: The shots already measured, shape ``(points, shots)``, or None if there are none.
+        :rtype: np.ndarray of bool
+
+        """
+        return None
+
+    def store(self, shot):
+        pass
+
+    def end(self):
+        return None
+
+    def abort(self):
+        """
+        Called instead of ``end()`` when the scan fails.
+
+        """
+        pass
+
+    def liveView(self):
+        """
+        :return: The traces of the first channel, shape ``(points, samples)``, and an array which is nonzero for the measured points. Both are updated in place during the scan.
+        :rtype: (np.ndarray, np.ndarray)
+
+        """
+        raise NotImplementedError()
+
+def checkSingleExcitation(sink, excitation):
+    """
+    The sinks reducing the shots of a point mix the shots of all its
+    excitations: they refuse excitation groups.
+
+    """
+    if len(excitation.members()) > 1:
+        raise ValueError(f'{type(sink).__name__} cannot reduce the shots of several excitations, use a SampleStoreSink.')
+
+class SampleStoreSink(Sink):
+    """
+    Keep the traces in a preallocated :py:class:`sample_store.SampleStore`
+    and append each of them to a checkpoint journal.
+
+    If the journal already exists and was written by an interrupted scan with
+    the same parameters, its traces are loaded and only the missing shots are
+    measured. The journal of a finished scan is overwritten: its data is in the
+    dataset saved at the end of the scan. Any other journal (different
+    parameters, unreadable file) is renamed with a timestamp and a new one is
+    started.
+
+    :param journalFile: Path to the checkpoint journal (``None`` to disable).
+    :type journalFile: string
+    :param resume: Resume from an existing journal.
+    :type resume: bool
+    :param keepComplete: Load the journal of a finished scan with the same parameters instead of overwriting it (nothing is measured then).
+    :type keepComplete: bool
+
+    """
+    def __init__(self, journalFile=None, resume=True, keepComplete=False):
+        self.journalFile = journalFile
+        self.resume = resume
+        self.keepComplete = keepComplete
+        self.journal = None
+
+    def begin(self, plan, excitation):
+        p = excitation.experimentParameters
+        others = [member.experimentParameters for member in excitation.members()[1:]]
+        channels = [name for (name, channel) in excitation.channels]
+        self.newStore = lambda: SampleStore.SampleStore(len(plan), excitation.shotsPerPoint(), channels, \
+                                                        SampleStore.samplesFromParameters(p), plan.x, plan.y, \
+                                                        nbExcitations=len(excitation.members()))
+        self.sampleStore = self.newStore()
+        if self.journalFile is not None:
+            description = {"experimentParameters": p, "channels": channels, \
+                           "shape": list(self.sampleStore.data.shape[:-1]), "x": plan.x.tolist(), "y": plan.y.tolist(), \
+                           "excitations": len(excitation.members()), "fingerprint": scanFingerprint(p, plan, others)}
+            if os.path.exists(self.journalFile):
+                self.journal = self._resume(description)
+            if self.journal is None:
+                self.journal = SampleStore.CheckpointJournal(self.journalFile, description)
+
+    def _resume(self, description):
+        """
+        Load the traces of the existing journal if it belongs to an
+        interrupted run of the same scan.
+
+        :return: The journal opened for appending, or None to start a new one.
+        :rtype: sample_store.CheckpointJournal
+
+        """
+        reason = None
+        complete = False
+        try:
+            (previous, records, validSize) = SampleStore.CheckpointJournal.read(self.journalFile)
+            complete = any(record[0] == SampleStore.RECORD_COMPLETE for record in records)
+            if not self.resume:
+                reason = "resuming is disabled"
+            elif previous.get("fingerprint") != description["fingerprint"]:
+                reason = "the parameters of the scan are different"
+            elif complete and not self.keepComplete:
+                reason = "the scan is complete"
+            else:
+                for (kind, point, shot, channel, samples) in records:
+                    if kind == SampleStore.RECORD_SAMPLES:
+                        self.sampleStore.put(point, shot, channel, samples)
+        except (OSError, ValueError, IndexError, KeyError) as e:
+            reason = f'the journal is invalid ({str(e)})'
+
+        if reason is not None:
+            if complete:
+                log.info(f'Not resuming from {self.journalFile}: {reason}. It is overwritten.')
+                os.remove(self.journalFile)
+            else:
+                backup = f'{self.journalFile}.{time.strftime("%Y%m%d-%H%M%S")}'
+                log.warning(f'Not resuming from {self.journalFile}: {reason}. Moved to {backup}.')
+                os.replace(self.journalFile, backup)
+            self.sampleStore = self.newStore()
+            return None
+
+        done = self.completedShots()
+        log.info(f'Resuming from {self.journalFile}: {done.sum()} of {done.size} shots already measured.')
+        return SampleStore.CheckpointJournal(self.journalFile, validSize=validSize)
+
+    def completedShots(self):
+        return self.sampleStore.filled.all(axis=2)
+
+    def store(self, shot):
+        for (channel, name) in enumerate(self.sampleStore.channels):
+            self.sampleStore.put(shot.point, shot.shot, channel, shot.traces[name])
+            if self.journal is not None:
+                self.journal.append(shot.point, shot.shot, channel, shot.traces[name])
+
+    def end(self):
+        if self.journal is not None:
+            self.journal.markComplete()
+            self.journal.close()
+        return self.sampleStore
+
+    def abort(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def liveView(self):
+        return (self.sampleStore.data[:, 0, 0], self.sampleStore.filled[:, 0, 0])
+
+class StatisticsSink(Sink):
+    """
+    Reduce the shots of each point to their mean and variance (and
+    optionally their minimum and maximum) while they arrive (see
+    :py:class:`shot_statistics.ShotStatistics`). Only ``nbRawShots`` raw shots
+    per point are kept.
+
+    There is no journal: an interrupted scan starts again from the beginning.
+
+    :param nbRawShots: Number of raw shots kept for each point.
+    :type nbRawShots: int
+    :param minMax: Also keep the minimum and the maximum of the shots.
+    :type minMax: bool
+
+    """
+    def __init__(self, nbRawShots=0, minMax=False):
+        self.nbRawShots = nbRawShots
+        self.minMax = minMax
+
+    def begin(self, plan, excitation):
+        checkSingleExcitation(self, excitation)
+        channels = [name for (name, channel) in excitation.channels]
+        self.statistics = ShotStats.ShotStatistics(len(plan), excitation.shotsPerPoint(), channels, \
+                                                   SampleStore.samplesFromParameters(excitation.experimentParameters), \
+                                                   plan.x, plan.y, nbRawShots=self.nbRawShots, minMax=self.minMax)
+
+    def store(self, shot):
+        for (channel, name) in enumerate(self.statistics.channels):
+            self.statistics.add(shot.point, shot.shot, channel, shot.traces[name])
+
+    def end(self):
+        self.statistics.finish()
+        return self.statistics
+
+    def liveView(self):
+        return (self.statistics.mean[:, 0], self.statistics.count[:, 0])
+
+class CoherentAveragingSink(Sink):
+    """
+    Average the shots of each point after correcting their trigger jitter
+    (see :py:class:`coherent_averaging.CoherentAverage`).
+
+    There is no journal: an interrupted averaged scan starts again from the
+    beginning.
+
+    :param alignOn: Name of the channel used to estimate the delays (default: each channel is aligned on itself).
+    :type alignOn: string
+    :param maxDelay: Largest delay searched, in samples.
+    :type maxDelay: float
+
+    """
+    def __init__(self, alignOn=None, maxDelay=None):
+        self.alignOn = alignOn
+        self.maxDelay = maxDelay
+
+    def begin(self, plan, excitation):
+        checkSingleExcitation(self, excitation)
+        channels = [name for (name, channel) in excitation.channels]
+        if self.alignOn is not None and self.alignOn not in channels:
+            raise ValueError(f'Cannot align the shots on the {self.alignOn} channel: it is not acquired by this scan (channels: {", ".join(channels)}).')
+        alignOn = channels.index(self.alignOn) if self.alignOn is not None else None
+        self.average = CoherentAveraging.CoherentAverage(len(plan), excitation.shotsPerPoint(), channels, \
+                                                         SampleStore.samplesFromParameters(excitation.experimentParameters), \
+                                                         plan.x, plan.y, alignOn=alignOn, maxDelay=self.maxDelay)
+
+    def store(self, shot):
+        for (channel, name) in enumerate(self.average.channels):
+            self.average.add(shot.point, shot.shot, channel, shot.traces[name])
+
+    def end(self):
+        self.average.finish()
+        return self.average
+
+    def liveView(self):
+        return (self.average.mean[:, 0], self.average.count[:, 0])
+
+def sinkFromParameters(params, journalFile=None):
+    """
+    Choose the sink requested by the experiment parameters:
+
+    + a :py:class:`CoherentAveragingSink` when ``coherent_averaging`` is true
+      (delays estimated on the ``alignment_channel`` channel, e.g.
+      ``"sineSweep"``, or on each channel if it is None),
+    + a :py:class:`StatisticsSink` when ``streaming_statistics`` is true
+      (keeping ``raw_shots_kept`` raw shots, and the minimum and maximum if
+      ``statistics_min_max`` is true),
+    + a :py:class:`SampleStoreSink` otherwise.
+
+    :param params: The experiment parameters
+    :type params: dict
+    :param journalFile: Path to the checkpoint journal of the ``SampleStoreSink``.
+    :type journalFile: string
+
+    :return: The sink
+    :rtype: Sink
+
+    """
+    if params.get('coherent_averaging', False):
+        return CoherentAveragingSink(params.get('alignment_channel'))
+    if params.get('streaming_statistics', False):
+        return StatisticsSink(params.get('raw_shots_kept', 0), params.get('statistics_min_max', False))
+    return SampleStoreSink(journalFile)
+
+class _Stage(threading.Thread):
+    """
+    Worker thread consuming the items of a bounded queue.
+
+    ``release`` is called after an item failed (once the error is recorded)
+    and for each item dropped after a failure, to wake up the producer.
+
+    """
+    def __init__(self, name, function, inputQueue, counter, release=None):
+        super(_Stage, self).__init__(name=name, daemon=True)
+        self.function = function
+        self.inputQueue = inputQueue
+        self.counter = counter
+        self.release = release
+        self.error = None
+
+    def run(self):
+        while True:
+            item = self.inputQueue.get()
+            if item is None:
+                break
+            if self.error is None:
+                try:
+                    t0 = time.perf_counter()
+                    nbBytes = self.function(item)
+                    self.counter.add(time.perf_counter() - t0, nbBytes or 0)
+                    continue
+                except Exception as e:
+                    log.error(f'Error in the {self.name} stage: {str(e)}')
+                    self.error = e
+            # Failed or drained item: the producer must not wait for it.
+            if self.release is not None:
+                self.release()
+
+class ScanError(Exception):
+    """
+    Raised when a stage of the pipeline fails during a scan.
+
+    """
+    pass
+
+class ScanCancelled(ScanError):
+    """
+    Raised when a scan is cancelled with :py:meth:`ScanEngine.cancel`. The
+    journal of the sink is kept, so the scan can be resumed later.
+
+    """
+    pass
+
+class ScanEngine():
+    """
+    Run a scan with a pluggable excitation strategy.
+
+    :param cnc: The handler which controls the CNC.
+    :type cnc: CNC.Cnc
+    :param osc: The handler which controls the oscilloscope.
+    :type osc: Osc.Oscilloscope
+    :param sg: The handler which controls the signal generator.
+    :type sg: SG.SignalGeneratorTCPIP
+    :param params: The experiment parameters
+    :type params: dict
+    :param excitation: The excitation strategy, or a list of excitations played at each point (see :py:class:`ExcitationGroup`).
+    :type excitation: Excitation
+    :param sink: Where the shots are stored (default: a ``SampleStoreSink`` without journal)
+    :type sink: Sink
+    :param plan: The points to visit (default: the serpentine plan of the parameters)
+    :type plan: ScanPlan
+    :param progress: Function called by the store stage after each shot with the shot, the number of shots done and the number of shots to do in this run.
+    :type progress: function
+    :param pointDone: Function called by the store stage with the index of a point when all its shots are stored.
+    :type pointDone: function
+    :param previous: Excitation of the previous scan made with the same instrument sessions. Only the changed settings are sent to the instruments.
+    :type previous: Excitation
+
+    The scan can be paused, resumed and cancelled from another thread. The
+    engine stops at the next point boundary.
+
+    """
+    def __init__(self, cnc, osc, sg, params, excitation, sink=None, plan=None, progress=None, pointDone=None, previous=None):
+        self.cnc = cnc
+        self.osc = osc
+        self.sg = sg
+        self.experimentParameters = params
+        if isinstance(excitation, (list, tuple)):
+            excitation = ExcitationGroup(excitation)
+        self.excitation = excitation
+        self.sink = sink if sink is not None else SampleStoreSink()
+        self.plan = plan if plan is not None else ScanPlan.fromParameters(params)
+        self.pipelineDepth = params.get('pipeline_depth', DEFAULT_PIPELINE_DEPTH)
+        self.progress = progress
+        self.pointDone = pointDone
+        self.previous = previous
+        self.nbShotsDone = 0
+        self.nbShotsToDo = 0
+        self.shotsLeft = {}
+        # (distance in mm, duration in s) of the moves between two points.
+        self.moveTimings = []
+        self.timingsFile = params.get('timings_file')
+
+        self.qualityGate = ShotQuality.QualityGate.fromParameters(params)
+        # Shots measured again, and bad shots kept once the budget was spent, at each point.
+        self.retries = np.zeros(len(self.plan), dtype=np.int64)
+        self.failedShots = np.zeros(len(self.plan), dtype=np.int64)
+        self.rejected = []
+
+        self.cancelled = threading.Event()
+        self.running = threading.Event()
+        self.running.set()
+
+        self.counters = {name: StageCounter(name) for name in ("move", "excite", "transfer", "store")}
+
+    def run(self):
+        """
+        Configure the instruments, scan all the points of the plan and return
+        what the sink produced.
+
+        If the parameters give a ``timings_file``, the timings of the scan are
+        appended to it (see :py:meth:`timings`).
+
+        """
+        runStart = time.perf_counter()
+        self.sink.begin(self.plan, self.excitation)
+        completed = self.sink.completedShots()
+        if completed is not None and completed.all():
+            log.info("All the shots are already measured.")
+            return self.sink.end()
+
+        if self.excitation.reconfigure(self.sg, self.osc, self.previous):
+            time.sleep(SETTLING_TIME_AFTER_CONFIGURATION)
+        else:
+            log.info("The instruments are already configured.")
+
+        self.cnc.unlock()
+
+        self.scopeFree = threading.Event()
+        self.scopeFree.set()
+        self.transferQueue = queue.Queue(maxsize=1)
+        self.storeQueue = queue.Queue(maxsize=self.pipelineDepth)
+
+        transferStage = _Stage("transfer", self._transfer, self.transferQueue, self.counters["transfer"], release=self.scopeFree.set)
+        storeStage = _Stage("store", self._store, self.storeQueue, self.counters["store"])
+        self.stages = [transferStage, storeStage]
+        transferStage.start()
+        storeStage.start()
+
+        try:
+            try:
+                self._scan()
+            finally:
+                self.excitation.stop(self.sg)
+                self.transferQueue.put(None)
+                transferStage.join()
+                self.storeQueue.put(None)
+                storeStage.join()
+                self.logCounters()
+            self._checkStages()
+        except:
+            self.sink.abort()
+            raise
+        log.info("Scan done !")
+        result = self.sink.end()
+        if self.timingsFile:
+            self.saveTimings(self.timingsFile, time.perf_counter() - runStart)
+        return result
+
+    def _scan(self):
+        """
+        The *excite* stage: visit the points and fire the shots which are not
+        measured yet.
+
+        """
+        positionLock = threading.Event()
+        nbShots = self.excitation.shotsPerPoint()
+
+        completed = self.sink.completedShots()
+        if completed is None:
+            completed = np.zeros((len(self.plan), nbShots), dtype=bool)
+        points = np.flatnonzero(~completed.all(axis=1))
+        self.nbShotsToDo = int((~completed).sum())
+        self.shotsLeft = {int(point): int((~completed[point]).sum()) for point in points}
+        if len(points) == 0:
+            return
+        if len(points) < len(self.plan):
+            log.info(f'{len(self.plan) - len(points)} points already measured, starting at point {points[0]}.')
+
+        moveStart = time.perf_counter()
+        self.cnc.goTo(x=self.plan.x[points[0]], y=self.plan.y[points[0]], event=positionLock)
+        self.excitation.start(self.sg)
+
+        for (i, point) in enumerate(points):
+            x = self.plan.x[point]
+            y = self.plan.y[point]
+            shots = self.excitation.shotOrder(np.flatnonzero(~completed[point]))
+
+            log.debug("Waiting to be in position...")
+            positionLock.wait()
+            positionLock.clear()
+            moveDuration = time.perf_counter() - moveStart
+            self.counters["move"].add(moveDuration)
+            if i > 0 and len(self.moveTimings) < MAX_RECORDED_MOVES:
+                previous = points[i - 1]
+                distance = np.hypot(x - self.plan.x[previous], y - self.plan.y[previous])
+                self.moveTimings.append((float(distance), moveDuration))
+            log.debug(f'In position {x},{y} !')
+            self._waitIfPaused()
+
+            t0 = time.perf_counter()
+            self.excitation.atPoint(self.sg, self.osc)
+            for shot in shots:
+                self._fire(shot)
+                if shot == shots[-1] and self.qualityGate is None:
+                    # Start moving while the last waveform is being transferred.
+                    moveStart = self._leave(points, i, positionLock, t0)
+                self.transferQueue.put(Shot(point, shot, x, y, retry=self.qualityGate is not None))
+
+            if self.qualityGate is not None:
+                self._remeasure(point, x, y)
+                moveStart = self._leave(points, i, positionLock, t0)
+
+        # Wait for the last transfer before turning the outputs off.
+        self._waitForScope()
+
+    def _waitForScope(self):
+        """
+        Wait until the transfer of the previous shot is over. Raise
+        :py:class:`ScanError` if a stage failed meanwhile.
+
+        """
+        while not self.scopeFree.wait(STAGE_CHECK_PERIOD):
+            self._checkStages()
+        self._checkStages()
+
+    def _fire(self, shot):
+        self._waitForScope()
+        self.scopeFree.clear()
+        self.excitation.fire(self.sg, self.osc, shot)
+
+    def _leave(self, points, i, positionLock, t0):
+        """
+        End the work at the point ``points[i]`` and start moving to the next one.
+
+        :return: The time the move started.
+        :rtype: float
+
+        """
+        self.counters["excite"].add(time.perf_counter() - t0)
+        if i + 1 == len(points):
+            return None
+        nextPoint = points[i + 1]
+        moveStart = time.perf_counter()
+        log.debug(f'Going to {self.plan.x[nextPoint]},{self.plan.y[nextPoint]}')
+        self.cnc.goTo(x=self.plan.x[nextPoint], y=self.plan.y[nextPoint], event=positionLock)
+        return moveStart
+
+    def _remeasure(self, point, x, y):
+        """
+        Measure again the shots of the point rejected by the quality check,
+        until they pass or the retry budget of the point is spent. The bad
+        shots left are stored anyway and counted in ``failedShots``.
+
+        """
+        while True:
+            # Once the scope is free, the transfer stage has checked all the shots.
+            self._waitForScope()
+            (rejected, self.rejected) = (self.rejected, [])
+            if not rejected:
+                return
+            for bad in rejected:
+                if self.retries[point] < self.qualityGate.retries:
+                    self.retries[point] += 1
+                    log.info(f'Measuring shot {bad.shot} again at {x},{y}: {bad.problems}')
+                    self._fire(bad.shot)
+                    self.transferQueue.put(Shot(point, bad.shot, x, y, retry=True))
+                else:
+                    log.warning(f'Keeping the bad shot {bad.shot} at {x},{y}: {bad.problems}')
+                    self.failedShots[point] += 1
+                    self.storeQueue.put(bad)
+
+    def _transfer(self, shot):
+        """
+        The *transfer* stage: read the waveforms of a shot from the oscilloscope.
+
+        """
+        nbBytes = 0
+        for (name, channel) in self.excitation.channels:
+            shot.traces[name] = self.osc.acquire(readOnly=True, channel=channel)['data']
+            nbBytes += shot.traces[name].nbytes
+        if self.qualityGate is not None:
+            shot.problems = self.qualityGate.check(shot.traces)
+            if shot.problems and shot.retry:
+                # Measured again by the excite stage, see _remeasure().
+                self.rejected.append(shot)
+                self.scopeFree.set()
+                return nbBytes
+        # On failure, the scope is released by the stage once the error is recorded.
+        self.scopeFree.set()
+        self.storeQueue.put(shot)
+        log.debug(f'Transfer done for shot {shot.shot} in position {shot.x},{shot.y}')
+        return nbBytes
+
+    def _store(self, shot):
+        """
+        The *store* stage: give the shot to the sink.
+
+        """
+        self.sink.store(shot)
+        self.nbShotsDone += 1
+        if self.progress is not None:
+            self.progress(shot, self.nbShotsDone, self.nbShotsToDo)
+        self.shotsLeft[shot.point] -= 1
+        if self.shotsLeft[shot.point] == 0 and self.pointDone is not None:
+            self.pointDone(shot.point)
+        return sum(trace.nbytes for trace in shot.traces.values())
+
+    def pause(self):
+        """
+        Pause the scan before the next point.
+
+        """
+        log.info("Pausing the scan...")
+        self.running.clear()
+
+    def resume(self):
+        """
+        Resume a paused scan.
+
+        """
+        log.info("Resuming the scan...")
+        self.running.set()
+
+    def cancel(self):
+        """
+        Stop the scan before the next point. :py:meth:`run` raises
+        :py:class:`ScanCancelled`.
+
+        """
+        log.info("Cancelling the scan...")
+        self.cancelled.set()
+        self.running.set()
+
+    def _waitIfPaused(self):
+        self.running.wait()
+        if self.cancelled.is_set():
+            # Let the shots already fired reach the sink.
+            self._waitForScope()
+            raise ScanCancelled("The scan was cancelled.")
+
+    def _checkStages(self):
+        for stage in self.stages:
+            if stage.error is not None:
+                raise ScanError(f'The {stage.name} stage failed: {str(stage.error)}') from stage.error
+
+    def timings(self, duration):
+        """
+        Timings of the scan, used to calibrate the duration estimates (see
+        :py:mod:`scan_estimator`).
+
+        :param duration: Total duration of the run, in s.
+        :type duration: float
+
+        :return: The description of the run and the counters of the stages.
+        :rtype: dict
+
+        """
+        return {"date": time.strftime("%Y-%m-%d %H:%M:%S"), \
+                "points": len(self.shotsLeft), \
+                "shots": self.nbShotsDone, \
+                "channels": len(self.excitation.channels), \
+                "samples": SampleStore.samplesFromParameters(self.experimentParameters), \
+                "point_delay": self.excitation.pointDelay(), \
+                "shot_delay": self.excitation.shotDelay(), \
+                "duration": duration, \
+                "moves": self.moveTimings, \
+                "retries": int(self.retries.sum()), \
+                "counters": {name: counter.summary() for (name, counter) in self.counters.items()}}
+
+    def qualityReport(self):
+        """
+        :return: The retries and the bad shots kept at each point (in the order of the plan), and the number of problems of each kind, or None without quality check.
+        :rtype: dict
+
+        """
+        if self.qualityGate is None:
+            return None
+        return {"retries": self.retries.tolist(), "failed_shots": self.failedShots.tolist(), \
+                "problems": dict(self.qualityGate.counts)}
+
+    def saveTimings(self, filename, duration):
+        """
+        Append the timings of the scan to a file (one JSON object per line).
+
+        """
+        try:
+            with open(filename, "a") as fhandle:
+                fhandle.write(json.dumps(self.timings(duration)) + "\n")
+        except OSError as e:
+            log.error(f'Unable to save the timings of the scan: {str(e)}')
+
+    def logCounters(self):
+        for counter in self.counters.values():
+            s = counter.summary()
+            log.info(f'Stage {counter.name}: {s["count"]} items, busy {s["busy_time"]:.1f} s, {s["items_per_s"]:.2f} items/s, {s["MB_per_s"]:.2f} MB/s')
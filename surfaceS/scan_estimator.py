@@ -0,0 +1,304 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``scan_estimator`` module
+=============================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+Estimation of the duration of a scan without touching the instruments.
+
+The estimate walks the plan of the scan with a cost model of each stage of the
+:py:class:`scan_engine.ScanEngine`:
+
++ *configure*: configuration of the instruments and settling time,
++ *move*: a fixed overhead per move plus the travel at the CNC speed,
++ *excite*: the waits of the excitation (``delay_before_measuring``,
+  ``time_division``...) plus a fixed overhead per shot,
++ *transfer*: a latency per trace plus the samples at the transfer rate,
++ *store*: the samples at the storage rate.
+
+As in the engine, the shots of a point are fired one after the other once the
+previous waveform is transferred, and the transfer of the last shot of a point
+overlaps the move to the next point.
+
+The coefficients of the model are calibrated on the timings that the engine
+records in the ``timings_file`` of the experiment parameters after each run.
+There is none by default: the recording is enabled by giving a path, e.g.
+next to the ``data_filename``.
+
+:Example:
+
+>>> model = CostModel.fromTimings("scan_timings.jsonl")
+>>> estimate = model.estimate(params, ImpactExcitation)
+>>> print(formatEstimate(estimate))
+
+"""
+
+import os
+import json
+import logging as log
+
+import numpy as np
+
+import scan_engine as SE
+import sample_store as SampleStore
+
+# Coefficients used when there are no timings.
+DEFAULT_COEFFICIENTS = {
+    "configure_time": 1.0,      # s
+    "move_overhead": 0.3,       # s per move
+    "move_speed": 1000.0/60,    # mm/s, the default feedrate of the CNC
+    "shot_overhead": 0.05,      # s per shot
+    "transfer_latency": 0.05,   # s per trace
+    "transfer_rate": 2.0e6,     # samples/s
+    "store_rate": 5.0e7,        # samples/s
+}
+
+# Parameters tested by the sensitivity analysis.
+SENSITIVITY_PARAMETERS = ('nb_point_x', 'nb_point_y', 'samples_per_point', 'OSCNumSamples', \
+                          'delay_before_measuring', 'time_division', 'step_x', 'step_y')
+
+# Relative change of the parameters in the sensitivity analysis.
+SENSITIVITY_STEP = 0.1
+
+def _fitAffine(x, t, intercept, slope):
+    """
+    Fit ``t = intercept + slope*x``. If ``x`` does not vary, only a common
+    scale factor is applied to the current coefficients.
+
+    """
+    x = np.asarray(x, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)
+    if x.size >= 2 and np.ptp(x) > 0:
+        (a, b) = np.linalg.lstsq(np.stack([np.ones_like(x), x], axis=1), t, rcond=None)[0]
+        if a >= 0 and b > 0:
+            return (a, b)
+    predicted = np.sum(intercept + slope*x)
+    scale = t.sum()/predicted if predicted > 0 else 1.0
+    return (intercept*scale, slope*scale)
+
+def readTimings(filename):
+    """
+    Read the timings recorded by the scan engine.
+
+    :param filename: Path to the file.
+    :type filename: string
+
+    :return: The records (unreadable lines are skipped).
+    :rtype: list
+
+    """
+    records = []
+    with open(filename) as fhandle:
+        for line in fhandle:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                log.warning(f'Skipping an invalid line of {filename}.')
+    return records
+
+class CostModel():
+    """
+    Cost model of a scan.
+
+    :param coefficients: The coefficients, see ``DEFAULT_COEFFICIENTS``.
+    :type coefficients: dict
+
+    """
+    def __init__(self, coefficients=None):
+        self.coefficients = dict(DEFAULT_COEFFICIENTS)
+        if coefficients is not None:
+            self.coefficients.update(coefficients)
+
+    def fromTimings(filename):
+        """
+        Build a model calibrated on the recorded timings, or the default model
+        if there are none.
+
+        :param filename: Path to the timings (see ``ScanEngine.saveTimings``).
+        :type filename: string
+
+        :return: The model
+        :rtype: CostModel
+
+        """
+        model = CostModel()
+        if filename and os.path.exists(filename):
+            model.calibrate(readTimings(filename))
+        return model
+
+    def calibrate(self, records):
+        """
+        Fit the coefficients on the timings of previous runs.
+
+        :param records: Timings as written by ``ScanEngine.saveTimings``.
+        :type records: list
+
+        """
+        c = self.coefficients
+        records = [r for r in records if r.get("shots", 0) > 0]
+        if len(records) == 0:
+            return
+
+        moves = [m for r in records for m in r["moves"]]
+        if len(moves) > 0:
+            (distance, duration) = zip(*moves)
+            (c["move_overhead"], inverseSpeed) = _fitAffine(distance, duration, c["move_overhead"], 1.0/c["move_speed"])
+            c["move_speed"] = 1.0/inverseSpeed
+
+        # Time per trace against the number of samples.
+        samples = [r["samples"] for r in records]
+        perTrace = [r["counters"]["transfer"]["busy_time"]/(r["counters"]["transfer"]["count"]*r["channels"]) for r in records]
+        (c["transfer_latency"], inverseRate) = _fitAffine(samples, perTrace, c["transfer_latency"], 1.0/c["transfer_rate"])
+        c["transfer_rate"] = 1.0/inverseRate
+
+        storeTime = sum(r["counters"]["store"]["busy_time"] for r in records)
+        storedSamples = sum(r["counters"]["store"]["count"]*r["channels"]*r["samples"] for r in records)
+        if storeTime > 0:
+            c["store_rate"] = storedSamples/storeTime
+
+        overheads = []
+        configureTimes = []
+        for (r, transfer) in zip(records, perTrace):
+            waited = r["points"]*r["point_delay"] + r["shots"]*r["shot_delay"] + \
+                     (r["shots"] - r["points"])*transfer*r["channels"]
+            overheads.append(max(r["counters"]["excite"]["busy_time"] - waited, 0.0)/r["shots"])
+            scanning = r["counters"]["move"]["busy_time"] + r["counters"]["excite"]["busy_time"]
+            configureTimes.append(max(r["duration"] - scanning - SE.SETTLING_TIME_AFTER_CONFIGURATION, 0.0))
+        c["shot_overhead"] = float(np.mean(overheads))
+        c["configure_time"] = float(np.mean(configureTimes))
+        log.info(f'Cost model calibrated on {len(records)} runs: {c}')
+
+    def estimate(self, params, excitationClass, plan=None, sensitivity=True):
+        """
+        Estimate the duration of a scan.
+
+        :param params: The experiment parameters
+        :type params: dict
+        :param excitationClass: The class of the excitation strategy (e.g. ``ImpactExcitation``).
+        :type excitationClass: class
+        :param plan: The points to visit (default: the serpentine plan of the parameters)
+        :type plan: SE.ScanPlan
+        :param sensitivity: Also compute the sensitivity to the parameters.
+        :type sensitivity: bool
+
+        :return: ``total`` (s), ``stages`` (s per stage), ``points``,
+                 ``shots`` and, with ``sensitivity``, ``sensitivity`` (the
+                 relative change of the total for a relative change of each
+                 parameter, largest first) and ``most_sensitive``.
+        :rtype: dict
+
+        """
+        c = self.coefficients
+        excitation = excitationClass(params)
+        fixedPlan = plan is not None
+        if plan is None:
+            plan = SE.ScanPlan.fromParameters(params)
+
+        nbPoints = len(plan)
+        nbShots = excitation.shotsPerPoint()
+        nbChannels = len(excitation.channels)
+        nbSamples = SampleStore.samplesFromParameters(params)
+
+        distances = np.hypot(np.diff(plan.x), np.diff(plan.y))
+        moves = c["move_overhead"] + distances/c["move_speed"]
+        transfer = nbChannels*(c["transfer_latency"] + nbSamples/c["transfer_rate"])
+        store = nbChannels*nbSamples/c["store_rate"]
+        excite = excitation.shotDelay() + c["shot_overhead"]
+        # The store stage only shows when it is slower than a shot.
+        storeWait = max(store - (excite + transfer), 0.0)
+
+        stages = {
+            "configure": c["configure_time"] + SE.SETTLING_TIME_AFTER_CONFIGURATION,
+            "move": float(np.sum(moves)),
+            "excite": nbPoints*(excitation.pointDelay() + nbShots*excite),
+            # Transfers between the shots, the ones longer than the next move and the last one.
+            "transfer": nbPoints*(nbShots - 1)*transfer + float(np.sum(np.maximum(transfer - moves, 0.0))) + transfer,
+            "store": nbPoints*nbShots*storeWait,
+        }
+        result = {"total": sum(stages.values()), "stages": stages, "points": nbPoints, "shots": nbPoints*nbShots}
+
+        if sensitivity:
+            names = [n for n in SENSITIVITY_PARAMETERS if n in params]
+            if fixedPlan:
+                names = [n for n in names if n not in ('nb_point_x', 'nb_point_y', 'step_x', 'step_y')]
+            elasticities = []
+            for name in names:
+                (changed, ratio) = _perturb(params, name)
+                if ratio is None:
+                    continue
+                total = self.estimate(changed, excitationClass, plan if fixedPlan else None, sensitivity=False)["total"]
+                elasticities.append((name, (total/result["total"] - 1)/(ratio - 1)))
+            elasticities.sort(key=lambda e: abs(e[1]), reverse=True)
+            result["sensitivity"] = elasticities
+            result["most_sensitive"] = elasticities[0][0] if len(elasticities) > 0 else None
+        return result
+
+def _perturb(params, name):
+    """
+    :return: A copy of the parameters with ``name`` increased by about ``SENSITIVITY_STEP``, and the ratio of the new and old values (None if the value is 0).
+    :rtype: (dict, float)
+
+    """
+    changed = dict(params)
+    if name == 'OSCNumSamples':
+        value = SampleStore.samplesFromParameters(params)
+        newValue = int(round(value*(1 + SENSITIVITY_STEP)))
+        changed[name] = str(newValue)
+    elif name == 'nb_point_y':
+        # nb_point_y + 1 rows are scanned.
+        value = params[name] + 1
+        newValue = max(int(round(value*(1 + SENSITIVITY_STEP))), value + 1)
+        changed[name] = newValue - 1
+    elif isinstance(params[name], int):
+        value = params[name]
+        newValue = max(int(round(value*(1 + SENSITIVITY_STEP))), value + 1)
+        changed[name] = newValue
+    else:
+        value = params[name]
+        newValue = value*(1 + SENSITIVITY_STEP)
+        changed[name] = newValue
+    if value == 0:
+        return (changed, None)
+    return (changed, newValue/value)
+
+def formatDuration(seconds):
+    seconds = int(round(seconds))
+    return f'{seconds//3600}:{(seconds//60)%60:02d}:{seconds%60:02d}'
+
+def formatEstimate(estimate):
+    """
+    :return: A human readable summary of an estimate.
+    :rtype: string
+
+    """
+    lines = [f'Estimated duration: {formatDuration(estimate["total"])} ({estimate["points"]} points, {estimate["shots"]} shots)']
+    for (stage, duration) in estimate["stages"].items():
+        lines.append(f'  {stage:<10} {formatDuration(duration)} ({100*duration/estimate["total"]:.1f} %)')
+    if estimate.get("most_sensitive") is not None:
+        (name, elasticity) = estimate["sensitivity"][0]
+        lines.append(f'Most sensitive parameter: {name} (+10 % -> {100*SENSITIVITY_STEP*elasticity:+.1f} % duration)')
+    return "\n".join(lines)
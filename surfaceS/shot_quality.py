@@ -0,0 +1,177 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``shot_quality`` module
+===========================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module checks each shot as soon as its waveforms are transferred, so that
+a bad shot can be measured again while the CNC is still in position (see
+:py:class:`scan_engine.ScanEngine`). Three problems are detected:
+
++ *clipping*: samples at the limits of the ``int16`` range, i.e. a saturated
+  channel,
++ *low SNR*: the RMS of the trace after the trigger, compared with the noise
+  floor measured before the trigger, is too low (laser dropout, no impact),
++ *missing trigger*: the oscilloscope was not triggered and returned the
+  previous waveform again.
+
+The checks are done on all the channels of a shot at once.
+
+"""
+
+import logging as log
+
+import numpy as np
+
+INT16_MIN = np.iinfo(np.int16).min
+INT16_MAX = np.iinfo(np.int16).max
+
+# Names of the problems.
+CLIPPED = "clipped"
+LOW_SNR = "low_snr"
+NO_TRIGGER = "no_trigger"
+PROBLEMS = (CLIPPED, LOW_SNR, NO_TRIGGER)
+
+DEFAULT_PRETRIGGER_FRACTION = 0.1
+DEFAULT_MIN_SNR = 6.0
+DEFAULT_MAX_CLIPPED_FRACTION = 0.0
+DEFAULT_RETRIES = 2
+
+def clippedFraction(traces):
+    """
+    :param traces: Traces, shape ``(channels, samples)``.
+    :type traces: np.ndarray of int16
+
+    :return: The fraction of the samples of each trace at the limits of the ``int16`` range.
+    :rtype: np.ndarray
+
+    """
+    return ((traces == INT16_MIN) | (traces == INT16_MAX)).mean(axis=-1)
+
+def signalToNoise(traces, nbPretrigger):
+    """
+    Ratio between the RMS of the traces after the trigger and the standard
+    deviation of the ``nbPretrigger`` first samples (the noise floor). The
+    offset measured before the trigger is removed.
+
+    :param traces: Traces, shape ``(channels, samples)``.
+    :type traces: np.ndarray
+    :param nbPretrigger: Number of samples before the trigger.
+    :type nbPretrigger: int
+
+    :return: The SNR of each trace, in dB (``inf`` without noise).
+    :rtype: np.ndarray
+
+    """
+    traces = np.asarray(traces, dtype=np.float64)
+    pretrigger = traces[:, :nbPretrigger]
+    offset = pretrigger.mean(axis=1, keepdims=True)
+    noise = pretrigger.std(axis=1)
+    signal = np.sqrt(((traces[:, nbPretrigger:] - offset)**2).mean(axis=1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        snr = 20*np.log10(signal/noise)
+    # No noise: the SNR is infinite unless there is no signal either.
+    snr[noise == 0] = np.where(signal[noise == 0] > 0, np.inf, -np.inf)
+    return snr
+
+class QualityGate():
+    """
+    Per-shot quality check.
+
+    :param pretriggerFraction: Fraction of the trace acquired before the trigger, used as noise floor.
+    :type pretriggerFraction: float
+    :param minSnr: Smallest SNR accepted, in dB (None to skip the check, e.g. with a continuous excitation which is already there before the trigger).
+    :type minSnr: float
+    :param maxClippedFraction: Largest fraction of clipped samples accepted.
+    :type maxClippedFraction: float
+    :param retries: Number of shots which can be measured again at each point.
+    :type retries: int
+
+    """
+    def __init__(self, pretriggerFraction=DEFAULT_PRETRIGGER_FRACTION, minSnr=DEFAULT_MIN_SNR, \
+                 maxClippedFraction=DEFAULT_MAX_CLIPPED_FRACTION, retries=DEFAULT_RETRIES):
+        self.pretriggerFraction = pretriggerFraction
+        self.minSnr = minSnr
+        self.maxClippedFraction = maxClippedFraction
+        self.retries = retries
+        # Last trace of each channel, to detect the missing triggers.
+        self.previous = None
+        self.counts = {problem: 0 for problem in PROBLEMS}
+
+    def fromParameters(params):
+        """
+        Build the gate described by the ``quality_*`` experiment parameters.
+
+        :return: The gate, or None if ``quality_check`` is false.
+        :rtype: QualityGate
+
+        """
+        if not params.get('quality_check', False):
+            return None
+        return QualityGate(params.get('quality_pretrigger_fraction', DEFAULT_PRETRIGGER_FRACTION), \
+                           params.get('quality_min_snr', DEFAULT_MIN_SNR), \
+                           params.get('quality_max_clipped_fraction', DEFAULT_MAX_CLIPPED_FRACTION), \
+                           params.get('quality_retries', DEFAULT_RETRIES))
+
+    def check(self, traces):
+        """
+        Check the traces of one shot.
+
+        :param traces: The traces of the shot, by channel name.
+        :type traces: dict
+
+        :return: The problems found, as ``(problem, channel name)``. Empty if the shot is good.
+        :rtype: list
+
+        """
+        names = list(traces.keys())
+        stacked = np.stack([traces[name] for name in names])
+        nbPretrigger = max(1, int(self.pretriggerFraction*stacked.shape[1]))
+
+        checks = [(CLIPPED, clippedFraction(stacked) > self.maxClippedFraction), (NO_TRIGGER, self._stale(stacked))]
+        if self.minSnr is not None:
+            checks.append((LOW_SNR, signalToNoise(stacked, nbPretrigger) < self.minSnr))
+
+        problems = []
+        for (problem, failed) in checks:
+            for channel in np.flatnonzero(failed):
+                problems.append((problem, names[channel]))
+                self.counts[problem] += 1
+        self.previous = stacked
+        if problems:
+            log.debug(f'Bad shot: {problems}')
+        return problems
+
+    def _stale(self, stacked):
+        """
+        :return: For each channel, True if the trace is the same as the one of the previous shot.
+        :rtype: np.ndarray of bool
+
+        """
+        if self.previous is None or self.previous.shape != stacked.shape:
+            return np.zeros(stacked.shape[0], dtype=bool)
+        return (self.previous == stacked).all(axis=1)
@@ -0,0 +1,186 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``shot_statistics`` module
+==============================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module reduces the repeated shots of each point to their statistics while
+they are acquired. Instead of the ``samples_per_point`` waveforms of a point,
+only the mean and the variance of every sample are kept, plus optionally their
+minimum and maximum and the first few raw shots.
+
+The mean and the variance are stored in ``float32``: 8 bytes per sample instead
+of 2 bytes per shot, i.e. the traces of a point take ``samples_per_point/4``
+times less memory (7.5 for 30 shots). The minimum and the maximum add 4 bytes
+per sample and each raw shot 2.
+
+The accumulation uses Welford's algorithm in ``float64`` over the ``int16``
+samples, so the mean and the variance match the offline computation on all the
+shots. The accumulators only exist for the points being measured; once all the
+shots of a point are in, the results are written to the arrays of the object.
+
+"""
+
+import logging as log
+
+import numpy as np
+
+class ShotStatistics():
+    """
+    Per-sample statistics of the shots of each point.
+
+    :param nbPoints: Number of points of the plan.
+    :type nbPoints: int
+    :param nbShots: Number of shots per point.
+    :type nbShots: int
+    :param channels: Names of the traces acquired for each shot.
+    :type channels: list
+    :param nbSamples: Expected number of samples per trace.
+    :type nbSamples: int
+    :param x: X coordinate of each point.
+    :type x: np.ndarray
+    :param y: Y coordinate of each point.
+    :type y: np.ndarray
+    :param nbRawShots: Number of raw shots kept for each point.
+    :type nbRawShots: int
+    :param dtype: Type of the stored mean and variance.
+    :type dtype: np.dtype
+    :param minMax: Also compute the minimum and the maximum.
+    :type minMax: bool
+
+    The results are in ``mean``, ``variance`` (unbiased), ``min`` and ``max``
+    (None without ``minMax``), all of shape ``(points, channels, samples)``,
+    and the raw shots in ``raw``, of shape ``(points, nbRawShots, channels,
+    samples)``. ``count`` is the number of shots accumulated for each point
+    and channel.
+
+    """
+    def __init__(self, nbPoints, nbShots, channels, nbSamples, x=None, y=None, nbRawShots=0, dtype=np.float32, minMax=False):
+        self.nbShots = nbShots
+        self.channels = list(channels)
+        self.x = np.asarray(x) if x is not None else np.zeros(nbPoints)
+        self.y = np.asarray(y) if y is not None else np.zeros(nbPoints)
+        self.nbRawShots = min(nbRawShots, nbShots)
+        self.dtype = dtype
+        self.minMax = minMax
+        self.count = np.zeros((nbPoints, len(self.channels)), dtype=np.int32)
+        self._allocate(nbSamples)
+        # (point, channel) -> [mean, m2, min, max] of the points being measured.
+        self._accumulators = {}
+
+    def _allocate(self, nbSamples):
+        shape = (self.count.shape[0], len(self.channels), nbSamples)
+        self.mean = np.zeros(shape, dtype=self.dtype)
+        self.variance = np.zeros(shape, dtype=self.dtype)
+        self.min = np.zeros(shape, dtype=np.int16) if self.minMax else None
+        self.max = np.zeros(shape, dtype=np.int16) if self.minMax else None
+        self.raw = np.zeros((shape[0], self.nbRawShots) + shape[1:], dtype=np.int16)
+        nbBytes = sum(array.nbytes for array in (self.mean, self.variance, self.min, self.max, self.raw) if array is not None)
+        log.debug(f'Shot statistics allocated: {shape}, {nbBytes/1e6:.1f} MB')
+
+    def add(self, point, shot, channel, trace):
+        """
+        Accumulate one trace.
+
+        As for the sample store, the first trace fixes the number of samples.
+
+        :param channel: Index of the channel in ``channels``.
+        :type channel: int
+
+        """
+        if trace.shape[0] != self.mean.shape[-1]:
+            if self.count.any():
+                raise ValueError(f'Trace of {trace.shape[0]} samples, expected {self.mean.shape[-1]}.')
+            log.info(f'Resizing the shot statistics to {trace.shape[0]} samples per trace.')
+            self._allocate(trace.shape[0])
+
+        key = (point, channel)
+        if key not in self._accumulators:
+            extrema = [trace.copy(), trace.copy()] if self.minMax else [None, None]
+            self._accumulators[key] = [np.zeros(trace.shape[0]), np.zeros(trace.shape[0])] + extrema
+        (mean, m2, low, high) = self._accumulators[key]
+
+        self.count[point, channel] += 1
+        n = self.count[point, channel]
+        delta = trace - mean
+        mean += delta/n
+        m2 += delta*(trace - mean)
+        if self.minMax:
+            np.minimum(low, trace, out=low)
+            np.maximum(high, trace, out=high)
+
+        if shot < self.nbRawShots:
+            self.raw[point, shot, channel] = trace
+        if n == self.nbShots:
+            self._finalize(key)
+
+    def _finalize(self, key):
+        (mean, m2, low, high) = self._accumulators.pop(key)
+        n = self.count[key]
+        self.mean[key] = mean
+        self.variance[key] = m2/(n - 1) if n > 1 else 0
+        if self.minMax:
+            self.min[key] = low
+            self.max[key] = high
+
+    def finish(self):
+        """
+        Write the results of the points which did not receive all their shots.
+
+        """
+        for key in list(self._accumulators.keys()):
+            self._finalize(key)
+
+    def to_dataframe(self, columnName, statistics=None):
+        """
+        Convert the statistics to the legacy ``pd.DataFrame`` format.
+
+        The column of a statistic is the name of the first shot of the point
+        followed by ``,`` and the name of the statistic, e.g. ``x,y,mean``. The
+        raw shots keep their usual names.
+
+        :param columnName: Function ``(x, y, shot, channelName)`` giving the name of a column.
+        :type columnName: function
+        :param statistics: The statistics to export (default: all those computed).
+        :type statistics: tuple
+
+        :return: The statistics
+        :rtype: pd.Dataframe
+
+        """
+        import pandas as pd
+
+        if statistics is None:
+            statistics = ("mean", "variance", "min", "max") if self.minMax else ("mean", "variance")
+        columns = {}
+        for (point, channel) in zip(*np.nonzero(self.count)):
+            name = columnName(self.x[point], self.y[point], 0, self.channels[channel])
+            for statistic in statistics:
+                columns[f'{name},{statistic}'] = getattr(self, statistic)[point, channel]
+            for shot in range(min(self.nbRawShots, self.count[point, channel])):
+                columns[columnName(self.x[point], self.y[point], shot, self.channels[channel])] = self.raw[point, shot, channel]
+        return pd.DataFrame(columns)
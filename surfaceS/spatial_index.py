@@ -0,0 +1,264 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``spatial_index`` module
+============================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module indexes the measurement points of a dataset by their machine
+coordinates, for the layouts which are not a full grid (masks, adaptive scans,
+mosaics of tiles): nearest points, points within a radius and points in a
+rectangle are found in logarithmic time instead of a scan of all the points.
+
+The index is a k-d tree stored implicitly in a permutation of the points: the
+points ``order[lo:hi]`` of a node are split on their median
+``order[(lo + hi)//2]``, along X at even depths and Y at odd depths, the
+smaller ones before it and the larger ones after it. Nodes of at most
+``leafSize`` points are leaves, scanned at once. The permutation is all that
+is stored in the container of the dataset (see :py:mod:`dataset_container`),
+as ``spatial_order``.
+
+"""
+
+import time
+import heapq
+import logging as log
+
+import numpy as np
+
+import dataset_container as Container
+
+# Number of points of the leaves of the tree.
+LEAF_SIZE = 32
+
+INDEX_ARRAY = "spatial_order"
+
+class SpatialIndex():
+    """
+    k-d tree of points in the plane.
+
+    :param x: X coordinate of each point.
+    :type x: np.ndarray
+    :param y: Y coordinate of each point.
+    :type y: np.ndarray
+    :param order: The permutation of the points which stores the tree (see :py:func:`build`).
+    :type order: np.ndarray
+    :param leafSize: Number of points of the leaves of the tree.
+    :type leafSize: int
+
+    """
+    def __init__(self, x, y, order, leafSize=LEAF_SIZE):
+        self.order = np.asarray(order, dtype=np.int64)
+        self.leafSize = int(leafSize)
+        # Coordinates in the order of the tree.
+        self.coordinates = np.stack((np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)), axis=1)[self.order]
+        # The nodes are visited one at a time: their coordinates are compared as floats.
+        self._nodes = self.coordinates.tolist()
+
+    def __len__(self):
+        return self.order.size
+
+    def description(self):
+        """
+        :return: The attributes of the index in a container.
+        :rtype: dict
+
+        """
+        return {"leaf_size": self.leafSize, "points": len(self)}
+
+    def nearest(self, x, y, k=1):
+        """
+        Find the nearest points of a position, or of each of several positions.
+
+        :param x: X coordinate of the position(s).
+        :type x: float or np.ndarray
+        :param y: Y coordinate of the position(s).
+        :type y: float or np.ndarray
+        :param k: Number of points.
+        :type k: int
+
+        :return: The points, nearest first, and their distances: shape ``(k,)``, or ``(positions, k)`` for several positions. Missing points (fewer than ``k``) are -1, at an infinite distance.
+        :rtype: (np.ndarray, np.ndarray)
+
+        """
+        if np.ndim(x) > 0:
+            results = [self.nearest(px, py, k) for (px, py) in zip(np.ravel(x), np.ravel(y))]
+            return (np.array([r[0] for r in results], dtype=np.int64).reshape(-1, k), \
+                    np.array([r[1] for r in results], dtype=np.float64).reshape(-1, k))
+        query = (float(x), float(y))
+        # Max-heap of the best points: (-squared distance, position in the tree).
+        best = []
+        self._nearest(query, k, 0, len(self), 0, best)
+        best = sorted((-d, i) for (d, i) in best)
+        points = np.full(k, -1, dtype=np.int64)
+        distances = np.full(k, np.inf)
+        points[:len(best)] = [self.order[i] for (d, i) in best]
+        distances[:len(best)] = np.sqrt([d for (d, i) in best])
+        return (points, distances)
+
+    def _nearest(self, query, k, lo, hi, depth, best):
+        if hi - lo <= self.leafSize:
+            distances = np.square(self.coordinates[lo:hi] - np.array(query)).sum(axis=1)
+            for i in np.argsort(distances)[:k]:
+                if len(best) < k:
+                    heapq.heappush(best, (-distances[i], lo + i))
+                elif distances[i] < -best[0][0]:
+                    heapq.heapreplace(best, (-distances[i], lo + i))
+                else:
+                    break
+            return
+        mid = (lo + hi)//2
+        node = self._nodes[mid]
+        distance = (node[0] - query[0])**2 + (node[1] - query[1])**2
+        if len(best) < k:
+            heapq.heappush(best, (-distance, mid))
+        elif distance < -best[0][0]:
+            heapq.heapreplace(best, (-distance, mid))
+        difference = query[depth % 2] - node[depth % 2]
+        (near, far) = (((lo, mid), (mid + 1, hi)) if difference < 0 else ((mid + 1, hi), (lo, mid)))
+        self._nearest(query, k, near[0], near[1], depth + 1, best)
+        if len(best) < k or difference*difference < -best[0][0]:
+            self._nearest(query, k, far[0], far[1], depth + 1, best)
+
+    def rectangle(self, xMin, xMax, yMin, yMax):
+        """
+        :return: The points in the rectangle (bounds included), sorted.
+        :rtype: np.ndarray
+
+        """
+        return self._collect((float(xMin), float(yMin)), (float(xMax), float(yMax)))
+
+    def radius(self, x, y, r):
+        """
+        :return: The points at a distance of at most ``r`` of ``(x, y)``, sorted.
+        :rtype: np.ndarray
+
+        """
+        (x, y, r) = (float(x), float(y), float(r))
+        return self._collect((x - r, y - r), (x + r, y + r), (x, y), r)
+
+    def _collect(self, low, high, center=None, r=None):
+        found = []
+        stack = [(0, len(self), 0)]
+        while stack:
+            (lo, hi, depth) = stack.pop()
+            if hi - lo <= self.leafSize:
+                leaf = self.coordinates[lo:hi]
+                found.append(lo + np.flatnonzero((leaf[:, 0] >= low[0]) & (leaf[:, 0] <= high[0]) & \
+                                                 (leaf[:, 1] >= low[1]) & (leaf[:, 1] <= high[1])))
+                continue
+            mid = (lo + hi)//2
+            node = self._nodes[mid]
+            if low[0] <= node[0] <= high[0] and low[1] <= node[1] <= high[1]:
+                found.append(np.array([mid]))
+            axis = depth % 2
+            if low[axis] <= node[axis]:
+                stack.append((lo, mid, depth + 1))
+            if high[axis] >= node[axis]:
+                stack.append((mid + 1, hi, depth + 1))
+        positions = np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+        if center is not None:
+            positions = positions[np.square(self.coordinates[positions] - np.array(center)).sum(axis=1) <= r*r]
+        return np.sort(self.order[positions])
+
+    def gridPoints(self, gridX, gridY):
+        """
+        Place the points on a regular grid, e.g. to display them: each node of
+        the grid takes its nearest point, unless it is farther from it than
+        the nearest other point (the node is outside of the measured area).
+
+        :param gridX: X coordinate of the columns of the grid.
+        :type gridX: np.ndarray
+        :param gridY: Y coordinate of the rows of the grid.
+        :type gridY: np.ndarray
+
+        :return: The point at each node of the grid, -1 where there is none, shape ``(columns, rows)``.
+        :rtype: np.ndarray
+
+        """
+        (nodesX, nodesY) = np.meshgrid(gridX, gridY, indexing='ij')
+        (points, distances) = self.nearest(nodesX.ravel(), nodesY.ravel())
+        (points, distances) = (points[:, 0], distances[:, 0])
+        # Distance from each point found to its nearest neighbour.
+        candidates = np.unique(points[points >= 0])
+        inverse = np.empty_like(self.order)
+        inverse[self.order] = np.arange(self.order.size)
+        coordinates = self.coordinates[inverse[candidates]]
+        spacing = np.zeros(len(self))
+        spacing[candidates] = self.nearest(coordinates[:, 0], coordinates[:, 1], k=2)[1][:, 1]
+        points[(points < 0) | (distances > spacing[points])] = -1
+        return points.reshape(nodesX.shape)
+
+def build(x, y, writer=None, leafSize=LEAF_SIZE):
+    """
+    Build the index of points.
+
+    :param x: X coordinate of each point.
+    :type x: np.ndarray
+    :param y: Y coordinate of each point.
+    :type y: np.ndarray
+    :param writer: The index is also written in this container.
+    :type writer: dataset_container.ContainerWriter
+    :param leafSize: Number of points of the leaves of the tree.
+    :type leafSize: int
+
+    :return: The index
+    :rtype: SpatialIndex
+
+    """
+    start = time.perf_counter()
+    coordinates = np.stack((np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)), axis=1)
+    order = np.arange(coordinates.shape[0], dtype=np.int64)
+    stack = [(0, order.size, 0)]
+    while stack:
+        (lo, hi, depth) = stack.pop()
+        if hi - lo <= leafSize:
+            continue
+        mid = (lo + hi)//2
+        node = order[lo:hi]
+        order[lo:hi] = node[np.argpartition(coordinates[node, depth % 2], mid - lo)]
+        stack.append((lo, mid, depth + 1))
+        stack.append((mid + 1, hi, depth + 1))
+    index = SpatialIndex(x, y, order, leafSize)
+    if writer is not None:
+        writer.writeArray(INDEX_ARRAY, order)
+        writer.attributes["spatial_index"] = index.description()
+    log.debug(f'Index of {order.size} points built in {time.perf_counter() - start:.3f} s')
+    return index
+
+def load(filename, x, y):
+    """
+    :return: The index stored in a container, or None if it has none (or it indexes other points).
+    :rtype: SpatialIndex
+
+    """
+    container = Container.Container(filename)
+    if "spatial_index" not in container.attributes:
+        return None
+    description = container.attributes["spatial_index"]
+    if description["points"] != np.size(x):
+        return None
+    return SpatialIndex(x, y, container.array(INDEX_ARRAY, mmap=False), description["leaf_size"])
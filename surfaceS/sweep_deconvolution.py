@@ -0,0 +1,284 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``sweep_deconvolution`` module
+==================================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module computes the impulse responses of the points measured by
+:py:mod:`acquire_SineSweep`: for each point and shot, the ``response``
+channel is deconvolved by the sine sweep which excited the plate.
+
+Two methods are available:
+
++ ``"regularized"``: division of the spectra by the spectrum of the sweep
+  recorded on the ``sineSweep`` channel, with a Tikhonov regularisation
+  relative to the mean energy of the sweep,
+  ``H = R conj(S)/(|S|^2 + regularization*mean(|S|^2))``.
++ ``"analytical"``: inverse filter of the linear sweep of the experiment
+  parameters (``frequencyStart``, ``frequencyEnd`` and ``sweepTime``), the
+  conjugate of its spectrum over its mean energy in the band of the sweep,
+  zero outside. The sweep channel is not needed, the impulse responses are
+  those to a sweep of amplitude 1.
+
+The spectra are zero-padded to avoid the circular wrap of the deconvolution.
+The points are deconvolved in chunks, several chunks at once in a pool of
+processes, and the impulse responses are written in a new dataset (a
+container, see :py:mod:`dataset_container`) with their frequency responses.
+
+:Example:
+
+>>> import sweep_deconvolution as Deconvolution
+>>> impulses = Deconvolution.deconvolveDataset("EXP_sweep.sds", "EXP_ir.sds", method="analytical")
+>>> (frequencies, responses) = Deconvolution.loadFrequencyResponses("EXP_ir.sds")
+
+"""
+
+import os
+import copy
+import time
+import logging as log
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import dataset_container as Container
+import time_pyramid as TimePyramid
+import spatial_index as SpatialIndex
+import MeasureDataset
+
+METHOD_REGULARIZED = "regularized"
+METHOD_ANALYTICAL = "analytical"
+
+DEFAULT_REGULARIZATION = 1e-3
+
+RESPONSE_CHANNEL = "response"
+SWEEP_CHANNEL = "sineSweep"
+
+# Memory used to deconvolve a chunk of points, in bytes of spectra.
+BATCH_BYTES = 64*1024*1024
+
+# Complex spectra held per trace while deconvolving (responses, sweeps, their product and energy).
+SPECTRA_PER_TRACE = 4
+
+FREQUENCY_RESPONSE_ARRAY = "frequency_response"
+
+def fftLength(nbSamples):
+    """
+    :return: The length of the FFT of the linear deconvolution of traces of ``nbSamples`` samples.
+    :rtype: int
+
+    """
+    return 1 << int(np.ceil(np.log2(max(2, 2*nbSamples))))
+
+def linearSweep(frequencyStart, frequencyEnd, sweepTime, samplePeriod, nbSamples, delay=0.0):
+    """
+    The linear sine sweep output by the signal generator (see ``SignalGenerator.SetSineSweep_withTrigger``).
+
+    :param delay: Time of the start of the sweep after the first sample, in s.
+    :type delay: float
+
+    :return: The sweep, of amplitude 1, zero before and after it.
+    :rtype: np.ndarray
+
+    """
+    time = np.arange(nbSamples)*samplePeriod - delay
+    rate = (frequencyEnd - frequencyStart)/sweepTime
+    sweep = np.sin(2*np.pi*(frequencyStart*time + rate*time**2/2))
+    sweep[(time < 0) | (time > sweepTime)] = 0
+    return sweep
+
+def inverseFilter(params, samplePeriod, nbSamples, delay=0.0):
+    """
+    Spectrum of the analytical inverse filter of the sweep of the experiment parameters.
+
+    :return: The spectrum, on the bins of an FFT of ``fftLength(nbSamples)``.
+    :rtype: np.ndarray
+
+    """
+    nfft = fftLength(nbSamples)
+    (start, end) = sorted((params['frequencyStart'], params['frequencyEnd']))
+    sweep = np.fft.rfft(linearSweep(params['frequencyStart'], params['frequencyEnd'], params['sweepTime'], \
+                                    samplePeriod, nbSamples, delay), nfft)
+    band = (np.fft.rfftfreq(nfft, samplePeriod) >= start) & (np.fft.rfftfreq(nfft, samplePeriod) <= end)
+    energy = np.mean(np.abs(sweep[band])**2) if band.any() else 1.0
+    return np.where(band, np.conj(sweep), 0)/energy
+
+def deconvolve(responses, sweeps=None, inverse=None, regularization=DEFAULT_REGULARIZATION, length=None):
+    """
+    Deconvolve traces, all at once.
+
+    :param responses: The responses, the samples on the last axis.
+    :type responses: np.ndarray
+    :param sweeps: The recorded sweeps, same shape (``"regularized"`` method).
+    :type sweeps: np.ndarray
+    :param inverse: The spectrum of the inverse filter (``"analytical"`` method, see :py:func:`inverseFilter`).
+    :type inverse: np.ndarray
+    :param regularization: Tikhonov regularisation, relative to the mean energy of each sweep.
+    :type regularization: float
+    :param length: Number of samples of the impulse responses (default: that of the responses).
+    :type length: int
+
+    :return: The impulse responses and the frequency responses (on the bins of an FFT of ``fftLength(samples)``).
+    :rtype: (np.ndarray, np.ndarray)
+
+    """
+    nbSamples = responses.shape[-1]
+    nfft = fftLength(nbSamples)
+    if length is not None and not 0 < length <= nfft:
+        raise ValueError(f'The impulse responses have at most {nfft} samples, not {length}.')
+    spectra = np.fft.rfft(np.asarray(responses, dtype=np.float64), nfft, axis=-1)
+    if inverse is not None:
+        spectra *= inverse
+    else:
+        sweepSpectra = np.fft.rfft(np.asarray(sweeps, dtype=np.float64), nfft, axis=-1)
+        energy = np.abs(sweepSpectra)**2
+        spectra *= np.conj(sweepSpectra)
+        spectra /= energy + regularization*energy.mean(axis=-1, keepdims=True) + np.finfo(float).tiny
+    impulses = np.fft.irfft(spectra, nfft, axis=-1)[..., :length if length is not None else nbSamples]
+    return (impulses, spectra)
+
+def _deconvolveChunk(source, begin, end, settings):
+    # Runs in the processes of the pool: the traces are read from the container
+    # of the dataset when it has one, otherwise they come with the chunk.
+    if isinstance(source, str):
+        samples = Container.loadDataset(source).samples
+        traces = np.asarray(samples[begin:end])
+        del samples
+    else:
+        traces = source
+    sweeps = traces[:, :, settings["sweepChannel"]] if settings["inverse"] is None else None
+    (impulses, spectra) = deconvolve(traces[:, :, settings["responseChannel"]], sweeps, settings["inverse"], \
+                                     settings["regularization"], settings["length"])
+    return (begin, impulses, spectra.astype(np.complex64))
+
+def _storeChunk(result, impulses, responses):
+    (begin, chunkImpulses, chunkResponses) = result
+    impulses[begin:begin + chunkImpulses.shape[0], :, 0] = chunkImpulses
+    responses[begin:begin + chunkResponses.shape[0], :, 0] = chunkResponses
+
+def deconvolveDataset(dataset, output, method=METHOD_REGULARIZED, regularization=DEFAULT_REGULARIZATION, length=None, \
+                      delay=0.0, responseChannel=RESPONSE_CHANNEL, sweepChannel=SWEEP_CHANNEL, processes=None, \
+                      batchBytes=BATCH_BYTES):
+    """
+    Compute the impulse responses of a sine sweep dataset, written as a new dataset.
+
+    :param dataset: The dataset of the sine sweeps, or the path to it.
+    :type dataset: MeasureDataset.MeasureDataset
+    :param output: Path to the container of the impulse responses.
+    :type output: string
+    :param method: ``"regularized"`` or ``"analytical"``.
+    :type method: string
+    :param regularization: Tikhonov regularisation of the ``"regularized"`` method.
+    :type regularization: float
+    :param length: Number of samples of the impulse responses (default: that of the traces), at most ``fftLength(samples)``.
+    :type length: int
+    :param delay: Time of the start of the sweep after the first sample, in s (``"analytical"`` method).
+    :type delay: float
+    :param responseChannel: Channel of the responses.
+    :type responseChannel: string
+    :param sweepChannel: Channel of the recorded sweeps (``"regularized"`` method).
+    :type sweepChannel: string
+    :param processes: Number of chunks deconvolved at once (default: number of processors). With 1, no pool is used.
+    :type processes: int
+    :param batchBytes: Memory used to deconvolve a chunk of points.
+    :type batchBytes: int
+
+    :return: The dataset of the impulse responses (channel ``impulse_response``, mapped), with the frequency responses in its container (see :py:func:`loadFrequencyResponses`).
+    :rtype: MeasureDataset.MeasureDataset
+
+    """
+    if method not in (METHOD_REGULARIZED, METHOD_ANALYTICAL):
+        raise ValueError(f'Unknown method {method}, expected "{METHOD_REGULARIZED}" or "{METHOD_ANALYTICAL}".')
+    if isinstance(dataset, str):
+        dataset = MeasureDataset.MeasureDataset.load_from(dataset)
+    start = time.perf_counter()
+    if responseChannel not in dataset.channels or (method == METHOD_REGULARIZED and sweepChannel not in dataset.channels):
+        raise ValueError(f'The dataset has no channel {responseChannel} or {sweepChannel}, only {dataset.channels}.')
+    (nbPoints, nbShots, nbSamples) = (dataset.samples.shape[0], dataset.samples.shape[1], dataset.numberOfSamples)
+    length = length if length is not None else nbSamples
+    period = dataset.samplePeriod()
+    nfft = fftLength(nbSamples)
+    if not 0 < length <= nfft:
+        raise ValueError(f'The impulse responses have at most {nfft} samples, not {length}.')
+    settings = {"responseChannel": dataset.channels.index(responseChannel), \
+                "sweepChannel": dataset.channels.index(sweepChannel) if method == METHOD_REGULARIZED else None, \
+                "regularization": regularization, "length": length, \
+                "inverse": inverseFilter(dataset.experimentParameters, period, nbSamples, delay) if method == METHOD_ANALYTICAL else None}
+
+    # The workers read the traces from the container, the other datasets are sent with the chunks.
+    inContainer = dataset.filename is not None and Container.isContainer(dataset.filename)
+    pointBytes = SPECTRA_PER_TRACE*np.dtype(np.complex128).itemsize*nbShots*(nfft//2 + 1)
+    chunkPoints = max(1, batchBytes//pointBytes)
+    chunks = [(begin, min(begin + chunkPoints, nbPoints)) for begin in range(0, nbPoints, chunkPoints)]
+    source = lambda begin, end: dataset.filename if inContainer else np.asarray(dataset.samples[begin:end])
+
+    params = copy.deepcopy(dataset.experimentParameters)
+    # The sample period is given by the time division and the number of samples.
+    params['time_division'] = params['time_division']*length/nbSamples
+    with Container.ContainerWriter(output) as writer:
+        impulses = writer.reserveArray("samples", (nbPoints, nbShots, 1, length), np.float64)
+        responses = writer.reserveArray(FREQUENCY_RESPONSE_ARRAY, (nbPoints, nbShots, 1, nfft//2 + 1), np.complex64)
+
+        if processes == 1:
+            for (begin, end) in chunks:
+                _storeChunk(_deconvolveChunk(source(begin, end), begin, end, settings), impulses, responses)
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                # A few chunks in flight per process bound the memory of the results.
+                pending = []
+                for (begin, end) in chunks:
+                    pending.append(executor.submit(_deconvolveChunk, source(begin, end), begin, end, settings))
+                    if len(pending) >= 2*(processes or os.cpu_count() or 1):
+                        _storeChunk(pending.pop(0).result(), impulses, responses)
+                for future in pending:
+                    _storeChunk(future.result(), impulses, responses)
+        impulses.flush()
+        responses.flush()
+
+        result = MeasureDataset.MeasureDataset.fromArrays(impulses, dataset.x, dataset.y, ["impulse_response"], params, \
+                                                          dataset.ix, dataset.iy, dataset.shotExcitation)
+        result.height_coefficient = dataset.height_coefficient
+        for name in Container.DATASET_ARRAYS[1:]:
+            writer.writeArray(name, getattr(result, name))
+        TimePyramid.build(impulses, writer)
+        SpatialIndex.build(result.x, result.y, writer)
+        writer.attributes["frequency_response"] = {"nfft": nfft, "sample_period": period, "method": method, \
+                                                   "regularization": regularization if method == METHOD_REGULARIZED else None}
+        writer.attributes.update(Container.datasetAttributes(result))
+        del result, impulses, responses
+    log.info(f'Impulse responses of {nbPoints} points x {nbShots} shots computed in {time.perf_counter() - start:.1f} s')
+    return MeasureDataset.MeasureDataset.load_from(output)
+
+def loadFrequencyResponses(filename):
+    """
+    :return: The frequencies (in Hz) and the frequency responses (mapped) stored with impulse responses, shape ``(points, shots, 1, frequencies)``.
+    :rtype: (np.ndarray, np.ndarray)
+
+    """
+    container = Container.Container(filename)
+    description = container.attributes["frequency_response"]
+    return (np.fft.rfftfreq(description["nfft"], description["sample_period"]), container.array(FREQUENCY_RESPONSE_ARRAY))
@@ -0,0 +1,254 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``tile_mosaic`` module
+==========================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module merges the datasets of several scans of a plate (the tiles, e.g.
+scanned with different ``start_x`` and ``start_y``) into one dataset.
+
+The points of the tiles are aligned on their machine coordinates. A point
+measured by several tiles is resolved by the ``overlap`` policy:
+
++ ``keep``: the trace of the first tile is kept,
++ ``newest``: the trace of the last tile is kept (the tiles are given in the
+  order they were measured),
++ ``average``: the traces are averaged.
+
+The traces of the tiles are resampled on the timebase of the first tile when
+their sample period differs, and cropped or padded with zeros when only their
+length differs.
+
+The merged traces are written in a container (see :py:mod:`dataset_container`)
+a batch of points at a time: only one tile is open at once, and the traces of
+the containers are mapped, not read.
+
+:Example:
+
+.. code-block:: bash
+
+  python surfaceS/tile_mosaic.py --overlap average --output plate.sds tile1.sds tile2.sds
+
+"""
+
+import sys
+import copy
+import time
+import argparse
+import logging as log
+
+import numpy as np
+
+import dataset_container as Container
+import time_pyramid as TimePyramid
+import spatial_index as SpatialIndex
+import MeasureDataset
+
+OVERLAP_POLICIES = ("keep", "newest", "average")
+
+# Distance below which the points of two tiles are the same, in mm.
+TOLERANCE = 1e-3
+
+# Memory used by a batch of points, in bytes of traces.
+BATCH_BYTES = 64*1024*1024
+
+def _open(tile):
+    if isinstance(tile, MeasureDataset.MeasureDataset):
+        return tile
+    dataset = MeasureDataset.MeasureDataset.load_from(tile)
+    if dataset.samples is None:
+        raise ValueError(f'The dataset {tile} has no traces.')
+    return dataset
+
+def _name(tile):
+    return tile if isinstance(tile, str) else (tile.filename or "dataset")
+
+def resample(traces, period, targetPeriod, nbSamples):
+    """
+    Linear interpolation of traces on another timebase. The samples after the
+    end of the traces are zeros.
+
+    :param traces: The traces, the samples on the last axis.
+    :type traces: np.ndarray
+    :param period: Sample period of the traces, in s.
+    :type period: float
+    :param targetPeriod: Sample period of the result, in s.
+    :type targetPeriod: float
+    :param nbSamples: Number of samples of the result.
+    :type nbSamples: int
+
+    :return: The resampled traces.
+    :rtype: np.ndarray
+
+    """
+    traces = np.asarray(traces)
+    length = traces.shape[-1]
+    if np.isclose(period, targetPeriod, rtol=1e-9, atol=0):
+        # Same timebase: crop or pad.
+        result = np.zeros(traces.shape[:-1] + (nbSamples,), dtype=traces.dtype)
+        result[..., :min(length, nbSamples)] = traces[..., :nbSamples]
+        return result
+    position = np.arange(nbSamples)*(targetPeriod/period)
+    inside = position <= length - 1
+    first = np.minimum(np.floor(position).astype(np.int64), max(length - 2, 0))
+    fraction = position - first
+    last = np.minimum(first + 1, length - 1)
+    result = traces[..., first]*(1 - fraction) + traces[..., last]*fraction
+    result[..., ~inside] = 0
+    return result
+
+def mergeTiles(tiles, output, overlap="keep", tolerance=TOLERANCE, batchBytes=BATCH_BYTES):
+    """
+    Merge tiles into one dataset, written in a container.
+
+    :param tiles: The tiles: datasets or paths to datasets, in the order they were measured.
+    :type tiles: list
+    :param output: Path to the container of the merged dataset.
+    :type output: string
+    :param overlap: Resolution of the points measured by several tiles (see ``OVERLAP_POLICIES``).
+    :type overlap: string
+    :param tolerance: Distance below which the points of two tiles are the same, in mm.
+    :type tolerance: float
+    :param batchBytes: Memory used by a batch of points.
+    :type batchBytes: int
+
+    :return: The merged dataset (its traces are mapped).
+    :rtype: MeasureDataset.MeasureDataset
+
+    """
+    if overlap not in OVERLAP_POLICIES:
+        raise ValueError(f'Unknown overlap policy {overlap}, expected one of {OVERLAP_POLICIES}.')
+    if not tiles:
+        raise ValueError("No tile to merge.")
+    start = time.perf_counter()
+
+    # A first pass reads the description of the tiles.
+    descriptions = []
+    for tile in tiles:
+        dataset = _open(tile)
+        descriptions.append({"x": dataset.x, "y": dataset.y, "period": dataset.samplePeriod(), \
+                             "samples": dataset.numberOfSamples, "dtype": dataset.samples.dtype, \
+                             "channels": dataset.channels, "shotExcitation": dataset.shotExcitation, \
+                             "shape": dataset.samples.shape})
+        if len(descriptions) == 1:
+            reference = dataset
+        del dataset
+    for (tile, description) in zip(tiles, descriptions):
+        if description["channels"] != reference.channels or \
+           not np.array_equal(description["shotExcitation"], reference.shotExcitation):
+            raise ValueError(f'The channels or the shots of {_name(tile)} differ from the ones of {_name(tiles[0])}.')
+    period = reference.samplePeriod()
+    nbSamples = reference.numberOfSamples
+    resampled = [not np.isclose(d["period"], period, rtol=1e-9, atol=0) for d in descriptions]
+    for (tile, d, r) in zip(tiles, descriptions, resampled):
+        if r or d["samples"] != nbSamples:
+            log.warning(f'{_name(tile)}: {d["samples"]} samples every {d["period"]:.3g} s, '
+                        f'{"resampled" if r else "cropped or padded"} to {nbSamples} samples every {period:.3g} s')
+
+    # Points of the mosaic, sorted by coordinates.
+    coordinates = np.concatenate([np.stack((d["x"], d["y"]), axis=1) for d in descriptions])
+    tileOf = np.concatenate([np.full(d["x"].size, t) for (t, d) in enumerate(descriptions)])
+    keys = np.round(coordinates/tolerance).astype(np.int64)
+    (keys, first, pointOf) = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    pointOf = pointOf.reshape(-1)
+    nbPoints = keys.shape[0]
+    counts = np.bincount(pointOf, minlength=nbPoints)
+    # Tile which provides each point ("keep" and "newest").
+    owner = np.full(nbPoints, -1)
+    for t in (range(len(tiles)) if overlap == "newest" else reversed(range(len(tiles)))):
+        owner[pointOf[tileOf == t]] = t
+    log.info(f'{len(tiles)} tiles: {coordinates.shape[0]} points, {nbPoints} distinct, {int((counts > 1).sum())} overlapping')
+
+    averaged = overlap == "average" and (counts > 1).any()
+    dtypes = {d["dtype"] for d in descriptions}
+    dtype = dtypes.pop() if len(dtypes) == 1 and not averaged and not any(resampled) else np.dtype(np.float64)
+    shape = (nbPoints,) + tuple(reference.samples.shape[1:3]) + (nbSamples,)
+    x = coordinates[first, 0]
+    y = coordinates[first, 1]
+    params = copy.deepcopy(reference.experimentParameters)
+    (heightCoefficient, zScale) = (reference.height_coefficient, reference.zScale)
+    del reference
+
+    with Container.ContainerWriter(output) as writer:
+        samples = writer.reserveArray("samples", shape, dtype)
+        offset = 0
+        for (t, tile) in enumerate(tiles):
+            dataset = _open(tile)
+            points = pointOf[offset:offset + dataset.x.size]
+            offset += dataset.x.size
+            pointBytes = max(1, dataset.samples.dtype.itemsize*int(np.prod(dataset.samples.shape[1:], dtype=np.int64)))
+            pointsPerBatch = max(1, batchBytes//pointBytes)
+            for begin in range(0, points.size, pointsPerBatch):
+                targets = points[begin:begin + pointsPerBatch]
+                kept = np.ones(targets.size, dtype=bool) if overlap == "average" else owner[targets] == t
+                if not kept.any():
+                    continue
+                traces = resample(dataset.samples[begin:begin + pointsPerBatch][kept], descriptions[t]["period"], period, nbSamples)
+                if overlap == "average" and averaged:
+                    samples[targets[kept]] += traces
+                else:
+                    samples[targets[kept]] = traces
+            samples.flush()
+            del dataset
+        if averaged:
+            pointsPerBatch = max(1, batchBytes//max(1, dtype.itemsize*int(np.prod(shape[1:], dtype=np.int64))))
+            for begin in range(0, nbPoints, pointsPerBatch):
+                batch = slice(begin, begin + pointsPerBatch)
+                samples[batch] /= counts[batch, np.newaxis, np.newaxis, np.newaxis]
+            samples.flush()
+
+        merged = MeasureDataset.MeasureDataset.fromArrays(samples, x, y, descriptions[0]["channels"], params, \
+                                                          shotExcitation=descriptions[0]["shotExcitation"])
+        merged.height_coefficient = heightCoefficient
+        merged.zScale = zScale
+        (params['start_x'], params['start_y']) = (float(x.min()), float(y.min()))
+        # nb_point_y counts the rows after the first one (see scan_engine.ScanPlan.fromParameters).
+        (params['nb_point_x'], params['nb_point_y']) = (merged.grid.shape[0], merged.grid.shape[1] - 1)
+        for name in Container.DATASET_ARRAYS[1:]:
+            writer.writeArray(name, getattr(merged, name))
+        TimePyramid.build(samples, writer)
+        SpatialIndex.build(x, y, writer)
+        writer.attributes.update(Container.datasetAttributes(merged))
+        del merged, samples
+    log.info(f'{len(tiles)} tiles merged in {output} in {time.perf_counter() - start:.1f} s')
+    return MeasureDataset.MeasureDataset.load_from(output)
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="tile_mosaic", description="Merge the datasets of several scans into one.")
+    parser.add_argument("tiles", nargs="+", help="Datasets of the tiles, in the order they were measured.")
+    parser.add_argument("--output", required=True, help="Container of the merged dataset.")
+    parser.add_argument("--overlap", choices=OVERLAP_POLICIES, default="keep", help="Resolution of the points measured by several tiles.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Distance below which two points are the same, in mm.")
+    args = parser.parse_args(argv)
+    log.basicConfig(level=log.INFO)
+
+    merged = mergeTiles(args.tiles, args.output, args.overlap, args.tolerance)
+    print(f'{len(args.tiles)} tiles merged in {args.output}: {merged.samples.shape[0]} points, grid {merged.grid.shape}', flush=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,245 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``time_pyramid`` module
+===========================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module computes the multi-resolution summary of the traces of a dataset
+along the time axis: at each level, the minimum, maximum and mean of the
+samples by bins of a power of two samples. A plot of a few thousand pixels
+reads the level with about one bin per pixel instead of the samples.
+
+The first level has bins of ``2**FIRST_LEVEL`` samples and each level halves
+the number of bins of the previous one, down to ``MIN_LEVEL_LENGTH`` bins. The
+levels are computed in a single pass on the traces, a batch of points at a
+time, and are stored in the container of the dataset (see
+:py:mod:`dataset_container`) as ``pyramid_min``, ``pyramid_max`` and
+``pyramid_mean``, the levels one after the other on the last axis.
+
+"""
+
+import time
+import logging as log
+
+import numpy as np
+
+import dataset_container as Container
+
+# Bins of the first level: 2**FIRST_LEVEL samples. With int16 extrema and
+# float32 means, the pyramid is a quarter of the size of int16 traces.
+FIRST_LEVEL = 5
+
+# The coarsest level has at least this number of bins.
+MIN_LEVEL_LENGTH = 16
+
+# Memory used by a batch of points, in bytes of traces.
+BATCH_BYTES = 64*1024*1024
+
+PYRAMID_ARRAYS = ("pyramid_min", "pyramid_max", "pyramid_mean")
+
+def levelLengths(nbSamples, firstLevel=FIRST_LEVEL, minLength=MIN_LEVEL_LENGTH):
+    """
+    :return: The decimation (samples per bin) and the number of bins of each level.
+    :rtype: (list, list)
+
+    """
+    decimations = [2**firstLevel]
+    lengths = [-(-int(nbSamples)//decimations[0])]
+    while lengths[-1] >= 2*minLength:
+        decimations.append(2*decimations[-1])
+        lengths.append(-(-lengths[-1]//2))
+    return (decimations, lengths)
+
+def _firstLevel(traces, decimation):
+    # traces: (traces, samples). The last bin may be incomplete.
+    nbFull = traces.shape[-1]//decimation
+    full = traces[:, :nbFull*decimation].reshape(traces.shape[0], nbFull, decimation)
+    (mins, maxs, sums) = (full.min(axis=-1), full.max(axis=-1), full.sum(axis=-1, dtype=np.float64))
+    counts = np.full(nbFull, decimation, dtype=np.float64)
+    if nbFull*decimation < traces.shape[-1]:
+        tail = traces[:, nbFull*decimation:]
+        mins = np.concatenate([mins, tail.min(axis=-1, keepdims=True)], axis=-1)
+        maxs = np.concatenate([maxs, tail.max(axis=-1, keepdims=True)], axis=-1)
+        sums = np.concatenate([sums, tail.sum(axis=-1, dtype=np.float64, keepdims=True)], axis=-1)
+        counts = np.append(counts, tail.shape[-1])
+    return (mins, maxs, sums, counts)
+
+def _nextLevel(mins, maxs, sums, counts):
+    if mins.shape[-1] % 2:
+        # The last bin is alone: it is paired with itself for the extrema and with nothing for the sums.
+        mins = np.concatenate([mins, mins[:, -1:]], axis=-1)
+        maxs = np.concatenate([maxs, maxs[:, -1:]], axis=-1)
+        sums = np.concatenate([sums, np.zeros((sums.shape[0], 1))], axis=-1)
+        counts = np.append(counts, 0.0)
+    return (np.minimum(mins[:, 0::2], mins[:, 1::2]), np.maximum(maxs[:, 0::2], maxs[:, 1::2]), \
+            sums[:, 0::2] + sums[:, 1::2], counts[0::2] + counts[1::2])
+
+def computeLevels(traces, firstLevel=FIRST_LEVEL, minLength=MIN_LEVEL_LENGTH):
+    """
+    Compute the levels of some traces.
+
+    :param traces: The traces, samples on the last axis.
+    :type traces: np.ndarray
+
+    :return: The minimum, maximum and mean of the bins, the levels one after the other on the last axis.
+    :rtype: (np.ndarray, np.ndarray, np.ndarray)
+
+    """
+    shape = traces.shape[:-1]
+    (decimations, lengths) = levelLengths(traces.shape[-1], firstLevel, minLength)
+    level = _firstLevel(np.asarray(traces).reshape(-1, traces.shape[-1]), decimations[0])
+    (allMins, allMaxs, allMeans) = ([], [], [])
+    for i in range(len(decimations)):
+        if i > 0:
+            level = _nextLevel(*level)
+        (mins, maxs, sums, counts) = level
+        allMins.append(mins)
+        allMaxs.append(maxs)
+        allMeans.append((sums/counts).astype(np.float32))
+    return tuple(np.concatenate(a, axis=-1).reshape(shape + (-1,)) for a in (allMins, allMaxs, allMeans))
+
+class TimePyramid():
+    """
+    Levels of the traces of a dataset.
+
+    :param mins: Minimum of the bins, shape ``(points, shots, channels, bins)``.
+    :type mins: np.ndarray
+    :param maxs: Maximum of the bins.
+    :type maxs: np.ndarray
+    :param means: Mean of the bins.
+    :type means: np.ndarray
+    :param nbSamples: Number of samples of the traces.
+    :type nbSamples: int
+    :param firstLevel: The first level has bins of ``2**firstLevel`` samples.
+    :type firstLevel: int
+
+    """
+    def __init__(self, mins, maxs, means, nbSamples, firstLevel=FIRST_LEVEL, minLength=MIN_LEVEL_LENGTH):
+        (self.mins, self.maxs, self.means) = (mins, maxs, means)
+        self.nbSamples = nbSamples
+        (self.firstLevel, self.minLength) = (firstLevel, minLength)
+        (self.decimations, self.lengths) = levelLengths(nbSamples, firstLevel, minLength)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)]).astype(np.int64)
+
+    def level(self, i):
+        """
+        :return: The minimum, maximum and mean of the bins of level ``i`` (views).
+        :rtype: (np.ndarray, np.ndarray, np.ndarray)
+
+        """
+        bins = slice(self.offsets[i], self.offsets[i + 1])
+        return (self.mins[..., bins], self.maxs[..., bins], self.means[..., bins])
+
+    def levelFor(self, nbPixels, t0=0, t1=None):
+        """
+        :return: The coarsest level with at least ``nbPixels`` bins between the samples ``t0`` and ``t1``, or None if the samples themselves are needed.
+        :rtype: int
+
+        """
+        span = (self.nbSamples if t1 is None else t1) - t0
+        candidates = [i for (i, d) in enumerate(self.decimations) if span/d >= nbPixels]
+        return candidates[-1] if candidates else None
+
+    def envelope(self, point, shot=0, channel=0, t0=0, t1=None, nbPixels=2000):
+        """
+        Get the envelope of a trace to draw it on ``nbPixels`` pixels.
+
+        :return: The first sample of each bin, and the minimum, maximum and mean of the bins, or None if the samples themselves are needed (zoomed in).
+        :rtype: (np.ndarray, np.ndarray, np.ndarray, np.ndarray)
+
+        """
+        t1 = self.nbSamples if t1 is None else t1
+        i = self.levelFor(nbPixels, t0, t1)
+        if i is None:
+            return None
+        d = self.decimations[i]
+        bins = slice(t0//d, -(-t1//d))
+        (mins, maxs, means) = (a[point, shot, channel, bins] for a in self.level(i))
+        return (np.arange(bins.start, bins.stop)*d, mins, maxs, means)
+
+    def extrema(self):
+        """
+        :return: The minimum and maximum of each trace, shape ``(points, shots, channels)``, read from the coarsest level.
+        :rtype: (np.ndarray, np.ndarray)
+
+        """
+        (mins, maxs, means) = self.level(len(self.decimations) - 1)
+        return (mins.min(axis=-1), maxs.max(axis=-1))
+
+    def description(self):
+        return {"nb_samples": int(self.nbSamples), "first_level": self.firstLevel, "min_length": self.minLength, \
+                "decimations": self.decimations, "lengths": self.lengths}
+
+def build(samples, writer=None, batchBytes=BATCH_BYTES, firstLevel=FIRST_LEVEL, minLength=MIN_LEVEL_LENGTH):
+    """
+    Compute the pyramid of traces in one pass, a batch of points at a time.
+
+    :param samples: The traces, shape ``(points, shots, channels, samples)``. It can be mapped or compressed.
+    :type samples: np.ndarray
+    :param writer: The levels are written in this container instead of memory.
+    :type writer: dataset_container.ContainerWriter
+
+    :return: The pyramid
+    :rtype: TimePyramid
+
+    """
+    start = time.perf_counter()
+    nbSamples = samples.shape[-1]
+    (decimations, lengths) = levelLengths(nbSamples, firstLevel, minLength)
+    shape = tuple(samples.shape[:-1]) + (sum(lengths),)
+    extremaType = samples.dtype if np.issubdtype(samples.dtype, np.integer) else np.float32
+    types = (extremaType, extremaType, np.float32)
+    if writer is not None:
+        arrays = [writer.reserveArray(name, shape, dtype) for (name, dtype) in zip(PYRAMID_ARRAYS, types)]
+    else:
+        arrays = [np.empty(shape, dtype=dtype) for dtype in types]
+
+    pointBytes = max(1, samples.dtype.itemsize*int(np.prod(samples.shape[1:], dtype=np.int64)))
+    pointsPerBatch = max(1, batchBytes//pointBytes)
+    for begin in range(0, samples.shape[0], pointsPerBatch):
+        levels = computeLevels(samples[begin:begin + pointsPerBatch], firstLevel, minLength)
+        for (array, level) in zip(arrays, levels):
+            array[begin:begin + pointsPerBatch] = level
+    if writer is not None:
+        for array in arrays:
+            array.flush()
+        writer.attributes["pyramid"] = TimePyramid(*arrays, nbSamples, firstLevel, minLength).description()
+    log.info(f'Pyramid of {samples.shape} traces computed in {time.perf_counter() - start:.1f} s')
+    return TimePyramid(*arrays, nbSamples, firstLevel, minLength)
+
+def load(filename):
+    """
+    :return: The pyramid stored in a container (mapped), or None if it has none.
+    :rtype: TimePyramid
+
+    """
+    container = Container.Container(filename)
+    if "pyramid" not in container.attributes:
+        return None
+    description = container.attributes["pyramid"]
+    return TimePyramid(*[container.array(name) for name in PYRAMID_ARRAYS], description["nb_samples"], \
+                       description["first_level"], description["min_length"])
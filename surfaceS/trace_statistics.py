@@ -0,0 +1,116 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``trace_statistics`` module
+===============================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module computes the summary statistics of each trace of a dataset:
+minimum, maximum, peak amplitude, time of the peak and RMS. They are computed
+once, when the dataset is saved, and stored in its metadata: the overview maps
+and the limits of the plots do not need the samples.
+
+"""
+
+import time
+import logging as log
+
+import numpy as np
+
+# Memory used by a batch of points, in bytes of traces.
+BATCH_BYTES = 64*1024*1024
+
+STATISTICS = ("min", "max", "peak", "peak_time", "rms")
+
+def computeStatistics(samples, samplePeriod=1.0, batchBytes=BATCH_BYTES):
+    """
+    Compute the statistics of the traces, a batch of points at a time.
+
+    :param samples: The traces, shape ``(points, shots, channels, samples)``. It can be mapped or compressed.
+    :type samples: np.ndarray
+    :param samplePeriod: Time between two samples, in s.
+    :type samplePeriod: float
+    :param batchBytes: Memory used by a batch of points.
+    :type batchBytes: int
+
+    :return: The statistics (see ``STATISTICS``), each of shape ``(points, shots, channels)``. ``peak`` is the largest absolute value and ``peak_time`` its time, in s.
+    :rtype: dict
+
+    """
+    start = time.perf_counter()
+    shape = tuple(samples.shape[:-1])
+    statistics = {name: np.zeros(shape, dtype=samples.dtype if name in ("min", "max") else np.float64) for name in STATISTICS}
+    pointBytes = max(1, samples.dtype.itemsize*int(np.prod(samples.shape[1:], dtype=np.int64)))
+    pointsPerBatch = max(1, batchBytes//pointBytes)
+    for begin in range(0, samples.shape[0], pointsPerBatch):
+        batch = np.asarray(samples[begin:begin + pointsPerBatch])
+        points = slice(begin, begin + batch.shape[0])
+        if batch.shape[-1] == 0:
+            continue
+        statistics["min"][points] = batch.min(axis=-1)
+        statistics["max"][points] = batch.max(axis=-1)
+        # The absolute value of -32768 does not fit an int16.
+        magnitude = np.abs(batch.astype(np.int32) if np.issubdtype(batch.dtype, np.integer) else batch)
+        peakIndex = magnitude.argmax(axis=-1)
+        statistics["peak"][points] = np.take_along_axis(magnitude, peakIndex[..., np.newaxis], axis=-1)[..., 0]
+        statistics["peak_time"][points] = peakIndex*samplePeriod
+        statistics["rms"][points] = np.sqrt(np.square(batch, dtype=np.float64).mean(axis=-1))
+    log.info(f'Statistics of {samples.shape} traces computed in {time.perf_counter() - start:.1f} s')
+    return statistics
+
+def toMetadata(statistics):
+    """
+    :return: The statistics in a JSON serialisable form.
+    :rtype: dict
+
+    """
+    return {name: np.asarray(values).tolist() for (name, values) in statistics.items()}
+
+def fromMetadata(metadata):
+    """
+    Inverse of :py:func:`toMetadata`.
+
+    """
+    return {name: np.asarray(values) for (name, values) in metadata.items()}
+
+def zLimits(statistics, zScale, shot=0, channel=0, margin=0.05):
+    """
+    Limits of the Z axis of a plot of the traces.
+
+    :param statistics: The statistics of the dataset.
+    :type statistics: dict
+    :param zScale: Scale of the samples.
+    :type zScale: float
+    :param margin: Margin added on both sides, relative to the range.
+    :type margin: float
+
+    :return: The lower and upper limits, in the unit of the plot.
+    :rtype: (float, float)
+
+    """
+    (low, high) = (float(statistics["min"][:, shot, channel].min())*zScale, float(statistics["max"][:, shot, channel].max())*zScale)
+    span = high - low if high > low else max(abs(high), 1.0)
+    return (low - margin*span, high + margin*span)
@@ -0,0 +1,210 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``transfer_function`` module
+================================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module estimates the transfer functions between a reference channel
+(e.g. the excitation recorded by the oscilloscope) and the other channels of
+a dataset, at every point, from its repeated shots.
+
+The traces are cut in windowed segments (Welch's method), and the auto- and
+cross-spectra are averaged over all the segments of all the shots of a point:
+
++ ``H1 = Gxy/Gxx``, unbiased by noise on the output,
++ ``H2 = Gyy/Gyx``, unbiased by noise on the reference,
++ the coherence ``|Gxy|^2/(Gxx Gyy)``, 1 when the output is linear in the
+  reference and there is no noise.
+
+The points are processed a batch at a time, all the points of a batch with
+the same FFT. A point is flagged as unreliable when its mean coherence in a
+band is below a threshold (see :py:func:`qualityMap`).
+
+:Example:
+
+>>> import transfer_function as TransferFunction
+>>> estimate = TransferFunction.estimateDataset(dataset, "sineSweep")
+>>> quality = TransferFunction.qualityMap(estimate, band=(1000, 40000))
+
+"""
+
+import time
+import logging as log
+
+import numpy as np
+
+import dataset_container as Container
+import frequency_maps as FrequencyMaps
+
+DEFAULT_SEGMENT_LENGTH = 1024
+DEFAULT_OVERLAP = 0.5
+
+# A point is reliable above this mean coherence.
+DEFAULT_MIN_COHERENCE = 0.9
+
+# Memory used by a batch of points, in bytes of spectra.
+BATCH_BYTES = 64*1024*1024
+
+ESTIMATE_ARRAYS = ("transfer_h1", "transfer_h2", "transfer_coherence")
+
+def segmentStarts(nbSamples, segmentLength, overlap=DEFAULT_OVERLAP):
+    """
+    :return: The first sample of each segment of Welch's method.
+    :rtype: np.ndarray
+
+    """
+    step = max(1, int(round(segmentLength*(1 - overlap))))
+    return np.arange(0, nbSamples - segmentLength + 1, step)
+
+def estimate(samples, samplePeriod, inputChannel, segmentLength=DEFAULT_SEGMENT_LENGTH, overlap=DEFAULT_OVERLAP, \
+             windowName=FrequencyMaps.DEFAULT_WINDOW, shots=None, batchBytes=BATCH_BYTES):
+    """
+    Estimate the transfer functions from the reference channel to the other channels.
+
+    :param samples: The traces, shape ``(points, shots, channels, samples)``. It can be mapped or compressed.
+    :type samples: np.ndarray
+    :param samplePeriod: Time between two samples, in s.
+    :type samplePeriod: float
+    :param inputChannel: Index of the reference channel.
+    :type inputChannel: int
+    :param segmentLength: Number of samples of the segments (at most that of the traces).
+    :type segmentLength: int
+    :param overlap: Overlap of consecutive segments, relative to their length.
+    :type overlap: float
+    :param windowName: Window of the segments (see ``frequency_maps.WINDOWS``).
+    :type windowName: string
+    :param shots: Shots averaged (default: all).
+    :type shots: list
+    :param batchBytes: Memory used by a batch of points.
+    :type batchBytes: int
+
+    :return: ``frequencies`` (Hz), ``h1``, ``h2`` (``complex64``) and ``coherence``, shape ``(points, outputs, frequencies)``, ``outputs`` (indices of the output channels), ``averages`` (number of segments averaged per point) and ``segmentLength``.
+    :rtype: dict
+
+    """
+    start = time.perf_counter()
+    (nbPoints, nbShots, nbChannels, nbSamples) = samples.shape
+    segmentLength = int(min(segmentLength, nbSamples))
+    starts = segmentStarts(nbSamples, segmentLength, overlap)
+    shots = np.arange(nbShots) if shots is None else np.asarray(shots)
+    outputs = [c for c in range(nbChannels) if c != inputChannel]
+    weights = FrequencyMaps.window(windowName, segmentLength)
+    frequencies = np.fft.rfftfreq(segmentLength, samplePeriod)
+
+    shape = (nbPoints, len(outputs), frequencies.size)
+    (h1, h2, coherence) = (np.zeros(shape, dtype=np.complex64), np.zeros(shape, dtype=np.complex64), np.zeros(shape, dtype=np.float32))
+    pointBytes = 16*shots.size*nbChannels*starts.size*frequencies.size*2
+    pointsPerBatch = max(1, batchBytes//max(1, pointBytes))
+    for begin in range(0, nbPoints, pointsPerBatch):
+        batch = np.asarray(samples[begin:begin + pointsPerBatch])[:, shots].astype(np.float64)
+        # (points, shots, channels, segments, samples), the segments are views of the traces.
+        segments = np.lib.stride_tricks.sliding_window_view(batch, segmentLength, axis=-1)[..., starts, :]
+        spectra = np.fft.rfft(segments*weights, axis=-1)
+        reference = spectra[:, :, inputChannel]
+        response = spectra[:, :, outputs]
+        # Averages over the shots and the segments.
+        gxx = np.mean(np.abs(reference)**2, axis=(1, 2))[:, np.newaxis]
+        gyy = np.mean(np.abs(response)**2, axis=(1, 3))
+        gxy = np.mean(np.conj(reference)[:, :, np.newaxis]*response, axis=(1, 3))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            points = slice(begin, begin + batch.shape[0])
+            h1[points] = np.where(gxx > 0, gxy/gxx, 0)
+            h2[points] = np.where(np.abs(gxy) > 0, gyy/np.conj(gxy), 0)
+            coherence[points] = np.where((gxx > 0) & (gyy > 0), np.abs(gxy)**2/(gxx*gyy), 0)
+    log.info(f'Transfer functions of {samples.shape} traces estimated in {time.perf_counter() - start:.1f} s')
+    return {"frequencies": frequencies, "h1": h1, "h2": h2, "coherence": coherence, "outputs": outputs, \
+            "averages": int(shots.size*starts.size), "segmentLength": segmentLength}
+
+def qualityMap(estimate, band=None, minCoherence=DEFAULT_MIN_COHERENCE):
+    """
+    Flag the points whose estimates are unreliable.
+
+    :param estimate: The estimate (see :py:func:`estimate`).
+    :type estimate: dict
+    :param band: ``(low, high)`` frequencies of the band where the coherence is checked, in Hz (default: all).
+    :type band: tuple
+    :param minCoherence: A point is reliable when its mean coherence in the band is at least this.
+    :type minCoherence: float
+
+    :return: ``coherence``: the mean coherence in the band, and ``reliable``, shape ``(points, outputs)``.
+    :rtype: dict
+
+    """
+    frequencies = estimate["frequencies"]
+    inBand = np.ones(frequencies.size, dtype=bool) if band is None else (frequencies >= band[0]) & (frequencies <= band[1])
+    if not inBand.any():
+        raise ValueError(f'No frequency of the estimate in the band {band}.')
+    meanCoherence = np.asarray(estimate["coherence"])[..., inBand].mean(axis=-1)
+    return {"coherence": meanCoherence, "reliable": meanCoherence >= minCoherence}
+
+def estimateDataset(dataset, inputChannel, segmentLength=DEFAULT_SEGMENT_LENGTH, overlap=DEFAULT_OVERLAP, \
+                    windowName=FrequencyMaps.DEFAULT_WINDOW, shots=None):
+    """
+    Estimate the transfer functions of a dataset (see :py:func:`estimate`).
+    They are stored in the container of the dataset, if it has one.
+
+    :param dataset: The dataset
+    :type dataset: MeasureDataset.MeasureDataset
+    :param inputChannel: Name of the reference channel.
+    :type inputChannel: string
+
+    :return: The estimate, its ``outputs`` are the names of the output channels.
+    :rtype: dict
+
+    """
+    if inputChannel not in dataset.channels:
+        raise ValueError(f'The dataset has no channel {inputChannel}, only {dataset.channels}.')
+    result = estimate(dataset.samples, dataset.samplePeriod(), dataset.channels.index(inputChannel), segmentLength, \
+                      overlap, windowName, shots)
+    result["outputs"] = [dataset.channels[c] for c in result["outputs"]]
+    result["description"] = {"input": inputChannel, "outputs": result["outputs"], "segment_length": result["segmentLength"], \
+                             "overlap": overlap, "window": windowName, "averages": result["averages"], \
+                             "sample_period": dataset.samplePeriod()}
+    if dataset.filename is not None and Container.isContainer(dataset.filename):
+        try:
+            with Container.ContainerWriter(dataset.filename, append=True) as writer:
+                for name in ESTIMATE_ARRAYS:
+                    writer.writeArray(name, result[name[len("transfer_"):]])
+                writer.attributes["transfer_function"] = result["description"]
+        except OSError as e:
+            log.warning(f'Cannot store the transfer functions in {dataset.filename}: {str(e)}')
+    return result
+
+def load(filename):
+    """
+    :return: The transfer functions stored in a container (see :py:func:`estimateDataset`), or None if it has none.
+    :rtype: dict
+
+    """
+    container = Container.Container(filename)
+    description = container.attributes.get("transfer_function")
+    if description is None:
+        return None
+    result = {name[len("transfer_"):]: container.array(name, mmap=False) for name in ESTIMATE_ARRAYS}
+    result.update({"frequencies": np.fft.rfftfreq(description["segment_length"], description["sample_period"]), \
+                   "outputs": description["outputs"], "averages": description["averages"], "description": description})
+    return result
@@ -111,6 +111,19 @@ class Ui_MainWindow(object):
         self.startAcquiringSineSweepButton = QtWidgets.QCommandLinkButton(self.experimentParameters)
         self.startAcquiringSineSweepButton.setGeometry(QtCore.QRect(290, 640, 181, 41))
         self.startAcquiringSineSweepButton.setObjectName("startAcquiringSineSweepButton")
+        self.scanProgressBar = QtWidgets.QProgressBar(self.experimentParameters)
+        self.scanProgressBar.setEnabled(False)
+        self.scanProgressBar.setGeometry(QtCore.QRect(9, 585, 481, 16))
+        self.scanProgressBar.setProperty("value", 0)
+        self.scanProgressBar.setObjectName("scanProgressBar")
+        self.pauseScanButton = QtWidgets.QPushButton(self.experimentParameters)
+        self.pauseScanButton.setEnabled(False)
+        self.pauseScanButton.setGeometry(QtCore.QRect(9, 652, 80, 23))
+        self.pauseScanButton.setObjectName("pauseScanButton")
+        self.cancelScanButton = QtWidgets.QPushButton(self.experimentParameters)
+        self.cancelScanButton.setEnabled(False)
+        self.cancelScanButton.setGeometry(QtCore.QRect(95, 652, 80, 23))
+        self.cancelScanButton.setObjectName("cancelScanButton")
         self.toolBox.addItem(self.experimentParameters, "")
         self.horizontalLayout_2.addWidget(self.toolBox)
         self.plotLayout = QtWidgets.QVBoxLayout()
@@ -294,6 +307,8 @@ class Ui_MainWindow(object):
         self.startMeasuringButton.setText(_translate("MainWindow", "Start Measuring"))
         self.startAcquiringButton.setText(_translate("MainWindow", "Start Impact Acquisiton"))
         self.startAcquiringSineSweepButton.setText(_translate("MainWindow", "Start SineSweep Acquisiton"))
+        self.pauseScanButton.setText(_translate("MainWindow", "Pause"))
+        self.cancelScanButton.setText(_translate("MainWindow", "Cancel"))
         self.toolBox.setItemText(self.toolBox.indexOf(self.experimentParameters), _translate("MainWindow", "Measurement toolbox"))
         self.oscilloGroupBox.setTitle(_translate("MainWindow", "Oscilloscope"))
         self.connectOscilloscopeButton.setText(_translate("MainWindow", "Connect"))
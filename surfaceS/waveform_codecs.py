@@ -0,0 +1,308 @@
+################################################################################
+# MIT License
+#
+# Copyright (c) 2019 surfaceS
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+################################################################################
+"""
+The ``waveform_codecs`` module
+==============================
+
+*Author:* [Camilo Hernandez](mailto:camilo.hernandez@epfl.ch)
+*Last modification:* 19.10.2026
+
+This module compresses the chunks of traces of the dataset containers (see
+:py:mod:`dataset_container`). The traces are smooth and mostly idle before
+the trigger: predicted from their previous samples, what remains is small.
+
+A codec is a predictor followed by a compressor, named
+``"<predictor>+<compressor>"`` (e.g. ``"delta+zlib"``):
+
++ Predictors (``int16`` traces only), along the samples of each trace:
+  ``none``, ``delta`` (previous sample) and ``lpc2`` (fixed second order
+  linear predictor, ``2x[n-1] - x[n-2]``). The residuals wrap around like the
+  ``int16`` arithmetic, so they are ``int16`` and the coding is lossless.
++ Compressors: ``zlib`` and ``lzma`` (on the residuals with their low and high
+  bytes grouped), and ``bitpack``, which writes each segment of a trace with
+  the number of bits of its largest residual.
+
+:Example:
+
+.. code-block:: bash
+
+  python surfaceS/waveform_codecs.py data.csv
+
+"""
+
+import sys
+import time
+import zlib
+import lzma
+
+import numpy as np
+
+PREDICTORS = ("none", "delta", "lpc2")
+COMPRESSORS = ("zlib", "lzma", "bitpack")
+
+DEFAULT_CODEC = "lpc2+zlib"
+
+# Compression level of zlib: above, the gain is a few percents and the encoding twice slower.
+ZLIB_LEVEL = 1
+
+# Number of samples sharing a width in bitpack: the idle part of a trace is
+# written with a few bits even if the response needs 16.
+BITPACK_SEGMENT = 256
+
+def _predictionOrder(predictor):
+    return PREDICTORS.index(predictor)
+
+def predict(traces, predictor):
+    """
+    Residuals of the prediction of the samples from the previous ones.
+
+    :param traces: The traces, samples on the last axis.
+    :type traces: np.ndarray (int16)
+    :param predictor: One of ``PREDICTORS``.
+    :type predictor: string
+
+    :return: The residuals (same shape and type).
+    :rtype: np.ndarray
+
+    """
+    residuals = traces
+    for i in range(_predictionOrder(predictor)):
+        residuals = np.diff(residuals, axis=-1, prepend=np.int16(0))
+    return residuals
+
+def reconstruct(residuals, predictor):
+    """
+    Inverse of :py:func:`predict`.
+
+    """
+    traces = residuals
+    for i in range(_predictionOrder(predictor)):
+        traces = np.cumsum(traces, axis=-1, dtype=np.int16)
+    return traces
+
+def _zigzag(values):
+    # Small negative and positive residuals both become small unsigned values.
+    values = values.astype(np.int16)
+    return ((values << 1) ^ (values >> 15)).view(np.uint16)
+
+def _unzigzag(values):
+    return ((values >> 1).view(np.int16) ^ -(values & 1).view(np.int16))
+
+def bitpack(traces):
+    """
+    Write each segment of ``BITPACK_SEGMENT`` samples of the traces with the
+    number of bits of its largest zigzag encoded value. The segments of the
+    same width are written one bit plane after the other.
+
+    :param traces: The traces, shape ``(traces, samples)``.
+    :type traces: np.ndarray (int16)
+
+    :return: The packed traces.
+    :rtype: bytes
+
+    """
+    padding = -traces.shape[1] % BITPACK_SEGMENT
+    values = _zigzag(np.pad(traces, ((0, 0), (0, padding)))).reshape(-1, BITPACK_SEGMENT)
+    widths = np.zeros(values.shape[0], dtype=np.uint8)
+    if values.size:
+        widths = np.ceil(np.log2(values.max(axis=1).astype(np.float64) + 1)).astype(np.uint8)
+    parts = [widths.tobytes()]
+    for width in np.unique(widths):
+        group = values[widths == width].reshape(-1)
+        for bit in range(width):
+            parts.append(np.packbits(((group >> bit) & 1).astype(np.uint8)).tobytes())
+    return b''.join(parts)
+
+def bitunpack(payload, nbTraces, nbSamples):
+    """
+    Inverse of :py:func:`bitpack`.
+
+    """
+    nbPadded = nbSamples + (-nbSamples % BITPACK_SEGMENT)
+    (nbTraces, nbSamples, nbOriginal) = (nbTraces*nbPadded//BITPACK_SEGMENT, BITPACK_SEGMENT, (nbTraces, nbSamples))
+    widths = np.frombuffer(payload, dtype=np.uint8, count=nbTraces)
+    values = np.zeros((nbTraces, nbSamples), dtype=np.uint16)
+    offset = nbTraces
+    for width in np.unique(widths):
+        selected = np.flatnonzero(widths == width)
+        count = selected.size*nbSamples
+        planeBytes = (count + 7)//8
+        group = np.zeros(count, dtype=np.uint16)
+        # Low and high bytes of the values.
+        groupBytes = group.view(np.uint8)
+        for bit in range(width):
+            plane = np.unpackbits(np.frombuffer(payload, dtype=np.uint8, count=planeBytes, offset=offset), count=count)
+            groupBytes[bit//8::2] |= plane << (bit % 8)
+            offset += planeBytes
+        values[selected] = group.reshape(selected.size, nbSamples)
+    return _unzigzag(values).reshape(nbOriginal[0], nbPadded)[:, :nbOriginal[1]]
+
+def _shuffle(values):
+    # Low bytes then high bytes: the high bytes of small residuals are runs of 0 and 255.
+    return values.astype('<i2').view(np.uint8).reshape(-1, 2).T.tobytes()
+
+def _unshuffle(payload, count):
+    values = np.empty(count, dtype='<i2')
+    planes = np.frombuffer(payload, dtype=np.uint8).reshape(2, count)
+    values.view(np.uint8)[0::2] = planes[0]
+    values.view(np.uint8)[1::2] = planes[1]
+    return values
+
+class Codec():
+    """
+    Encoder and decoder of the chunks of an array.
+
+    :param name: ``"<predictor>+<compressor>"``, or ``"raw"`` for no compression.
+    :type name: string
+
+    """
+    def __init__(self, name=DEFAULT_CODEC):
+        self.name = name
+        (self.predictor, self.compressor) = ("none", None) if name == "raw" else tuple(name.split("+"))
+        if self.predictor not in PREDICTORS or (self.compressor is not None and self.compressor not in COMPRESSORS):
+            raise ValueError(f'Unknown codec {name}, the codecs are "raw" and "<{"|".join(PREDICTORS)}>+<{"|".join(COMPRESSORS)}>".')
+
+    def supports(self, dtype):
+        """
+        :return: True if the arrays of this type can be encoded. The predictors and ``bitpack`` are for ``int16`` only.
+        :rtype: bool
+
+        """
+        return np.dtype(dtype) == np.int16 or (self.predictor == "none" and self.compressor != "bitpack")
+
+    def encode(self, block):
+        """
+        :param block: The chunk.
+        :type block: np.ndarray
+
+        :return: The encoded chunk.
+        :rtype: bytes
+
+        """
+        if not self.supports(block.dtype):
+            raise ValueError(f'The codec {self.name} cannot encode {block.dtype} arrays.')
+        if self.compressor is None or block.size == 0:
+            return np.ascontiguousarray(block).tobytes()
+        if block.dtype == np.int16:
+            residuals = predict(block, self.predictor)
+            if self.compressor == "bitpack":
+                return bitpack(residuals.reshape(-1, block.shape[-1]))
+            payload = _shuffle(residuals)
+        else:
+            payload = np.ascontiguousarray(block).tobytes()
+        if self.compressor == "zlib":
+            return zlib.compress(payload, ZLIB_LEVEL)
+        return lzma.compress(payload, preset=1)
+
+    def decode(self, payload, shape, dtype):
+        """
+        :param payload: The encoded chunk.
+        :type payload: bytes
+        :param shape: Shape of the chunk.
+        :type shape: tuple
+        :param dtype: Type of the elements.
+        :type dtype: np.dtype
+
+        :return: The chunk.
+        :rtype: np.ndarray
+
+        """
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape, dtype=np.int64))
+        if self.compressor is None or count == 0:
+            return np.frombuffer(payload, dtype=dtype, count=count).reshape(shape)
+        if self.compressor == "bitpack":
+            residuals = bitunpack(payload, count//shape[-1], shape[-1]).reshape(shape)
+            return reconstruct(residuals, self.predictor)
+        payload = zlib.decompress(payload) if self.compressor == "zlib" else lzma.decompress(payload)
+        if dtype != np.int16:
+            return np.frombuffer(payload, dtype=dtype, count=count).reshape(shape)
+        return reconstruct(_unshuffle(payload, count).reshape(shape), self.predictor)
+
+def syntheticTraces(nbTraces=64, nbSamples=50000, pretrigger=0.1, seed=0):
+    """
+    Vibrometer-like traces: idle with noise before the trigger, then damped
+    resonances.
+
+    :return: The traces, shape ``(traces, samples)``.
+    :rtype: np.ndarray (int16)
+
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(nbSamples)
+    start = int(pretrigger*nbSamples)
+    traces = np.empty((nbTraces, nbSamples), dtype=np.int16)
+    for i in range(nbTraces):
+        response = np.zeros(nbSamples)
+        for mode in range(3):
+            frequency = rng.uniform(0.002, 0.02)
+            decay = rng.uniform(2.0, 8.0)/nbSamples
+            response[start:] += rng.uniform(1000, 8000)*np.sin(2*np.pi*frequency*(t[start:] - start))*np.exp(-decay*(t[start:] - start))
+        traces[i] = np.clip(np.round(response + rng.normal(0.0, 3.0, nbSamples)), -32768, 32767)
+    return traces
+
+def benchmark(traces, codecs=None, repeat=3):
+    """
+    Compression ratio and speed of the codecs on some traces.
+
+    :param traces: The traces, shape ``(traces, samples)``.
+    :type traces: np.ndarray (int16)
+    :param codecs: Names of the codecs (default: all).
+    :type codecs: list
+
+    :return: For each codec: ``(name, ratio, encoding MB/s, decoding MB/s)``, the speeds in MB of raw traces.
+    :rtype: list
+
+    """
+    if codecs is None:
+        codecs = ["raw"] + [f'{p}+{c}' for c in COMPRESSORS for p in PREDICTORS]
+    megabytes = traces.nbytes/1e6
+    results = []
+    for name in codecs:
+        codec = Codec(name)
+        start = time.perf_counter()
+        for i in range(repeat):
+            payload = codec.encode(traces)
+        encoding = (time.perf_counter() - start)/repeat
+        start = time.perf_counter()
+        for i in range(repeat):
+            decoded = codec.decode(payload, traces.shape, traces.dtype)
+        decoding = (time.perf_counter() - start)/repeat
+        if not np.array_equal(decoded, traces):
+            raise AssertionError(f'The codec {name} is not lossless.')
+        results.append((name, traces.nbytes/max(1, len(payload)), megabytes/max(encoding, 1e-9), megabytes/max(decoding, 1e-9)))
+    return results
+
+def main(argv):
+    datasets = [("synthetic", syntheticTraces())]
+    for filename in argv:
+        datasets.append((filename, np.atleast_2d(np.round(np.loadtxt(filename, delimiter=",")).astype(np.int16).T)))
+    for (name, traces) in datasets:
+        print(f'{name}: {traces.shape[0]} traces of {traces.shape[1]} samples')
+        for (codec, ratio, encoding, decoding) in benchmark(traces):
+            print(f'  {codec:14s} ratio {ratio:5.2f}  encode {encoding:7.1f} MB/s  decode {decoding:7.1f} MB/s')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,105 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import adaptive_scan as AS
+import scan_engine as SE
+
+from ScanEngineTest import FakeCnc, FakeSignalGenerator, scanParameters
+
+class FieldOscilloscope():
+    """
+    Oscilloscope measuring a field with a step along X.
+    """
+    def __init__(self, cnc, edge):
+        self.cnc = cnc
+        self.edge = edge
+        self.level = 0
+
+    def setGrid(self, *args):
+        pass
+
+    def setTrigger(self, *args):
+        pass
+
+    def acquire(self, readOnly=False, channel=1):
+        return {"data": np.full(16, self.level, dtype=np.int16)}
+
+class FieldExcitation(SE.Excitation):
+    configurations = 0
+
+    def configure(self, sg, osc):
+        FieldExcitation.configurations += 1
+
+    def fire(self, sg, osc, shot):
+        (x, y) = osc.cnc.moves[-1]
+        osc.level = 1000 if x > osc.edge else 100
+
+class TestAdaptiveScan(unittest.TestCase):
+    """
+    Tests of the adaptive refinement with fake instruments.
+    """
+
+    def setUp(self):
+        self.params = scanParameters()
+        self.params['nb_point_x'] = 17
+        self.params['nb_point_y'] = 16
+        self.params['samples_per_point'] = 1
+        self.edge = self.params['start_x'] + 10.5*self.params['step_x']
+
+    def test_serpentine_order(self):
+        order = AS.serpentineOrder([0, 1, 0, 1], [0, 0, 1, 1])
+        np.testing.assert_array_equal(order, [0, 1, 3, 2])
+
+    def test_refines_near_the_edge(self):
+        cnc = FakeCnc()
+        osc = FieldOscilloscope(cnc, self.edge)
+        scan = AS.AdaptiveScan(cnc, osc, FakeSignalGenerator(), self.params, FieldExcitation(self.params), \
+                               budget=80, coarseStep=4)
+        store = scan.run()
+
+        self.assertLessEqual(len(scan.plan), 80)
+        self.assertGreater(len(scan.plan), 25)
+        self.assertEqual(store.data.shape[0], len(scan.plan))
+        self.assertTrue(store.filled.all())
+        # All the refinement points are in the coarse cells crossing the edge.
+        refined = scan.plan.ix[25:]
+        self.assertTrue(((refined >= 8) & (refined <= 12)).all())
+        # No point is measured twice.
+        self.assertEqual(len(set(zip(scan.plan.ix, scan.plan.iy))), len(scan.plan))
+        # The measured values match the field.
+        np.testing.assert_array_equal(store.data[:, 0, 0, 0], np.where(scan.plan.x > self.edge, 1000, 100))
+
+    def test_resume_finished_rounds(self):
+        with tempfile.TemporaryDirectory() as directory:
+            journalFile = os.path.join(directory, "adaptive.journal")
+            FieldExcitation.configurations = 0
+            cnc = FakeCnc()
+            scan = AS.AdaptiveScan(cnc, FieldOscilloscope(cnc, self.edge), FakeSignalGenerator(), self.params, \
+                                   FieldExcitation(self.params), budget=80, coarseStep=4, journalFile=journalFile)
+            first = scan.run()
+            # The instruments are only configured for the first round.
+            self.assertGreater(scan.rounds, 1)
+            self.assertEqual(FieldExcitation.configurations, 1)
+
+            # Restarted (e.g. after a failure at the end): nothing is measured again.
+            cnc = FakeCnc()
+            scan = AS.AdaptiveScan(cnc, FieldOscilloscope(cnc, self.edge), FakeSignalGenerator(), self.params, \
+                                   FieldExcitation(self.params), budget=80, coarseStep=4, journalFile=journalFile)
+            second = scan.run()
+            self.assertEqual(cnc.moves, [])
+            np.testing.assert_array_equal(second.data, first.data)
+
+            scan.removeJournals()
+            self.assertEqual(os.listdir(directory), [])
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
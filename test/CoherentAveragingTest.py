@@ -0,0 +1,90 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import coherent_averaging as CA
+import sample_store as SampleStore
+import scan_engine as SE
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+def pulse(nbSamples=256, center=100.0):
+    t = np.arange(nbSamples)
+    return np.exp(-0.5*((t - center)/4.0)**2)*np.cos(0.6*(t - center))
+
+class TestCoherentAveraging(unittest.TestCase):
+    """
+    Tests of the jitter-corrected averaging.
+    """
+
+    def setUp(self):
+        self.delays = np.array([0.0, 1.3, -2.7, 0.45, 3.0])
+        self.shots = np.stack([pulse(center=100.0 + d) for d in self.delays])
+
+    def test_delays(self):
+        delays = CA.estimateDelays(self.shots)
+        np.testing.assert_allclose(delays, self.delays, atol=0.15)
+
+    def test_average_is_sharper_than_mean(self):
+        (average, delays) = CA.coherentAverage(self.shots[:, np.newaxis], alignOn=0)
+        self.assertEqual(average.shape, (1, 256))
+        plain = self.shots.mean(axis=0)
+        self.assertGreater(average.max(), 0.95)
+        self.assertGreater(average.max(), plain.max() + 0.1)
+
+    def test_align_on_reference_channel(self):
+        # The response has the same jitter as the reference channel.
+        shots = np.stack([self.shots, 3*self.shots], axis=1)
+        (average, delays) = CA.coherentAverage(shots, alignOn=0)
+        np.testing.assert_allclose(average[1], 3*average[0], atol=1e-12)
+        np.testing.assert_allclose(delays, self.delays, atol=0.15)
+
+    def test_streaming_matches_batch(self):
+        traces = np.round(1000*self.shots).astype(np.int16)
+        store = SampleStore.SampleStore(2, 5, ["data"], 256)
+        average = CA.CoherentAverage(2, 5, ["data"], 256)
+        for point in range(2):
+            for shot in range(5):
+                store.put(point, shot, 0, traces[shot])
+                average.add(point, shot, 0, traces[shot])
+        (mean, delays) = CA.averageStore(store)
+        np.testing.assert_allclose(average.mean, mean, rtol=1e-5, atol=1e-3)
+        self.assertEqual(delays.shape, (2, 1, 5))
+
+    def test_saved_dataset(self):
+        traces = np.round(1000*self.shots).astype(np.int16)
+        store = SampleStore.SampleStore(2, 5, ["response", "sineSweep"], 256, x=[0.0, 2.0], y=[1.0, 1.0])
+        for point in range(2):
+            for shot in range(5):
+                store.put(point, shot, 0, 2*traces[shot])
+                store.put(point, shot, 1, traces[shot])
+        columnName = lambda x, y, shot, channel: f'{x},{y},S{shot + 1},{channel}'
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "EXP.json")
+            MeasureDataset.MeasureDataset(store.to_dataframe(columnName), ExpParamIO.getDefaultParameters()).save_to(filename)
+            dataset = MeasureDataset.MeasureDataset.load_from(filename)
+
+        (averaged, delays) = CA.averageDataset(dataset, alignOn="sineSweep")
+        (mean, storeDelays) = CA.averageStore(store, alignOn=1)
+        data = averaged.get_data()
+        self.assertEqual(data.shape, (256, 4))
+        np.testing.assert_allclose(data["2.0,1.0,S1,response,mean"], mean[1, 0], atol=1e-9)
+        np.testing.assert_allclose(delays, storeDelays, atol=1e-9)
+        with self.assertRaises(ValueError):
+            CA.averageDataset(dataset, alignOn="reference")
+
+    def test_missing_alignment_channel(self):
+        params = ExpParamIO.getDefaultParameters()
+        excitation = SE.Excitation(params)
+        with self.assertRaisesRegex(ValueError, "not acquired"):
+            SE.CoherentAveragingSink(alignOn="reference").begin(SE.ScanPlan([0.0], [0.0]), excitation)
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
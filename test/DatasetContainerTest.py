@@ -0,0 +1,113 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import dataset_container as Container
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+class TestDatasetContainer(unittest.TestCase):
+    """
+    Tests of the binary container of the datasets.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "EXP.sds")
+        rng = np.random.default_rng(1)
+        samples = rng.integers(-30000, 30000, size=(5, 2, 2, 100)).astype(np.int16)
+        self.dataset = MeasureDataset.MeasureDataset.fromArrays(samples, [0.0, 1.0, 0.0, 1.0, 2.0], [0.0, 0.0, 1.0, 1.0, 1.0], \
+                                                                ["response", "sineSweep"], ExpParamIO.getDefaultParameters())
+        self.dataset.quality = {"retries": 1, "failed_shots": [], "problems": {}}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        Container.saveDataset(self.dataset, self.filename, chunkPoints=2)
+        self.assertEqual(len(Container.Container(self.filename).arrays["samples"]["chunks"]), 3)
+
+        loaded = MeasureDataset.MeasureDataset.load_from(self.filename)
+        self.assertIsInstance(loaded.samples, np.memmap)
+        np.testing.assert_array_equal(loaded.samples, self.dataset.samples)
+        np.testing.assert_array_equal(loaded.grid, self.dataset.grid)
+        self.assertEqual(loaded.channels, ["response", "sineSweep"])
+        self.assertEqual(loaded.quality["retries"], 1)
+        self.assertEqual(loaded.experimentParameters, self.dataset.experimentParameters)
+        self.assertEqual(list(loaded.get_data().columns)[0], "0.0,0.0,S1,response")
+
+    def test_append(self):
+        Container.saveDataset(self.dataset, self.filename)
+        with Container.ContainerWriter(self.filename, append=True) as writer:
+            writer.writeArray("peak", np.abs(self.dataset.samples).max(axis=-1))
+            writer.attributes["peak"] = {"unit": "raw"}
+        container = Container.Container(self.filename)
+        self.assertEqual(set(container.names()), set(Container.DATASET_ARRAYS) | {"peak"})
+        np.testing.assert_array_equal(container.array("peak", mmap=False), np.abs(self.dataset.samples).max(axis=-1))
+        np.testing.assert_array_equal(MeasureDataset.MeasureDataset.load_from(self.filename).samples, self.dataset.samples)
+
+    def test_save_over_itself(self):
+        self.dataset.save_to(self.filename)
+        loaded = MeasureDataset.MeasureDataset.load_from(self.filename)
+        loaded.save_to(self.filename)
+        np.testing.assert_array_equal(loaded.samples, self.dataset.samples)
+        np.testing.assert_array_equal(MeasureDataset.MeasureDataset.load_from(self.filename).samples, self.dataset.samples)
+        self.assertEqual(os.listdir(self.directory.name), ["EXP.sds"])
+
+        # A failed write leaves the container as it was.
+        with self.assertRaises(ValueError):
+            with Container.ContainerWriter(self.filename) as writer:
+                writer.writeArray("samples", loaded.samples)
+                writer.beginArray("x", (5,), np.float64)
+                writer.writeChunk(np.zeros((2, 2)))
+        np.testing.assert_array_equal(MeasureDataset.MeasureDataset.load_from(self.filename).samples, self.dataset.samples)
+        self.assertEqual(os.listdir(self.directory.name), ["EXP.sds"])
+
+    def test_replace(self):
+        self.dataset.save_to(self.filename)
+        loaded = MeasureDataset.MeasureDataset.load_from(self.filename)
+        peak = np.abs(self.dataset.samples).max(axis=-1)
+        with Container.ContainerWriter(self.filename, append=True) as writer:
+            writer.writeArray("peak", peak)
+            writer.writeArray("scaled", peak.astype(np.float64))
+        size = os.path.getsize(self.filename)
+        for i in range(3):
+            with Container.ContainerWriter(self.filename, append=True) as writer:
+                writer.writeArray("peak", peak + i)
+        # The chunks of the replaced arrays are not kept.
+        self.assertEqual(os.path.getsize(self.filename), size)
+        container = Container.Container(self.filename)
+        np.testing.assert_array_equal(container.array("peak", mmap=False), peak + 2)
+        np.testing.assert_array_equal(container.array("scaled"), peak)
+        np.testing.assert_array_equal(loaded.samples, self.dataset.samples)
+
+        # A failed rewrite restores the previous array.
+        with self.assertRaises(ValueError):
+            with Container.ContainerWriter(self.filename, append=True) as writer:
+                writer.writeArray("peak", peak)
+                writer.attributes["peak"] = {"unit": "raw"}
+                writer.beginArray("scaled", peak.shape, np.float64)
+                writer.writeChunk(np.zeros((1, 3)))
+        container = Container.Container(self.filename)
+        self.assertEqual(os.path.getsize(self.filename), size)
+        self.assertNotIn("peak", container.attributes)
+        np.testing.assert_array_equal(container.array("peak", mmap=False), peak + 2)
+        np.testing.assert_array_equal(container.array("scaled"), peak)
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["EXP.sds"])
+
+    def test_truncated(self):
+        self.dataset.save_to(self.filename)
+        with open(self.filename, "r+b") as fhandle:
+            fhandle.truncate(os.path.getsize(self.filename) - 3)
+        with self.assertRaisesRegex(ValueError, "truncated"):
+            Container.Container(self.filename)
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import dataset_converter as Converter
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+class TestDatasetConverter(unittest.TestCase):
+    """
+    Tests of the conversion of the legacy datasets.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(2)
+        self.params = ExpParamIO.getDefaultParameters()
+        self.params['time_division'] = 0.25
+        columns = {}
+        for (x, y) in [(0.0, 0.0), (1.5, 0.0), (0.0, 2.0)]:
+            for shot in range(2):
+                for channel in ["réponse", "sineSweep"]:
+                    columns[f'{x},{y},S{shot + 1},{channel}'] = rng.integers(-32768, 32767, size=300).astype(np.int16)
+        self.dataset = MeasureDataset.MeasureDataset(pd.DataFrame(columns), self.params)
+        self.dataset.quality = {"retries": 3}
+        self.json = os.path.join(self.directory.name, "EXP1.json")
+        self.dataset.save_to(self.json)
+
+    def tearDown(self):
+        self.directory.cleanup()
+        Converter.READ_BLOCK_BYTES = 1024*1024
+
+    def check(self, filename, expected):
+        converted = MeasureDataset.MeasureDataset.load_from(filename)
+        self.assertEqual(converted.samples.dtype, expected.samples.dtype)
+        np.testing.assert_array_equal(converted.samples, expected.samples)
+        np.testing.assert_array_equal(converted.x, expected.x)
+        self.assertEqual(converted.channels, expected.channels)
+        return converted
+
+    def test_json(self):
+        # Small blocks and rows: the escapes and the lines are split between blocks.
+        Converter.READ_BLOCK_BYTES = 1000
+        stats = Converter.convertFile(self.json, maxMemory=20000)
+        self.assertEqual((stats["traces"], stats["samples"]), (12, 300))
+        converted = self.check(stats["output"], MeasureDataset.MeasureDataset.load_from(self.json))
+        self.assertEqual(converted.experimentParameters['time_division'], 0.25)
+        self.assertEqual(converted.quality, {"retries": 3})
+
+    def test_csv_floats(self):
+        data = self.dataset.get_data()/7.0
+        filename = os.path.join(self.directory.name, "EXP2.csv")
+        data.to_csv(filename)
+        stats = Converter.convertFile(filename, maxMemory=5000)
+        self.check(stats["output"], MeasureDataset.MeasureDataset.load_from(filename))
+
+    def test_directory(self):
+        self.dataset.save_to(os.path.join(self.directory.name, "EXP2.json"))
+        with open(os.path.join(self.directory.name, "EXP3.json"), "w") as fhandle:
+            fhandle.write('{"metadata": "{}"}')
+        output = os.path.join(self.directory.name, "converted")
+        os.mkdir(output)
+        results = Converter.convertDirectory(self.directory.name, output, processes=2)
+        self.assertEqual([os.path.basename(r["input"]) for r in results], ["EXP1.json", "EXP2.json", "EXP3.json"])
+        self.assertIn("error", results[2])
+        self.check(os.path.join(output, "EXP2.sds"), self.dataset)
+        self.assertIn("2/3 files", Converter.formatThroughput(results, 1.0))
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import experiment_queue as EQ
+
+from ScanEngineTest import FakeCnc, FakeOscilloscope, FakeSignalGenerator, ShotExcitation, scanParameters
+
+class CountingExcitation(ShotExcitation):
+    signalGeneratorParameters = ('frequency',)
+    configurations = []
+
+    def configureSignalGenerator(self, sg):
+        CountingExcitation.configurations.append("sg")
+
+    def configureOscilloscope(self, osc):
+        CountingExcitation.configurations.append("osc")
+
+class TestExperimentQueue(unittest.TestCase):
+    """
+    Tests of the experiment queue with fake instruments.
+    """
+
+    def setUp(self):
+        CountingExcitation.configurations = []
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def parameters(self, name, **changes):
+        params = scanParameters()
+        params['data_filename'] = os.path.join(self.directory.name, name)
+        params.update(changes)
+        return params
+
+    def test_only_changes_are_configured(self):
+        queue = EQ.ExperimentQueue(FakeCnc(), FakeOscilloscope(), FakeSignalGenerator())
+        queue.add(self.parameters("a.json", frequency=1), CountingExcitation)
+        queue.add(self.parameters("b.json", frequency=2), CountingExcitation)
+        queue.add(self.parameters("c.json", frequency=2), CountingExcitation)
+        done = []
+        runs = queue.run(runDone=lambda run: done.append((run, os.path.exists(run.name()))))
+
+        # Each run is reported as soon as its dataset is written.
+        self.assertEqual(done, [(run, True) for run in runs])
+        self.assertEqual(CountingExcitation.configurations, ["sg", "osc", "sg"])
+        for run in runs:
+            self.assertIsNone(run.error)
+            self.assertTrue(os.path.exists(run.name()))
+            self.assertFalse(os.path.exists(f'{run.name()}.journal'))
+            self.assertEqual(run.dataset.get_data().shape, (16, 12))
+
+    def test_reorder(self):
+        queue = EQ.ExperimentQueue(FakeCnc(), FakeOscilloscope(), FakeSignalGenerator())
+        queue.add(self.parameters("a.json", frequency=1), CountingExcitation)
+        queue.add(self.parameters("b.json", frequency=2), CountingExcitation)
+        queue.add(self.parameters("c.json", frequency=1), CountingExcitation)
+        queue.add(self.parameters("d.json", frequency=2), CountingExcitation)
+        saved = queue.reorder()
+
+        self.assertGreater(saved, 0)
+        self.assertEqual([os.path.basename(run.name()) for run in queue.runs], ["a.json", "c.json", "b.json", "d.json"])
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+import os
+import sys
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import focusing
+
+class TestFocusing(unittest.TestCase):
+    """
+    Tests of the focusing signals computation.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        t = np.arange(512)
+        self.ir = rng.standard_normal((3, 40, 512))*np.exp(-t/100)
+
+    def test_time_reversal(self):
+        signals = focusing.computeFocusingSignals(self.ir, [5, 7], method="TR")
+        self.assertEqual(signals.shape, (2, 3, 512))
+        expected = self.ir[:, 7, ::-1]/np.max(np.abs(self.ir[:, 7]))
+        np.testing.assert_allclose(signals[1], expected)
+
+    def test_inverse_filter_focuses(self):
+        signals = focusing.computeFocusingSignals(self.ir, [3, 20], method="IF")
+        self.assertEqual(signals.shape, (2, 3, 512))
+        response = focusing.simulateFocusing(self.ir, signals)
+        for i, point in enumerate([3, 20]):
+            peaks = np.max(np.abs(response[i]), axis=-1)
+            self.assertEqual(np.argmax(peaks), point)
+
+    def test_to_arbitrary_waveform(self):
+        wave = focusing.toArbitraryWaveform(np.array([-2.0, 0.0, 2.0]))
+        self.assertEqual(wave.dtype, np.uint16)
+        np.testing.assert_array_equal(wave, [0, 8192, focusing.ARB_MAX_VALUE])
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
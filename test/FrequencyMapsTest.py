@@ -0,0 +1,69 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import frequency_maps as FrequencyMaps
+import dataset_container as Container
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+class TestFrequencyMaps(unittest.TestCase):
+    """
+    Tests of the amplitude and phase maps of the traces.
+    """
+
+    def setUp(self):
+        self.period = 1e-5
+        time = np.arange(4000)*self.period
+        self.amplitudes = np.linspace(100, 1000, 12).reshape(6, 2, 1, 1)
+        self.phases = np.linspace(-3, 3, 12).reshape(6, 2, 1, 1)
+        # 1234.5 Hz is between two bins of the FFT of the traces.
+        self.samples = np.round(self.amplitudes*np.cos(2*np.pi*1234.5*time + self.phases) + 20).astype(np.int16)
+
+    def test_maps(self):
+        maps = FrequencyMaps.frequencyMaps(self.samples, self.period, [1234.5, 0], batchBytes=20000)
+        self.assertEqual(maps["amplitude"].shape, (6, 2, 1, 2))
+        np.testing.assert_allclose(maps["amplitude"][..., 0], self.amplitudes[..., 0], rtol=1e-2)
+        np.testing.assert_allclose(maps["phase"][..., 0], self.phases[..., 0], atol=1e-2)
+        np.testing.assert_allclose(maps["amplitude"][..., 1], 20, atol=1)
+
+    def test_padding(self):
+        (frequencies, spectra) = FrequencyMaps.spectra(self.samples, self.period, "hamming", padding=2, batchBytes=20000)
+        self.assertEqual(spectra.shape, (6, 2, 1, 4001))
+        maps = FrequencyMaps.frequencyMaps(self.samples, self.period, [1234.5, 3000], "hamming", padding=2)
+        bins = np.searchsorted(frequencies, maps["frequencies"])
+        np.testing.assert_allclose(maps["frequencies"], frequencies[bins])
+        np.testing.assert_allclose(maps["amplitude"], np.abs(spectra[..., bins]), rtol=1e-4, atol=1e-3)
+        np.testing.assert_allclose(maps["phase"][..., 0], np.angle(spectra[..., bins[0]]), atol=1e-4)
+        with self.assertRaises(ValueError):
+            FrequencyMaps.frequencyMaps(self.samples, self.period, [1000], "kaiser")
+
+    def test_stored(self):
+        params = ExpParamIO.getDefaultParameters()
+        params['frequency'] = 1234.5
+        params['time_division'] = 4000*self.period*1000/10
+        dataset = MeasureDataset.MeasureDataset.fromArrays(self.samples, np.arange(6.0), np.zeros(6), experimentParameters=params)
+        self.assertAlmostEqual(dataset.samplePeriod(), self.period)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "EXP.sds")
+            dataset.save_to(filename)
+            maps = dataset.get_frequency_maps()
+            self.assertIs(dataset.get_frequency_maps([1234.5]), maps)
+            self.assertIn("frequency_amplitude", Container.Container(filename).names())
+            loaded = MeasureDataset.MeasureDataset.load_from(filename)
+            np.testing.assert_array_equal(FrequencyMaps.load(filename, [1234.5])["amplitude"], maps["amplitude"])
+            self.assertIsNone(FrequencyMaps.load(filename, [1234.5], padding=2))
+            other = loaded.get_frequency_maps([1234.5, 500], padding=2)
+            self.assertIsNotNone(FrequencyMaps.load(filename, [1234.5, 500], padding=2))
+            self.assertEqual(other["amplitude"].shape[-1], 2)
+            del loaded
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.INFO)
+    unittest.main()
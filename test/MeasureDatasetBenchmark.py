@@ -0,0 +1,51 @@
+"""
+Benchmark of the accessors of MeasureDataset against the DataFrame of get_data().
+
+  python test/MeasureDatasetBenchmark.py [points] [samples]
+
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+def timeit(function, repeat=20):
+    start = time.perf_counter()
+    for i in range(repeat):
+        function()
+    return 1000*(time.perf_counter() - start)/repeat
+
+def compare(rows, dataset, mapped):
+    for (name, iloc, accessor) in rows:
+        print(f'{name:12s} .iloc {timeit(iloc):8.3f} ms   in memory {timeit(lambda: accessor(dataset)):8.3f} ms   '
+              f'memory-mapped {timeit(lambda: accessor(mapped)):8.3f} ms')
+
+def main(nbPoints=2500, nbSamples=5000):
+    side = int(np.sqrt(nbPoints))
+    (x, y) = np.meshgrid(np.arange(side, dtype=np.float64), np.arange(side, dtype=np.float64), indexing='ij')
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-3000, 3000, size=(side*side, 1, 1, nbSamples)).astype(np.int16)
+    dataset = MeasureDataset.MeasureDataset.fromArrays(samples, x.reshape(-1), y.reshape(-1), experimentParameters=ExpParamIO.getDefaultParameters())
+    data = dataset.get_data()
+    print(f'{side*side} points of {nbSamples} samples')
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "EXP.sds")
+        dataset.save_to(filename)
+        (t, px, py) = (nbSamples//2, float(side//2), float(side//3))
+        point = dataset.pointOf(px, py)
+        rows = [("frame", lambda: data.iloc[t, :].to_numpy(), lambda d: d.get_frame(t)),
+                ("trace", lambda: data.iloc[:, point].to_numpy(), lambda d: d.get_trace(px, py)),
+                ("window", lambda: data.iloc[t:t + 500, :side].to_numpy(), lambda d: d.get_window(t, t + 500, (0.0, 0.0, 0.0, side))),
+                ("window copy", lambda: data.iloc[t:t + 500, :side].to_numpy().copy(), lambda d: np.array(d.get_window(t, t + 500, (0.0, 0.0, 0.0, side))))]
+        # The map is released when compare returns, before the directory is removed.
+        compare(rows, dataset, MeasureDataset.MeasureDataset.load_from(filename))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
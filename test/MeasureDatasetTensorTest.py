@@ -0,0 +1,101 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import sample_store as SampleStore
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+def sineSweepName(x, y, shot, channel):
+    return f'{x},{y},S{shot + 1},{channel}'
+
+class TestMeasureDatasetTensor(unittest.TestCase):
+    """
+    Tests of the array model of the datasets.
+    """
+
+    def setUp(self):
+        self.params = ExpParamIO.getDefaultParameters()
+        self.x = np.array([0.0, 1.0, 0.0, 1.0, 2.0])
+        self.y = np.array([0.0, 0.0, 1.0, 1.0, 1.0])
+        self.store = SampleStore.SampleStore(5, 2, ["response", "sineSweep"], 64, self.x, self.y)
+        for point in range(5):
+            for shot in range(2):
+                for channel in range(2):
+                    self.store.put(point, shot, channel, np.full(64, 100*point + 10*shot + channel, dtype=np.int16))
+
+    def test_from_store(self):
+        dataset = MeasureDataset.MeasureDataset.fromScanResult(self.store, self.params, sineSweepName)
+        self.assertEqual(dataset.samples.shape, (5, 2, 2, 64))
+        self.assertEqual(dataset.channels, ["response", "sineSweep"])
+        self.assertEqual(dataset.grid.shape, (3, 2))
+        self.assertEqual(dataset.pointAt(2, 1), 4)
+        self.assertEqual(dataset.pointAt(2, 0), -1)
+        self.assertEqual(dataset.numberOfSamples, 64)
+        self.assertAlmostEqual(dataset.axes["sample"]["period"], SampleStore.samplePeriodFromParameters(self.params, 64))
+
+        data = dataset.get_data()
+        self.assertEqual(data.shape, (64, 20))
+        self.assertEqual(data["2.0,1.0,S2,sineSweep"][0], 411)
+
+    def test_legacy_round_trip(self):
+        dataset = MeasureDataset.MeasureDataset.fromScanResult(self.store, self.params, sineSweepName)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "EXP.json")
+            dataset.save_to(filename)
+            loaded = MeasureDataset.MeasureDataset.load_from(filename)
+        self.assertEqual(loaded.samples.dtype, np.int16)
+        np.testing.assert_array_equal(loaded.samples, dataset.samples)
+        np.testing.assert_array_equal(loaded.x, self.x)
+        np.testing.assert_array_equal(loaded.grid, dataset.grid)
+        self.assertEqual(loaded.channels, dataset.channels)
+
+    def test_dataframe_formats(self):
+        data = pd.DataFrame({"X1.0_Y2.0_S1": np.arange(4), "X1.0_Y2.0_S2": np.arange(4) + 1, \
+                             "X1.0_Y2.0_S1,E2": np.arange(4) + 2})
+        dataset = MeasureDataset.MeasureDataset(data, self.params)
+        self.assertEqual(dataset.samples.shape, (1, 3, 1, 4))
+        self.assertEqual(list(dataset.shotExcitation), [0, 0, 1])
+        np.testing.assert_array_equal(dataset.samples[0, 2, 0], np.arange(4) + 2)
+        self.assertEqual(MeasureDataset.parseColumnName("1.0,2.0,S3,response,mean,E2"), (1.0, 2.0, 2, "response,mean", 1))
+        self.assertIsNone(MeasureDataset.parseColumnName("Unnamed: 0"))
+
+    def test_accessors(self):
+        dataset = MeasureDataset.MeasureDataset.fromScanResult(self.store, self.params, sineSweepName)
+        frame = dataset.get_frame(5, shot=1, channel=1)
+        np.testing.assert_array_equal(frame, 100*np.arange(5) + 11)
+        self.assertTrue(np.shares_memory(frame, dataset.samples))
+
+        trace = dataset.get_trace(1.0, 1.0)
+        np.testing.assert_array_equal(trace, np.full(64, 300))
+        self.assertTrue(np.shares_memory(trace, dataset.samples))
+        self.assertEqual(dataset.get_trace(1.0, 1.0, shot=None, channel=None).shape, (2, 2, 64))
+        with self.assertRaises(KeyError):
+            dataset.get_trace(5.0, 5.0)
+
+        # The last line of the grid is contiguous: a view.
+        window = dataset.get_window(10, 20, (0.0, 2.0, 1.0, 1.0))
+        self.assertEqual(window.shape, (3, 2, 2, 10))
+        self.assertTrue(np.shares_memory(window, dataset.samples))
+        # The points 1 and 4 are not evenly spaced with 3: a copy.
+        window = dataset.get_window(0, 64, (1.0, 2.0, 0.0, 1.0))
+        np.testing.assert_array_equal(window[:, 0, 0, 0], [100, 300, 400])
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "EXP.sds")
+            dataset.save_to(filename)
+            mapped = MeasureDataset.MeasureDataset.load_from(filename)
+            np.testing.assert_array_equal(mapped.get_frame(5, shot=1, channel=1), frame)
+            self.assertIsInstance(mapped.get_window(10, 20), np.memmap)
+            del mapped
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import sample_store as SampleStore
+
+class TestSampleStore(unittest.TestCase):
+    """
+    Tests of the sample store and of the checkpoint journal.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journalFile = os.path.join(self.directory.name, "scan.journal")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_samples_from_parameters(self):
+        self.assertEqual(SampleStore.samplesFromParameters({'OSCNumSamples': "50K"}), 50000)
+        self.assertEqual(SampleStore.samplesFromParameters({'OSCNumSamples': "2.5M"}), 2500000)
+        self.assertEqual(SampleStore.samplesFromParameters({'OSCNumSamples': "500"}), 500)
+
+    def test_resize_on_first_trace(self):
+        store = SampleStore.SampleStore(2, 1, ["data"], 10)
+        store.put(0, 0, 0, np.arange(12, dtype=np.int16))
+        self.assertEqual(store.data.shape, (2, 1, 1, 12))
+        with self.assertRaises(ValueError):
+            store.put(1, 0, 0, np.arange(10, dtype=np.int16))
+
+    def test_journal_round_trip(self):
+        journal = SampleStore.CheckpointJournal(self.journalFile, {"shape": [2, 3, 1]})
+        for point in range(2):
+            for shot in range(3):
+                journal.append(point, shot, 0, np.full(8, 10*point + shot, dtype=np.int16))
+        journal.close()
+
+        (description, records, validSize) = SampleStore.CheckpointJournal.read(self.journalFile)
+        self.assertEqual(description["shape"], [2, 3, 1])
+        self.assertEqual(len(records), 6)
+        self.assertEqual(validSize, os.path.getsize(self.journalFile))
+        (kind, point, shot, channel, samples) = records[-1]
+        self.assertEqual((point, shot, channel), (1, 2, 0))
+        np.testing.assert_array_equal(samples, np.full(8, 12))
+
+    def test_journal_truncated(self):
+        journal = SampleStore.CheckpointJournal(self.journalFile, {})
+        journal.append(0, 0, 0, np.arange(100, dtype=np.int16))
+        journal.append(0, 1, 0, np.arange(100, dtype=np.int16))
+        journal.close()
+        size = os.path.getsize(self.journalFile)
+        with open(self.journalFile, "r+b") as fhandle:
+            fhandle.truncate(size - 50)
+
+        (description, records, validSize) = SampleStore.CheckpointJournal.read(self.journalFile)
+        self.assertEqual(len(records), 1)
+        self.assertLess(validSize, size - 50)
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
@@ -0,0 +1,275 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import ExperimentParametersIO as ExpParamIO
+import scan_engine as SE
+import MeasureDataset
+
+SE.SETTLING_TIME_AFTER_CONFIGURATION = 0
+
+class FakeCnc():
+    """
+    CNC which is immediately in position.
+    """
+    def __init__(self):
+        self.moves = []
+
+    def unlock(self):
+        pass
+
+    def goTo(self, x=9999, y=9999, z=9999, feedrate=1000, event=None):
+        self.moves.append((x, y))
+        if event is not None:
+            event.set()
+
+class FakeOscilloscope():
+    """
+    Oscilloscope returning a trace filled with the number of the acquisition.
+    """
+    def __init__(self, nbSamples=16):
+        self.nbSamples = nbSamples
+        self.nbAcquisitions = 0
+
+    def setGrid(self, *args):
+        pass
+
+    def setTrigger(self, *args):
+        pass
+
+    def acquire(self, readOnly=False, channel=1):
+        self.nbAcquisitions += 1
+        return {"data": np.full(self.nbSamples, self.nbAcquisitions, dtype=np.int16)}
+
+class FakeSignalGenerator():
+    """
+    Signal generator counting the bursts.
+    """
+    def __init__(self):
+        self.nbBursts = 0
+
+    def burst(self):
+        self.nbBursts += 1
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+def scanParameters():
+    params = ExpParamIO.getDefaultParameters()
+    params['delay_before_measuring'] = 0
+    params['time_division'] = 0
+    params['nb_point_x'] = 3
+    params['nb_point_y'] = 1
+    params['samples_per_point'] = 2
+    params['timings_file'] = None
+    return params
+
+class ShotExcitation(SE.Excitation):
+    def shotsPerPoint(self):
+        return self.experimentParameters['samples_per_point']
+
+    def fire(self, sg, osc, shot):
+        sg.burst()
+
+    def columnName(self, x, y, shot, channel):
+        return f'{x},{y},S{shot + 1}'
+
+class FrequencyExcitation(ShotExcitation):
+    signalGeneratorParameters = ('frequency',)
+
+    def __init__(self, params, configurations):
+        super(FrequencyExcitation, self).__init__(params)
+        self.configurations = configurations
+
+    def configureSignalGenerator(self, sg):
+        self.configurations.append(self.experimentParameters['frequency'])
+
+class TestScanEngine(unittest.TestCase):
+    """
+    Tests of the scan engine with fake instruments.
+    """
+
+    def test_serpentine_plan(self):
+        plan = SE.ScanPlan.fromParameters(scanParameters())
+        self.assertEqual(len(plan), 6)
+        np.testing.assert_array_equal(plan.ix, [0, 1, 2, 2, 1, 0])
+        np.testing.assert_array_equal(plan.iy, [0, 0, 0, 1, 1, 1])
+
+    def test_scan(self):
+        params = scanParameters()
+        cnc = FakeCnc()
+        osc = FakeOscilloscope()
+        sg = FakeSignalGenerator()
+        excitation = ShotExcitation(params)
+        engine = SE.ScanEngine(cnc, osc, sg, params, excitation)
+        store = engine.run()
+        self.assertEqual(store.data.shape, (6, 2, 1, 16))
+        self.assertTrue(store.filled.all())
+        data = store.to_dataframe(excitation.columnName)
+
+        self.assertEqual(data.shape, (16, 12))
+        self.assertEqual(sg.nbBursts, 12)
+        self.assertEqual(len(cnc.moves), 6)
+        x0 = params['start_x']
+        y0 = params['start_y']
+        self.assertEqual(data[f'{x0},{y0},S2'].iloc[0], 2)
+        self.assertEqual(engine.counters["transfer"].summary()["count"], 12)
+        self.assertEqual(engine.counters["store"].summary()["count"], 12)
+
+    def test_stage_error(self):
+        params = scanParameters()
+        osc = FakeOscilloscope()
+        def failingAcquire(readOnly=False, channel=1):
+            raise IOError("VICP connection lost")
+        osc.acquire = failingAcquire
+        engine = SE.ScanEngine(FakeCnc(), osc, FakeSignalGenerator(), params, ShotExcitation(params))
+        with self.assertRaises(SE.ScanError):
+            engine.run()
+
+    def test_resume(self):
+        params = scanParameters()
+        with tempfile.TemporaryDirectory() as directory:
+            journalFile = os.path.join(directory, "scan.journal")
+
+            osc = FakeOscilloscope()
+            acquire = osc.acquire
+            def unreliableAcquire(readOnly=False, channel=1):
+                if osc.nbAcquisitions == 7:
+                    raise IOError("VICP connection lost")
+                return acquire(readOnly, channel)
+            osc.acquire = unreliableAcquire
+            engine = SE.ScanEngine(FakeCnc(), osc, FakeSignalGenerator(), params, ShotExcitation(params), \
+                                   sink=SE.SampleStoreSink(journalFile))
+            with self.assertRaises(SE.ScanError):
+                engine.run()
+
+            cnc = FakeCnc()
+            sg = FakeSignalGenerator()
+            engine = SE.ScanEngine(cnc, FakeOscilloscope(), sg, params, ShotExcitation(params), \
+                                   sink=SE.SampleStoreSink(journalFile))
+            store = engine.run()
+            self.assertTrue(store.filled.all())
+            self.assertEqual(sg.nbBursts, 5)
+            self.assertEqual(len(cnc.moves), 3)
+            self.assertEqual(store.data[0, 0, 0, 0], 1)
+
+            # A complete journal is overwritten and the scan starts again.
+            sg = FakeSignalGenerator()
+            engine = SE.ScanEngine(FakeCnc(), FakeOscilloscope(), sg, params, ShotExcitation(params), \
+                                   sink=SE.SampleStoreSink(journalFile))
+            engine.run()
+            self.assertEqual(sg.nbBursts, 12)
+            self.assertEqual(os.listdir(directory), ["scan.journal"])
+
+            # An unreadable journal is set aside.
+            with open(journalFile, "wb") as fhandle:
+                fhandle.write(b"garbage")
+            engine = SE.ScanEngine(FakeCnc(), FakeOscilloscope(), FakeSignalGenerator(), params, ShotExcitation(params), \
+                                   sink=SE.SampleStoreSink(journalFile))
+            engine.run()
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_streaming_statistics(self):
+        params = scanParameters()
+        params['streaming_statistics'] = True
+        params['raw_shots_kept'] = 1
+        params['statistics_min_max'] = True
+        engine = SE.ScanEngine(FakeCnc(), FakeOscilloscope(), FakeSignalGenerator(), params, ShotExcitation(params), \
+                               sink=SE.sinkFromParameters(params, None))
+        stats = engine.run()
+        self.assertEqual(stats.mean.shape, (6, 1, 16))
+        # Acquisitions 1 and 2 at the first point.
+        self.assertEqual(stats.mean[0, 0, 0], 1.5)
+        self.assertEqual(stats.raw[0, 0, 0, 0], 1)
+        self.assertEqual(stats.max[5, 0, 0], 12)
+
+        dataset = MeasureDataset.MeasureDataset.fromScanResult(stats, params, ShotExcitation(params).columnName)
+        # The mean is the only shot, in float32, the other statistics and the raw shots keep their type.
+        self.assertEqual(dataset.channels, ["data"])
+        self.assertEqual(dataset.samples.dtype, np.float32)
+        self.assertEqual(dataset.samples.nbytes, 6*1*1*16*4)
+        self.assertEqual(dataset.shotStatistics["variance"].nbytes, 6*1*16*4)
+        self.assertEqual(dataset.rawShots.dtype, np.int16)
+        self.assertEqual(dataset.rawShots.nbytes, 6*1*1*16*2)
+        name = f'{stats.x[0]},{stats.y[0]},S1'
+        self.assertEqual(list(dataset.get_data().columns[:5]), [f'{name},mean', f'{name},variance', f'{name},min', f'{name},max', name])
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "EXP.sds")
+            dataset.save_to(filename)
+            loaded = MeasureDataset.MeasureDataset.load_from(filename)
+            self.assertEqual(loaded.channels, ["data"])
+            np.testing.assert_array_equal(loaded.samples, dataset.samples)
+            np.testing.assert_array_equal(loaded.shotStatistics["max"], stats.max)
+            np.testing.assert_array_equal(loaded.rawShots, stats.raw)
+            np.testing.assert_array_equal(loaded.shotCount, stats.count)
+            del loaded
+
+    def test_point_done(self):
+        params = scanParameters()
+        points = []
+        engine = SE.ScanEngine(FakeCnc(), FakeOscilloscope(), FakeSignalGenerator(), params, ShotExcitation(params), \
+                               pointDone=points.append)
+        engine.run()
+        self.assertEqual(points, list(range(6)))
+
+    def test_cancel(self):
+        params = scanParameters()
+        with tempfile.TemporaryDirectory() as directory:
+            journalFile = os.path.join(directory, "scan.journal")
+            engine = SE.ScanEngine(FakeCnc(), FakeOscilloscope(), FakeSignalGenerator(), params, ShotExcitation(params), \
+                                   sink=SE.SampleStoreSink(journalFile))
+            def cancelAfterFirstPoint(point):
+                engine.cancel()
+            engine.pointDone = cancelAfterFirstPoint
+            with self.assertRaises(SE.ScanCancelled):
+                engine.run()
+            self.assertLess(engine.nbShotsDone, 12)
+
+            sg = FakeSignalGenerator()
+            engine = SE.ScanEngine(FakeCnc(), FakeOscilloscope(), sg, params, ShotExcitation(params), \
+                                   sink=SE.SampleStoreSink(journalFile))
+            store = engine.run()
+            self.assertTrue(store.filled.all())
+            self.assertLess(sg.nbBursts, 12)
+
+    def test_excitation_group(self):
+        params = scanParameters()
+        configurations = []
+        excitations = []
+        for frequency in (1000, 2000):
+            p = dict(params, frequency=frequency)
+            excitations.append(FrequencyExcitation(p, configurations))
+        cnc = FakeCnc()
+        sg = FakeSignalGenerator()
+        engine = SE.ScanEngine(cnc, FakeOscilloscope(), sg, params, excitations)
+        store = engine.run()
+        self.assertEqual(store.data.shape, (6, 4, 1, 16))
+        self.assertEqual(sg.nbBursts, 24)
+        self.assertEqual(len(cnc.moves), 6)
+        # One switch per point: the active excitation is played first.
+        self.assertEqual(configurations, [1000, 2000, 1000, 2000, 1000, 2000, 1000])
+
+        (data, filled) = store.byExcitation()
+        self.assertEqual(data.shape, (6, 2, 2, 1, 16))
+        self.assertTrue(filled.all())
+        self.assertEqual(data[0, 1, 0, 0, 0], 3)
+        self.assertEqual(data[1, 1, 0, 0, 0], 5)
+        self.assertEqual(data[1, 0, 1, 0, 0], 8)
+        frame = store.to_dataframe(engine.excitation.columnName)
+        x0 = params['start_x']
+        y0 = params['start_y']
+        self.assertEqual(frame[f'{x0},{y0},S1,E2'].iloc[0], 3)
+
+        with self.assertRaises(ValueError):
+            SE.ScanEngine(FakeCnc(), FakeOscilloscope(), FakeSignalGenerator(), params, excitations, \
+                          sink=SE.StatisticsSink()).run()
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import scan_engine as SE
+import scan_estimator as Estimator
+import acquire_impacts as ai
+
+from ScanEngineTest import FakeCnc, FakeOscilloscope, FakeSignalGenerator, ShotExcitation, scanParameters
+
+def record(samples, transferPerTrace, shots=10, points=5):
+    return {"points": points, "shots": shots, "channels": 1, "samples": samples, \
+            "point_delay": 0.0, "shot_delay": 0.0, "duration": 10.0, \
+            "moves": [[2.0, 0.5], [4.0, 0.7], [2.0, 0.5]], \
+            "counters": {"move": {"count": 3, "busy_time": 1.7}, \
+                         "excite": {"count": points, "busy_time": (shots - points)*transferPerTrace + shots*0.1}, \
+                         "transfer": {"count": shots, "busy_time": shots*transferPerTrace}, \
+                         "store": {"count": shots, "busy_time": shots*samples/1e8}}}
+
+class TestScanEstimator(unittest.TestCase):
+    """
+    Tests of the duration estimates.
+    """
+
+    def test_estimate(self):
+        params = scanParameters()
+        model = Estimator.CostModel({"move_overhead": 1.0, "move_speed": 2.0, "shot_overhead": 0.0, \
+                                     "transfer_latency": 0.0, "transfer_rate": 1e12, "configure_time": 0.0})
+        estimate = model.estimate(params, ShotExcitation)
+        self.assertEqual(estimate["points"], 6)
+        self.assertEqual(estimate["shots"], 12)
+        # 5 moves of one step (2 mm at 2 mm/s) plus the overhead.
+        self.assertAlmostEqual(estimate["stages"]["move"], 5*(1.0 + 1.0))
+        self.assertAlmostEqual(estimate["total"], sum(estimate["stages"].values()))
+        self.assertIn(estimate["most_sensitive"], Estimator.SENSITIVITY_PARAMETERS)
+
+    def test_delays_dominate(self):
+        params = scanParameters()
+        params['delay_before_measuring'] = 2.0
+        params['samples_per_point'] = 30
+        estimate = Estimator.CostModel().estimate(params, ai.ImpactExcitation)
+        self.assertGreater(estimate["stages"]["excite"], 6*30*2.0)
+        sensitivity = dict(estimate["sensitivity"])
+        # The duration is nearly proportional to the number of shots and to the delay.
+        self.assertGreater(sensitivity["samples_per_point"], 0.9)
+        self.assertGreater(sensitivity["delay_before_measuring"], 0.9)
+        self.assertLess(abs(sensitivity["OSCNumSamples"]), 0.1)
+
+    def test_calibrate(self):
+        model = Estimator.CostModel()
+        model.calibrate([record(10000, 0.01 + 10000/1e6), record(50000, 0.01 + 50000/1e6)])
+        c = model.coefficients
+        self.assertAlmostEqual(c["transfer_latency"], 0.01)
+        self.assertAlmostEqual(c["transfer_rate"], 1e6)
+        self.assertAlmostEqual(c["move_overhead"], 0.3)
+        self.assertAlmostEqual(c["move_speed"], 10.0)
+        self.assertAlmostEqual(c["shot_overhead"], 0.1)
+        self.assertAlmostEqual(c["store_rate"], 1e8)
+
+    def test_engine_records_timings(self):
+        params = scanParameters()
+        with tempfile.TemporaryDirectory() as directory:
+            params['timings_file'] = os.path.join(directory, "timings.jsonl")
+            SE.ScanEngine(FakeCnc(), FakeOscilloscope(), FakeSignalGenerator(), params, ShotExcitation(params)).run()
+            records = Estimator.readTimings(params['timings_file'])
+            self.assertEqual(len(records), 1)
+            self.assertEqual(records[0]["shots"], 12)
+            self.assertEqual(len(records[0]["moves"]), 5)
+            model = Estimator.CostModel.fromTimings(params['timings_file'])
+            self.assertGreater(model.estimate(params, ShotExcitation)["total"], 0)
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+import os
+import sys
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import shot_quality as ShotQuality
+import scan_engine as SE
+
+from ScanEngineTest import FakeCnc, FakeOscilloscope, FakeSignalGenerator, ShotExcitation, scanParameters
+
+def goodTrace(rng, nbSamples=200):
+    trace = rng.normal(0, 5, nbSamples)
+    trace[nbSamples//10:] += 500*np.sin(np.arange(nbSamples - nbSamples//10)*0.3)
+    return trace.astype(np.int16)
+
+class QualityOscilloscope(FakeOscilloscope):
+    """
+    Oscilloscope returning good traces, except for the ``bad`` acquisitions which are clipped.
+    """
+    def __init__(self, bad=()):
+        super(QualityOscilloscope, self).__init__()
+        self.bad = set(bad)
+        self.rng = np.random.default_rng(0)
+
+    def acquire(self, readOnly=False, channel=1):
+        self.nbAcquisitions += 1
+        trace = goodTrace(self.rng)
+        if self.nbAcquisitions in self.bad:
+            trace[50:60] = ShotQuality.INT16_MAX
+        return {"data": trace}
+
+class TestShotQuality(unittest.TestCase):
+    """
+    Tests of the quality check of the shots.
+    """
+
+    def test_checks(self):
+        rng = np.random.default_rng(1)
+        gate = ShotQuality.QualityGate()
+        good = goodTrace(rng)
+        self.assertEqual(gate.check({"data": good}), [])
+
+        clipped = goodTrace(rng)
+        clipped[100] = ShotQuality.INT16_MIN
+        self.assertEqual(gate.check({"data": clipped}), [(ShotQuality.CLIPPED, "data")])
+
+        noise = rng.normal(0, 5, 200).astype(np.int16)
+        self.assertEqual(gate.check({"data": goodTrace(rng), "noise": noise}), [(ShotQuality.LOW_SNR, "noise")])
+
+        # The oscilloscope returned the same waveform again.
+        self.assertEqual(gate.check({"data": good}), [])
+        self.assertEqual(gate.check({"data": good}), [(ShotQuality.NO_TRIGGER, "data")])
+        self.assertEqual(gate.counts[ShotQuality.NO_TRIGGER], 1)
+
+    def test_snr(self):
+        traces = np.zeros((2, 100))
+        traces[0, 10:] = 1.0
+        traces[1, :10] = [1, -1]*5
+        traces[1, 10:] = [10, -10]*45
+        snr = ShotQuality.signalToNoise(traces, 10)
+        self.assertEqual(snr[0], np.inf)
+        self.assertAlmostEqual(snr[1], 20.0)
+
+    def test_remeasure_in_position(self):
+        params = scanParameters()
+        params['quality_check'] = True
+        params['quality_retries'] = 2
+        cnc = FakeCnc()
+        sg = FakeSignalGenerator()
+        # Second shot of the first point bad twice, second shot of the third point bad three times.
+        osc = QualityOscilloscope(bad=(2, 3, 8, 9, 10))
+        engine = SE.ScanEngine(cnc, osc, sg, params, ShotExcitation(params))
+        store = engine.run()
+
+        self.assertTrue(store.filled.all())
+        self.assertEqual(len(cnc.moves), 6)
+        self.assertEqual(engine.retries.tolist(), [2, 0, 2, 0, 0, 0])
+        self.assertEqual(engine.failedShots.tolist(), [0, 0, 1, 0, 0, 0])
+        self.assertEqual(sg.nbBursts, 16)
+        # The stored re-measurement is good, the bad shot kept at the third point is clipped.
+        self.assertLess(store.data[0, 1].max(), ShotQuality.INT16_MAX)
+        self.assertEqual(store.data[2, 1].max(), ShotQuality.INT16_MAX)
+        report = engine.qualityReport()
+        self.assertEqual(report["problems"][ShotQuality.CLIPPED], 5)
+        self.assertEqual(engine.nbShotsDone, 12)
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import shot_statistics as ShotStats
+import sample_store as SampleStore
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+class TestShotStatistics(unittest.TestCase):
+    """
+    Tests of the streaming statistics of the shots.
+    """
+
+    def test_matches_offline(self):
+        rng = np.random.default_rng(0)
+        shots = rng.integers(-32768, 32767, size=(2, 30, 1, 64), dtype=np.int16)
+        stats = ShotStats.ShotStatistics(2, 30, ["data"], 64, nbRawShots=3, dtype=np.float64, minMax=True)
+        for point in range(2):
+            for shot in range(30):
+                stats.add(point, shot, 0, shots[point, shot, 0])
+
+        np.testing.assert_allclose(stats.mean, shots.mean(axis=1, dtype=np.float64), rtol=1e-12)
+        np.testing.assert_allclose(stats.variance, shots.astype(np.float64).var(axis=1, ddof=1), rtol=1e-10)
+        np.testing.assert_array_equal(stats.min, shots.min(axis=1))
+        np.testing.assert_array_equal(stats.max, shots.max(axis=1))
+        np.testing.assert_array_equal(stats.raw, shots[:, :3])
+        self.assertEqual(stats.count.tolist(), [[30], [30]])
+
+    def test_partial_point(self):
+        stats = ShotStats.ShotStatistics(1, 4, ["data"], 8)
+        stats.add(0, 0, 0, np.full(10, 2, dtype=np.int16))
+        stats.add(0, 1, 0, np.full(10, 4, dtype=np.int16))
+        stats.finish()
+        self.assertEqual(stats.mean.shape, (1, 1, 10))
+        self.assertEqual(stats.mean[0, 0, 0], 3)
+        self.assertEqual(stats.variance[0, 0, 0], 2)
+
+        data = stats.to_dataframe(lambda x, y, shot, channel: f'{x},{y}')
+        self.assertEqual(list(data.columns), ["0.0,0.0,mean", "0.0,0.0,variance"])
+        self.assertIsNone(stats.min)
+
+    def test_reduction_on_disk(self):
+        rng = np.random.default_rng(0)
+        (nbPoints, nbShots, nbSamples) = (64, 30, 2000)
+        shots = rng.integers(-3000, 3000, size=(nbPoints, nbShots, 1, nbSamples), dtype=np.int16)
+        (x, y) = (np.arange(nbPoints, dtype=np.float64), np.zeros(nbPoints))
+        stats = ShotStats.ShotStatistics(nbPoints, nbShots, ["data"], nbSamples, x, y)
+        store = SampleStore.SampleStore(nbPoints, nbShots, ["data"], nbSamples, x, y)
+        for point in range(nbPoints):
+            for shot in range(nbShots):
+                stats.add(point, shot, 0, shots[point, shot, 0])
+                store.put(point, shot, 0, shots[point, shot, 0])
+        columnName = lambda x, y, shot, channel: f'{x},{y},S{shot + 1}'
+        params = ExpParamIO.getDefaultParameters()
+        with tempfile.TemporaryDirectory() as directory:
+            sizes = []
+            for (name, result) in (("EXP_shots.sds", store), ("EXP_statistics.sds", stats)):
+                filename = os.path.join(directory, name)
+                MeasureDataset.MeasureDataset.fromScanResult(result, params, columnName).save_to(filename)
+                sizes.append(os.path.getsize(filename))
+        # float32 mean and variance: 8 bytes per sample against 2 per shot.
+        self.assertGreaterEqual(sizes[0]/sizes[1], nbShots/4)
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
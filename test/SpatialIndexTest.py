@@ -0,0 +1,77 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import spatial_index as SpatialIndex
+import dataset_container as Container
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+class TestSpatialIndex(unittest.TestCase):
+    """
+    Tests of the index of the points by coordinates.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(6)
+        (self.x, self.y) = rng.uniform(0, 100, size=(2, 2000))
+        self.index = SpatialIndex.build(self.x, self.y, leafSize=8)
+
+    def test_nearest(self):
+        queries = np.random.default_rng(7).uniform(-20, 120, size=(2, 50))
+        (points, distances) = self.index.nearest(queries[0], queries[1], k=4)
+        expected = np.hypot(self.x - queries[0][:, np.newaxis], self.y - queries[1][:, np.newaxis])
+        np.testing.assert_allclose(distances, np.sort(expected, axis=1)[:, :4])
+        np.testing.assert_allclose(np.take_along_axis(expected, points, axis=1), distances)
+        (points, distances) = SpatialIndex.build(self.x[:2], self.y[:2]).nearest(50, 50, k=3)
+        self.assertEqual(points[2], -1)
+        self.assertEqual(distances[2], np.inf)
+
+    def test_regions(self):
+        np.testing.assert_array_equal(self.index.rectangle(20, 45, 30, 31), \
+                                      np.flatnonzero((self.x >= 20) & (self.x <= 45) & (self.y >= 30) & (self.y <= 31)))
+        np.testing.assert_array_equal(self.index.radius(10, 90, 12), np.flatnonzero(np.hypot(self.x - 10, self.y - 90) <= 12))
+        self.assertEqual(self.index.rectangle(200, 300, 0, 1).size, 0)
+
+    def test_gridPoints(self):
+        # A plate with a hole: the nodes in the hole have no point.
+        (x, y) = np.meshgrid(np.arange(20.0), np.arange(10.0), indexing="ij")
+        kept = ~((x > 5) & (x < 12) & (y > 2) & (y < 7))
+        index = SpatialIndex.build(x[kept], y[kept])
+        points = index.gridPoints(np.arange(0, 19.5, 0.5), np.arange(10.0))
+        self.assertEqual(points.shape, (39, 10))
+        self.assertEqual(points[18, 5], -1)
+        self.assertEqual(points[0, 0], 0)
+        # The nodes on the measured points take them.
+        np.testing.assert_array_equal(points[::2][kept], np.arange(kept.sum()))
+
+    def test_stored(self):
+        dataset = MeasureDataset.MeasureDataset.fromArrays(np.zeros((2000, 1, 1, 10), dtype=np.int16), self.x, self.y, \
+                                                           experimentParameters=ExpParamIO.getDefaultParameters())
+        self.assertEqual(dataset.pointOf(self.x[17], self.y[17]), 17)
+        with self.assertRaises(KeyError):
+            dataset.pointOf(self.x[17] + 0.5, self.y[17])
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "EXP.sds")
+            dataset.save_to(filename)
+            self.assertIn(SpatialIndex.INDEX_ARRAY, Container.Container(filename).names())
+            loaded = MeasureDataset.MeasureDataset.load_from(filename)
+            np.testing.assert_array_equal(loaded.get_index().order, dataset.spatialIndex.order)
+
+            # Container written without its index: built on the first call, then stored.
+            Container.saveDataset(dataset, filename)
+            loaded = MeasureDataset.MeasureDataset.load_from(filename)
+            self.assertIsNone(SpatialIndex.load(filename, loaded.x, loaded.y))
+            np.testing.assert_array_equal(np.arange(2000)[loaded.pointsIn((20, 45, 30, 31))], self.index.rectangle(20, 45, 30, 31))
+            self.assertIsNotNone(SpatialIndex.load(filename, loaded.x, loaded.y))
+            del loaded
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.INFO)
+    unittest.main()
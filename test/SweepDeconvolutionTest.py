@@ -0,0 +1,79 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import sweep_deconvolution as Deconvolution
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+class TestSweepDeconvolution(unittest.TestCase):
+    """
+    Tests of the impulse responses of the sine sweep datasets.
+    """
+
+    def setUp(self):
+        self.params = ExpParamIO.getDefaultParameters()
+        (self.params['frequencyStart'], self.params['frequencyEnd'], self.params['sweepTime']) = (1000.0, 40000.0, 0.01)
+        # 2048 samples every 10 us.
+        self.params['unit_time_division'] = "MS"
+        self.params['time_division'] = 2.048
+        self.period = 1e-5
+        sweep = Deconvolution.linearSweep(1000.0, 40000.0, 0.01, self.period, 2048)
+        # Impulse response of each point: two echoes.
+        self.impulses = np.zeros((5, 2, 2048))
+        for point in range(5):
+            self.impulses[point, :, 10 + 7*point] = 1.0 + point
+            self.impulses[point, :, 300] = -0.5
+        responses = np.array([[np.convolve(sweep, h)[:2048] for h in shots] for shots in self.impulses])
+        samples = np.stack((responses, np.broadcast_to(sweep, responses.shape)), axis=2)
+        self.dataset = MeasureDataset.MeasureDataset.fromArrays(samples, np.arange(5.0), np.zeros(5), \
+                                                                ["response", "sineSweep"], self.params)
+
+    def test_deconvolve(self):
+        self.assertAlmostEqual(self.dataset.samplePeriod(), self.period)
+        (impulses, spectra) = Deconvolution.deconvolve(self.dataset.samples[:, :, 0], self.dataset.samples[:, :, 1], \
+                                                       regularization=1e-6, length=400)
+        self.assertEqual(impulses.shape, (5, 2, 400))
+        self.assertEqual(spectra.shape[-1], Deconvolution.fftLength(2048)//2 + 1)
+        np.testing.assert_array_equal(impulses.argmax(axis=-1), (10 + 7*np.arange(5))[:, np.newaxis].repeat(2, axis=1))
+        np.testing.assert_allclose(impulses[:, 0, 300], -0.5, atol=0.1)
+        with self.assertRaises(ValueError):
+            Deconvolution.deconvolve(self.dataset.samples[:, :, 0], self.dataset.samples[:, :, 1], \
+                                     length=Deconvolution.fftLength(2048) + 1)
+
+    def test_datasets(self):
+        with tempfile.TemporaryDirectory() as directory:
+            sweeps = os.path.join(directory, "EXP_sweep.sds")
+            self.dataset.save_to(sweeps)
+            results = {}
+            for (method, processes) in (("regularized", 1), ("analytical", 1), ("regularized", 2)):
+                output = os.path.join(directory, f'EXP_{method}_{processes}.sds')
+                results[(method, processes)] = Deconvolution.deconvolveDataset(sweeps, output, method, length=1024, \
+                                                                               processes=processes, batchBytes=1)
+                impulses = results[(method, processes)]
+                self.assertEqual(impulses.samples.shape, (5, 2, 1, 1024))
+                self.assertEqual(impulses.channels, ["impulse_response"])
+                self.assertAlmostEqual(impulses.samplePeriod(), self.period)
+                np.testing.assert_array_equal(impulses.samples[:, :, 0].argmax(axis=-1), \
+                                              (10 + 7*np.arange(5))[:, np.newaxis].repeat(2, axis=1))
+                (frequencies, responses) = Deconvolution.loadFrequencyResponses(output)
+                band = (frequencies > 5000) & (frequencies < 30000)
+                # |H| of the first point (amplitude 1 and -0.5 echoes) stays between 0.5 and 1.5 in the band.
+                self.assertTrue(np.all(np.abs(responses[0, 0, 0, band]) > 0.4))
+                self.assertTrue(np.all(np.abs(responses[0, 0, 0, band]) < 1.6))
+            np.testing.assert_allclose(results[("regularized", 2)].samples, results[("regularized", 1)].samples)
+            with self.assertRaises(ValueError):
+                Deconvolution.deconvolveDataset(self.dataset, os.path.join(directory, "EXP.sds"), sweepChannel="reference")
+            with self.assertRaises(ValueError):
+                Deconvolution.deconvolveDataset(self.dataset, os.path.join(directory, "EXP.sds"), length=5000)
+            del results, impulses, responses
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.INFO)
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import tile_mosaic as TileMosaic
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+def tile(startX, nbX, value, nbSamples=400, timeDivision=20):
+    params = ExpParamIO.getDefaultParameters()
+    params['time_division'] = timeDivision
+    (ix, iy) = np.meshgrid(np.arange(nbX), np.arange(2), indexing="ij")
+    x = startX + 2.0*ix.ravel()
+    y = 2.0*iy.ravel()
+    samples = np.full((x.size, 2, 1, nbSamples), value, dtype=np.int16)
+    samples[:, 1] += 1
+    return MeasureDataset.MeasureDataset.fromArrays(samples, x, y, experimentParameters=params)
+
+class TestTileMosaic(unittest.TestCase):
+    """
+    Tests of the merge of several scans.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.directory.name, "MOSAIC.sds")
+        # Columns 0, 2, 4 and 4, 6, 8: the column x=4 is measured twice.
+        self.tiles = [tile(0.0, 3, 10), tile(4.0 + 1e-5, 3, 30)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_overlap(self):
+        for (overlap, expected) in (("keep", 10), ("newest", 30), ("average", 20)):
+            merged = TileMosaic.mergeTiles(self.tiles, self.output, overlap, batchBytes=4000)
+            self.assertEqual(merged.samples.shape, (10, 2, 1, 400))
+            self.assertEqual(merged.grid.shape, (5, 2))
+            np.testing.assert_array_equal(merged.get_trace(4.0, 2.0, 1, 0), np.full(400, expected + 1))
+            np.testing.assert_array_equal(merged.get_trace(0.0, 0.0, 0, 0), np.full(400, 10))
+            np.testing.assert_array_equal(merged.get_trace(8.0, 0.0, 0, 0), np.full(400, 30))
+            self.assertEqual(merged.samples.dtype, np.float64 if overlap == "average" else np.int16)
+            self.assertEqual(merged.experimentParameters['nb_point_x'], 5)
+            self.assertEqual(merged.experimentParameters['nb_point_y'], 1)
+            self.assertEqual(merged.get_statistics()["max"].max(), expected + 1 if overlap == "newest" else 31)
+            del merged
+
+    def test_files(self):
+        filenames = [os.path.join(self.directory.name, f'TILE{t}.sds') for t in range(2)]
+        for (dataset, filename) in zip(self.tiles, filenames):
+            dataset.save_to(filename)
+        merged = TileMosaic.mergeTiles(filenames, self.output)
+        self.assertEqual(merged.samples.shape[0], 10)
+        self.assertIsNotNone(merged.get_pyramid())
+        del merged
+
+    def test_timebase(self):
+        ramp = tile(20.0, 1, 0, nbSamples=200, timeDivision=20)
+        ramp.samples[...] = np.arange(200, dtype=np.int16)
+        merged = TileMosaic.mergeTiles([self.tiles[0], ramp], self.output)
+        self.assertEqual(merged.samples.dtype, np.float64)
+        # The ramp has half as many samples over the same time: interpolated.
+        trace = merged.get_trace(20.0, 0.0, 0, 0)
+        np.testing.assert_allclose(trace[:399], np.arange(399)/2)
+        self.assertEqual(trace[399], 0)
+        del merged
+
+    def test_incompatible(self):
+        other = self.tiles[1]
+        other.channels = ["reference"]
+        with self.assertRaises(ValueError):
+            TileMosaic.mergeTiles(self.tiles, self.output)
+        with self.assertRaises(ValueError):
+            TileMosaic.mergeTiles(self.tiles, self.output, overlap="median")
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.INFO)
+    unittest.main()
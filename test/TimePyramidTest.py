@@ -0,0 +1,69 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import time_pyramid as TimePyramid
+import dataset_container as Container
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+class TestTimePyramid(unittest.TestCase):
+    """
+    Tests of the min/max/mean levels of the traces.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        self.samples = rng.integers(-30000, 30000, size=(7, 2, 1, 3001)).astype(np.int16)
+
+    def test_levels(self):
+        pyramid = TimePyramid.build(self.samples, batchBytes=5000, firstLevel=3, minLength=4)
+        for (i, d) in enumerate(pyramid.decimations):
+            (mins, maxs, means) = pyramid.level(i)
+            self.assertEqual(mins.shape[-1], -(-3001//d))
+            for b in (0, mins.shape[-1] - 1):
+                bin = self.samples[3, 1, 0, b*d:(b + 1)*d]
+                self.assertEqual(mins[3, 1, 0, b], bin.min())
+                self.assertEqual(maxs[3, 1, 0, b], bin.max())
+                self.assertAlmostEqual(means[3, 1, 0, b], bin.mean(), delta=1e-2)
+        self.assertGreaterEqual(pyramid.lengths[-1], 4)
+        self.assertLess(pyramid.lengths[-1], 8)
+        (mins, maxs) = pyramid.extrema()
+        np.testing.assert_array_equal(maxs, self.samples.max(axis=-1))
+
+    def test_envelope(self):
+        pyramid = TimePyramid.build(self.samples)
+        self.assertIsNone(pyramid.envelope(0, nbPixels=2000))
+        (times, mins, maxs, means) = pyramid.envelope(2, 1, 0, t0=64, t1=3001, nbPixels=20)
+        d = times[1] - times[0]
+        self.assertGreaterEqual(mins.size, 20)
+        self.assertLessEqual(times[0], 64)
+        self.assertEqual(maxs[0], self.samples[2, 1, 0, times[0]:times[0] + d].max())
+
+    def test_stored(self):
+        dataset = MeasureDataset.MeasureDataset.fromArrays(self.samples, np.arange(7.0), np.zeros(7), \
+                                                           experimentParameters=ExpParamIO.getDefaultParameters())
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "EXP.sds")
+            dataset.save_to(filename)
+            self.assertIn("pyramid_max", Container.Container(filename).names())
+            loaded = MeasureDataset.MeasureDataset.load_from(filename)
+            np.testing.assert_array_equal(loaded.get_pyramid().maxs, dataset.pyramid.maxs)
+
+            # Container written without its pyramid: computed on the first call, then stored.
+            Container.saveDataset(dataset, filename)
+            loaded = MeasureDataset.MeasureDataset.load_from(filename)
+            self.assertIsNone(TimePyramid.load(filename))
+            loaded.get_pyramid()
+            np.testing.assert_array_equal(TimePyramid.load(filename).means, dataset.pyramid.means)
+            del loaded
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import trace_statistics as TraceStatistics
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+class TestTraceStatistics(unittest.TestCase):
+    """
+    Tests of the summary statistics of the traces.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.samples = rng.integers(-30000, 30000, size=(9, 2, 1, 500)).astype(np.int16)
+        self.samples[4, 0, 0, 123] = -32768
+        self.dataset = MeasureDataset.MeasureDataset.fromArrays(self.samples, np.arange(9.0), np.zeros(9), \
+                                                                experimentParameters=ExpParamIO.getDefaultParameters())
+
+    def test_statistics(self):
+        statistics = TraceStatistics.computeStatistics(self.samples, 0.5, batchBytes=3000)
+        np.testing.assert_array_equal(statistics["min"], self.samples.min(axis=-1))
+        np.testing.assert_array_equal(statistics["max"], self.samples.max(axis=-1))
+        self.assertEqual(statistics["peak"][4, 0, 0], 32768)
+        self.assertEqual(statistics["peak_time"][4, 0, 0], 123*0.5)
+        rms = np.sqrt(np.mean(self.samples[2, 1, 0].astype(np.float64)**2))
+        self.assertAlmostEqual(statistics["rms"][2, 1, 0], rms)
+
+    def test_saved(self):
+        statistics = self.dataset.get_statistics()
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ("EXP.json", "EXP.sds"):
+                filename = os.path.join(directory, name)
+                self.dataset.save_to(filename)
+                loaded = MeasureDataset.MeasureDataset.load_from(filename)
+                self.assertIsNotNone(loaded.statistics)
+                for key in TraceStatistics.STATISTICS:
+                    np.testing.assert_allclose(loaded.statistics[key], statistics[key])
+
+    def test_zLimits(self):
+        (low, high) = TraceStatistics.zLimits(self.dataset.get_statistics(), 1e-3)
+        self.assertLess(low, self.samples[:, 0, 0].min()*1e-3)
+        self.assertGreater(high, self.samples[:, 0, 0].max()*1e-3)
+        self.assertLess(high - low, 1.2*65.535)
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.INFO)
+    unittest.main()
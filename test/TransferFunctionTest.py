@@ -0,0 +1,68 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import transfer_function as TransferFunction
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+class TestTransferFunction(unittest.TestCase):
+    """
+    Tests of the transfer functions estimated from the repeated shots.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(8)
+        self.filter = np.array([0.5, 0.3, -0.2])
+        # Reference, then response of 4 points x 10 shots, with more noise on the last point.
+        reference = rng.normal(size=(4, 10, 4096))
+        response = np.apply_along_axis(lambda x: np.convolve(x, self.filter)[:4096], -1, reference)
+        noise = np.array([0.01, 0.01, 0.01, 2.0])[:, np.newaxis, np.newaxis]
+        response += noise*rng.normal(size=response.shape)
+        self.samples = np.stack((response, reference), axis=2)
+        params = ExpParamIO.getDefaultParameters()
+        params['time_division'] = 0.4096
+        self.dataset = MeasureDataset.MeasureDataset.fromArrays(self.samples, np.arange(4.0), np.zeros(4), \
+                                                                ["data", "reference"], params)
+
+    def test_estimate(self):
+        estimate = TransferFunction.estimate(self.samples, 1e-6, 1, segmentLength=256, batchBytes=100000)
+        self.assertEqual(estimate["h1"].shape, (4, 1, 129))
+        self.assertEqual(estimate["outputs"], [0])
+        self.assertEqual(estimate["averages"], 10*31)
+        expected = np.fft.rfft(self.filter, 256)
+        np.testing.assert_allclose(estimate["h1"][0, 0], expected, atol=0.02)
+        # H2 is ill-conditioned where the response vanishes (the filter is 0 at the Nyquist frequency).
+        np.testing.assert_allclose(estimate["h2"][1, 0, :120], expected[:120], atol=0.02)
+        self.assertGreater(estimate["coherence"][:3, :, :120].min(), 0.99)
+        # The noise on the output biases H2 up, not H1.
+        self.assertGreater(np.abs(estimate["h2"][3, 0]).mean(), 2*np.abs(expected).mean())
+        np.testing.assert_allclose(np.abs(estimate["h1"][3, 0]).mean(), np.abs(expected).mean(), rtol=0.2)
+
+        quality = TransferFunction.qualityMap(estimate, band=(50000, 400000))
+        np.testing.assert_array_equal(quality["reliable"][:, 0], [True, True, True, False])
+        with self.assertRaises(ValueError):
+            TransferFunction.qualityMap(estimate, band=(1e9, 2e9))
+
+    def test_stored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "EXP.sds")
+            self.dataset.save_to(filename)
+            estimate = TransferFunction.estimateDataset(self.dataset, "reference", segmentLength=8192, shots=[0, 2, 4])
+            self.assertEqual(estimate["outputs"], ["data"])
+            self.assertEqual(estimate["averages"], 3)
+            loaded = TransferFunction.load(filename)
+            np.testing.assert_array_equal(loaded["coherence"], estimate["coherence"])
+            np.testing.assert_allclose(loaded["frequencies"], estimate["frequencies"])
+            with self.assertRaises(ValueError):
+                TransferFunction.estimateDataset(self.dataset, "sineSweep")
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.INFO)
+    unittest.main()
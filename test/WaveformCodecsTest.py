@@ -0,0 +1,67 @@
+import unittest
+
+import os
+import sys
+import tempfile
+import logging as log
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "surfaceS"))
+
+import waveform_codecs as Codecs
+import dataset_container as Container
+import MeasureDataset
+import ExperimentParametersIO as ExpParamIO
+
+class TestWaveformCodecs(unittest.TestCase):
+    """
+    Tests of the compression of the traces.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.traces = Codecs.syntheticTraces(nbTraces=12, nbSamples=1000).reshape(3, 2, 2, 1000)
+        # Extreme values: the residuals wrap around.
+        self.traces[0, 0, 0, :4] = [-32768, 32767, -32768, 0]
+        self.noise = rng.integers(-32768, 32767, size=(2, 3, 300)).astype(np.int16)
+
+    def test_lossless(self):
+        codecs = ["raw"] + [f'{p}+{c}' for p in Codecs.PREDICTORS for c in Codecs.COMPRESSORS]
+        for name in codecs:
+            codec = Codecs.Codec(name)
+            for traces in (self.traces, self.noise, self.traces[:1, :1, :1, :0]):
+                payload = codec.encode(traces)
+                np.testing.assert_array_equal(codec.decode(payload, traces.shape, traces.dtype), traces, err_msg=name)
+
+    def test_compression(self):
+        ratios = {name: ratio for (name, ratio, encoding, decoding) in Codecs.benchmark(self.traces.reshape(12, 1000), repeat=1)}
+        self.assertGreater(ratios["lpc2+zlib"], 1.5)
+        self.assertGreater(ratios["lpc2+bitpack"], ratios["none+bitpack"])
+
+    def test_floats(self):
+        values = np.linspace(0.0, 1.0, 100).reshape(2, 50)
+        codec = Codecs.Codec("none+zlib")
+        np.testing.assert_array_equal(codec.decode(codec.encode(values), values.shape, values.dtype), values)
+        with self.assertRaises(ValueError):
+            Codecs.Codec("delta+zlib").encode(values)
+        with self.assertRaises(ValueError):
+            Codecs.Codec("delta+gzip")
+
+    def test_compressed_container(self):
+        dataset = MeasureDataset.MeasureDataset.fromArrays(self.traces, [0.0, 1.0, 2.0], [0.0, 0.0, 0.0], \
+                                                           experimentParameters=ExpParamIO.getDefaultParameters())
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "EXP.sds")
+            Container.saveDataset(dataset, filename, chunkPoints=2, codec="lpc2+bitpack")
+            self.assertLess(os.path.getsize(filename), self.traces.nbytes)
+            loaded = MeasureDataset.MeasureDataset.load_from(filename)
+            self.assertIsInstance(loaded.samples, Container.ChunkedArray)
+            np.testing.assert_array_equal(loaded.samples[:, 0, 0], self.traces[:, 0, 0])
+            np.testing.assert_array_equal(loaded.samples[2], self.traces[2])
+            np.testing.assert_array_equal(loaded.samples[[2, 0], 1, :, 10:20], self.traces[[2, 0], 1, :, 10:20])
+            np.testing.assert_array_equal(loaded.samples[..., 5], self.traces[..., 5])
+            np.testing.assert_array_equal(np.asarray(loaded.samples), self.traces)
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.DEBUG)
+    unittest.main()